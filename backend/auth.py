@@ -1,28 +1,56 @@
 from datetime import datetime, timedelta
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 import os
+import secrets
 
 from database import get_db
+from profiling import timed
 import models
 
 # Secret key (in production, use environment variable)
 SECRET_KEY = "supersecretkey"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Initial password of student accounts created in bulk (roster import, user admin)
+DEFAULT_PASSWORD = "123456"
+# Threads for bulk hashing; bcrypt releases the GIL so they run on all cores
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", os.cpu_count() or 1))
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/token")
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    with timed("hash"):
+        return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    with timed("hash"):
+        return pwd_context.hash(password)
+
+def hash_passwords(passwords: list) -> list:
+    """
+    Hash many passwords in parallel, same order as the input.
+    Identical passwords are hashed once and share the hash (like the roster import's default password).
+    """
+    unique = list(dict.fromkeys(passwords))
+    with timed("hash"):
+        if len(unique) == 1 or HASH_WORKERS <= 1:
+            hashes = [pwd_context.hash(p) for p in unique]
+        else:
+            with ThreadPoolExecutor(max_workers=min(HASH_WORKERS, len(unique))) as pool:
+                hashes = list(pool.map(pwd_context.hash, unique))
+    by_password = dict(zip(unique, hashes))
+    return [by_password[p] for p in passwords]
+
+def generate_password(length: int = 8) -> str:
+    # Digits only: students type these on phones
+    return "".join(secrets.choice("0123456789") for _ in range(length))
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -0,0 +1,359 @@
+"""
+Online snapshots of the SQLite database, and restore.
+
+Snapshots go through SQLite's backup API, BACKUP_STEP_PAGES pages per step
+with a short pause in between. In WAL mode a step only holds a read
+transaction, so imports and logins keep running during the copy. A write in
+another connection makes SQLite restart the copy; after BACKUP_MAX_RESTARTS
+restarts (a busy server) the rest is copied in one step, which still only
+reads. The copy is integrity-checked and gzipped into BACKUP_DIR:
+    smartgrade-20261019-101500-manual.db.gz
+    smartgrade-20261019-101500-manual.json    label, size, timings, change seq
+
+Restore copies a snapshot back into the live database in one step, under
+the write lock, so every worker sees either the old or the restored data.
+A "pre-restore" snapshot is taken first, so a restore can be undone too.
+Afterwards the schema is migrated, cache_bus channels move past every
+version any worker has seen, and the change feed gets a "reset" event so
+open dashboards refetch.
+
+Imports take a "pre-import" snapshot first (BACKUP_BEFORE_IMPORT=0 turns it
+off), unless the change feed has no new event since the last snapshot (no
+grade, course or student write; account changes are not in the feed). Only
+the newest BACKUP_KEEP_AUTO automatic snapshots are kept; manual ones stay
+until deleted.
+
+Usage (from backend/):
+    python backups.py snapshot [--label nightly]
+    python backups.py list
+    python backups.py restore smartgrade-20261019-101500-manual.db.gz
+    python backups.py delete smartgrade-20261019-101500-manual.db.gz
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+
+import models, cache_bus, change_feed, migrations
+from database import SessionLocal, SQLALCHEMY_DATABASE_URL
+
+BACKUP_STEP_PAGES = int(os.environ.get("BACKUP_STEP_PAGES", 1024))  # 4 MB with the default page size
+BACKUP_STEP_SLEEP = float(os.environ.get("BACKUP_STEP_SLEEP", 0.005))
+BACKUP_MAX_RESTARTS = int(os.environ.get("BACKUP_MAX_RESTARTS", 3))
+BACKUP_KEEP_AUTO = int(os.environ.get("BACKUP_KEEP_AUTO", 10))
+BACKUP_BEFORE_IMPORT = os.environ.get("BACKUP_BEFORE_IMPORT", "1").lower() not in ("0", "false", "no")
+
+MANUAL, PRE_IMPORT, PRE_RESTORE = "manual", "pre-import", "pre-restore"
+AUTO_LABELS = (PRE_IMPORT, PRE_RESTORE)
+SUFFIX = ".db.gz"
+NAME = re.compile(r"^smartgrade-\d{8}-\d{6}(-\d+)?-[a-z0-9][a-z0-9\-]*\.db\.gz$")
+
+_lock = threading.Lock()
+
+
+def database_path() -> str:
+    if not SQLALCHEMY_DATABASE_URL.startswith("sqlite:///"):
+        raise ValueError("Snapshots are only supported for SQLite databases")
+    return os.path.abspath(SQLALCHEMY_DATABASE_URL[len("sqlite:///"):])
+
+
+def backup_dir() -> str:
+    path = os.environ.get("BACKUP_DIR") or os.path.join(os.path.dirname(database_path()), "backups")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _path(name: str) -> str:
+    """Snapshot file of a name from a request; only plain snapshot names, nothing outside BACKUP_DIR."""
+    if not NAME.match(name or ""):
+        raise ValueError("Not a snapshot name")
+    path = os.path.join(backup_dir(), name)
+    if not os.path.exists(path):
+        raise FileNotFoundError(name)
+    return path
+
+
+def _meta_path(path: str) -> str:
+    return path[:-len(SUFFIX)] + ".json"
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+def _copy(source: sqlite3.Connection, target: sqlite3.Connection) -> dict:
+    """Page-stepped backup; returns {"pages", "steps", "restarts"}."""
+    stats = {"pages": 0, "steps": 0, "restarts": 0}
+    last = [None]
+
+    def progress(status, remaining, total):
+        stats["steps"] += 1
+        stats["pages"] = total
+        if last[0] is not None and remaining > last[0]:
+            # Another connection wrote to the database, SQLite started over
+            stats["restarts"] += 1
+            if stats["restarts"] > BACKUP_MAX_RESTARTS:
+                raise InterruptedError
+        last[0] = remaining
+        if remaining:
+            # Between steps, with no transaction open. (backup()'s own sleep only applies to BUSY retries.)
+            time.sleep(BACKUP_STEP_SLEEP)
+
+    try:
+        source.backup(target, pages=BACKUP_STEP_PAGES, progress=progress, sleep=BACKUP_STEP_SLEEP)
+    except InterruptedError:
+        # Busy server: copy the rest in one step (a single read transaction in WAL mode)
+        source.backup(target, pages=-1)
+        stats["steps"] += 1
+    return stats
+
+
+def _latest_seq() -> int:
+    with SessionLocal() as db:
+        return change_feed.latest_seq(db)
+
+
+def list_snapshots() -> list:
+    """Snapshots, newest first: metadata plus name and compressed size."""
+    out = []
+    directory = backup_dir()
+    for name in os.listdir(directory):
+        if not NAME.match(name):
+            continue
+        path = os.path.join(directory, name)
+        meta = {}
+        try:
+            with open(_meta_path(path)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            pass
+        out.append({**meta, "name": name, "bytes": os.path.getsize(path),
+                    "created_at": meta.get("created_at", os.path.getmtime(path))})
+    return sorted(out, key=lambda s: s["created_at"], reverse=True)
+
+
+def snapshot(label: str = MANUAL, verbose: bool = False) -> dict:
+    """Take a compressed snapshot of the live database. Returns its metadata."""
+    label = re.sub(r"[^a-z0-9\-]+", "-", (label or MANUAL).lower()).strip("-") or MANUAL
+    source_path = database_path()
+    directory = backup_dir()
+    with _lock:
+        seq = _latest_seq()
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        name, n = f"smartgrade-{stamp}-{label}{SUFFIX}", 1
+        while os.path.exists(os.path.join(directory, name)):
+            n += 1
+            name = f"smartgrade-{stamp}-{n}-{label}{SUFFIX}"
+        path = os.path.join(directory, name)
+        raw_path = path[:-3] + ".tmp"
+
+        t0 = time.perf_counter()
+        try:
+            source, target = _connect(source_path), sqlite3.connect(raw_path)
+            try:
+                stats = _copy(source, target)
+                copy_seconds = time.perf_counter() - t0
+                # One self-contained file, no -wal needed next to it
+                target.execute("PRAGMA journal_mode=DELETE")
+                check = target.execute("PRAGMA quick_check").fetchone()[0]
+            finally:
+                source.close()
+                target.close()
+            if check != "ok":
+                raise RuntimeError(f"Snapshot failed the integrity check: {check}")
+            db_bytes = os.path.getsize(raw_path)
+
+            t1 = time.perf_counter()
+            with open(raw_path, "rb") as src, gzip.open(path + ".tmp", "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.replace(path + ".tmp", path)
+            compress_seconds = time.perf_counter() - t1
+        finally:
+            for leftover in (raw_path, path + ".tmp"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+        meta = {
+            "name": name,
+            "label": label,
+            "created_at": time.time(),
+            "change_seq": seq,
+            "db_bytes": db_bytes,
+            "bytes": os.path.getsize(path),
+            "pages": stats["pages"],
+            "steps": stats["steps"],
+            "restarts": stats["restarts"],
+            "copy_seconds": round(copy_seconds, 3),
+            "compress_seconds": round(compress_seconds, 3),
+            "seconds": round(time.perf_counter() - t0, 3),
+        }
+        with open(_meta_path(path), "w") as f:
+            json.dump(meta, f)
+        prune()
+    if verbose:
+        print(f"Snapshot {name}: {db_bytes / 1e6:.1f} MB -> {meta['bytes'] / 1e6:.1f} MB in {meta['seconds']:.2f} s "
+              f"(copy {meta['copy_seconds']:.2f} s in {meta['steps']} steps, compress {meta['compress_seconds']:.2f} s)")
+    return meta
+
+
+def snapshot_before_import(endpoint: str):
+    """
+    Automatic snapshot before an import. Returns the name of the snapshot that
+    holds the data as it was (the last one when nothing changed since), or None.
+    """
+    if not BACKUP_BEFORE_IMPORT or not SQLALCHEMY_DATABASE_URL.startswith("sqlite:///"):
+        return None
+    try:
+        latest = next((s for s in list_snapshots() if "change_seq" in s), None)
+        if latest is not None and latest["change_seq"] == _latest_seq():
+            return latest["name"]
+        meta = snapshot(PRE_IMPORT)
+        print(f"Pre-import snapshot for {endpoint}: {meta['name']} ({meta['seconds']:.2f} s)")
+        return meta["name"]
+    except Exception as e:
+        # A failed snapshot must not block the import itself
+        print(f"Pre-import snapshot failed: {e}")
+        return None
+
+
+def prune(keep: int = None) -> list:
+    """Delete automatic snapshots beyond the newest `keep`. Returns the deleted names."""
+    keep = BACKUP_KEEP_AUTO if keep is None else keep
+    auto = [s for s in list_snapshots() if s.get("label") in AUTO_LABELS]
+    deleted = []
+    for s in auto[keep:]:
+        delete(s["name"])
+        deleted.append(s["name"])
+    return deleted
+
+
+def delete(name: str):
+    path = _path(name)
+    os.remove(path)
+    if os.path.exists(_meta_path(path)):
+        os.remove(_meta_path(path))
+
+
+def snapshot_path(name: str) -> str:
+    """Compressed snapshot file, for downloads."""
+    return _path(name)
+
+
+def restore(name: str, verbose: bool = False) -> dict:
+    """Replace the live database with a snapshot. Returns timings and the pre-restore snapshot name."""
+    path = _path(name)
+    target_path = database_path()
+    t0 = time.perf_counter()
+
+    raw_path = os.path.join(backup_dir(), f".restore-{os.getpid()}.db")
+    try:
+        with gzip.open(path, "rb") as src, open(raw_path, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        source = sqlite3.connect(raw_path)
+        try:
+            check = source.execute("PRAGMA quick_check").fetchone()[0]
+            tables = {row[0] for row in source.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if check != "ok" or not {"students", "courses", "grades"} <= tables:
+                raise ValueError(f"{name} is not a usable database snapshot ({check})")
+            decompress_seconds = time.perf_counter() - t0
+
+            # Undo point, and what workers have seen (so versions and sequence numbers never go backwards)
+            before = snapshot(PRE_RESTORE)
+            with SessionLocal() as db:
+                seq = change_feed.latest_seq(db)
+                versions = dict(db.execute(text("SELECT name, version FROM cache_versions")).all())
+
+            t1 = time.perf_counter()
+            target = _connect(target_path)
+            try:
+                # One step: the whole copy happens under one write lock
+                source.backup(target, pages=-1)
+            finally:
+                target.close()
+            copy_seconds = time.perf_counter() - t1
+        finally:
+            source.close()
+    finally:
+        if os.path.exists(raw_path):
+            os.remove(raw_path)
+
+    # Older snapshots may predate some migrations
+    applied = migrations.upgrade(verbose=verbose)
+    with SessionLocal() as db:
+        restored = dict(db.execute(text("SELECT name, version FROM cache_versions")).all())
+        for channel in set(versions) | set(restored):
+            db.execute(
+                text("INSERT INTO cache_versions (name, version) VALUES (:name, :version) "
+                     "ON CONFLICT(name) DO UPDATE SET version = :version"),
+                {"name": channel, "version": max(versions.get(channel, 0), restored.get(channel, 0)) + 1},
+            )
+        # Continue the event sequence where it was, so clients' Last-Event-ID stays behind it
+        params = {"seq": seq, "table": models.ChangeEvent.__tablename__}
+        if not db.execute(text("UPDATE sqlite_sequence SET seq = MAX(seq, :seq) WHERE name = :table"), params).rowcount:
+            db.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:table, :seq)"), params)
+        reset_seq = change_feed.record(db, change_feed.RESET, {"restored": name})
+        db.commit()
+    for cache in cache_bus._caches.values():
+        cache.clear()
+
+    result = {
+        "restored": name,
+        "pre_restore_snapshot": before["name"],
+        "migrations_applied": applied,
+        "change_seq": reset_seq,
+        "decompress_seconds": round(decompress_seconds, 3),
+        "copy_seconds": round(copy_seconds, 3),
+        "seconds": round(time.perf_counter() - t0, 3),
+    }
+    if verbose:
+        print(f"Restored {name} in {result['seconds']:.2f} s (copy {result['copy_seconds']:.2f} s); "
+              f"undo with: python backups.py restore {before['name']}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Database snapshots")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("snapshot", help="take a snapshot now")
+    p.add_argument("--label", default=MANUAL)
+    sub.add_parser("list", help="list snapshots, newest first")
+    p = sub.add_parser("restore", help="replace the database with a snapshot")
+    p.add_argument("name")
+    p = sub.add_parser("delete", help="delete a snapshot")
+    p.add_argument("name")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "snapshot":
+            migrations.upgrade(verbose=False)
+            snapshot(args.label, verbose=True)
+        elif args.command == "list":
+            snapshots = list_snapshots()
+            for s in snapshots:
+                created = datetime.fromtimestamp(s["created_at"]).strftime("%Y-%m-%d %H:%M:%S")
+                print(f"{s['name']}  {created}  {s['bytes'] / 1e6:8.2f} MB  {s.get('label', '')}")
+            if not snapshots:
+                print(f"No snapshots in {backup_dir()}")
+        elif args.command == "restore":
+            restore(args.name, verbose=True)
+        elif args.command == "delete":
+            delete(args.name)
+            print(f"Deleted {args.name}")
+    except (ValueError, FileNotFoundError, RuntimeError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Encode time and payload size for the /api/students response.
+
+Compares the old path (jsonable_encoder + JSONResponse) with the orjson path,
+for both the row and the columnar layout, raw / gzip / brotli.
+
+Usage (from backend/):
+    python benchmarks/bench_serialization.py --students 2000 --courses 6
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from responses import FastJSONResponse, to_columnar, brotli
+
+
+def make_students(n_students: int, n_courses: int, n_items: int = 4):
+    random.seed(0)
+    courses = [f"Course_{c}" for c in range(n_courses)]
+    items = [f"Item_{i}" for i in range(n_items)]
+    students = []
+    for i in range(n_students):
+        grades = {}
+        for c in courses:
+            details = {it: random.randint(0, 30) for it in items}
+            grades[c] = {"total": float(sum(details.values())), "details": details}
+        students.append({
+            "id": i + 1,
+            "student_number": f"2023{i:05d}",
+            "name": f"Student_{i}",
+            "class_name": f"Class {i % 20 + 1}",
+            "grade_name": f"Grade {i % 3 + 10}",
+            "grades": grades,
+        })
+    return students
+
+
+def best_of(fn, repeat: int):
+    best = None
+    out = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best, out
+
+
+def measure(label: str, fn, repeat: int):
+    seconds, body = best_of(fn, repeat)
+    row = {
+        "case": label,
+        "encode_ms": round(seconds * 1000, 2),
+        "raw_bytes": len(body),
+        "gzip_bytes": len(gzip.compress(body, compresslevel=6)),
+    }
+    if brotli is not None:
+        row["br_bytes"] = len(brotli.compress(body, quality=5))
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--courses", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    students = make_students(args.students, args.courses)
+
+    results = [
+        measure("before: rows, jsonable_encoder + json",
+                lambda: JSONResponse(jsonable_encoder(students)).body, args.repeat),
+        measure("after: rows, orjson",
+                lambda: FastJSONResponse(students).body, args.repeat),
+        measure("after: columnar, orjson",
+                lambda: FastJSONResponse(to_columnar(students)).body, args.repeat),
+    ]
+    print(json.dumps({"students": args.students, "courses": args.courses, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
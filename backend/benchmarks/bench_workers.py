@@ -0,0 +1,120 @@
+"""
+Throughput with 1 vs N worker processes.
+
+Starts `python main.py --workers N` on a temp SQLite file for each N, imports
+a roster, then runs concurrent clients: most hit /api/students, a few upload a
+grade sheet at the same time (CPU-heavy parse). Reports req/s and read latency
+percentiles while imports are running.
+
+Usage (from backend/):
+    python benchmarks/bench_workers.py --workers 1 4 --clients 16 --seconds 15
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import datagen
+from run_benchmarks import percentile
+
+
+def start_server(workers: int, port: int, tmp: str):
+    env = dict(os.environ,
+               DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+               UPLOAD_DIR=os.path.join(tmp, "uploads"))
+    proc = subprocess.Popen(
+        [sys.executable, "main.py", "--workers", str(workers), "--port", str(port), "--host", "127.0.0.1"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        try:
+            httpx.get(base + "/api/courses", timeout=1)
+            return proc, base
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+def run(workers: int, clients: int, writers: int, seconds: float, roster: bytes, sheet: bytes, port: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        proc, base = start_server(workers, port, tmp)
+        try:
+            token = httpx.post(base + "/api/token", data={"username": "admin", "password": "admin123"}).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+            httpx.post(base + "/api/upload/roster", headers=headers, timeout=300,
+                       files={"file": ("roster.xlsx", roster)})
+
+            reads, writes, errors = [], [], [0]
+            deadline = time.perf_counter() + seconds
+
+            def reader():
+                with httpx.Client(base_url=base, headers=headers, timeout=60) as c:
+                    while time.perf_counter() < deadline:
+                        t0 = time.perf_counter()
+                        r = c.get("/api/students", params={"limit": 200})
+                        reads.append(time.perf_counter() - t0)
+                        errors[0] += r.status_code != 200
+
+            def writer():
+                with httpx.Client(base_url=base, headers=headers, timeout=300) as c:
+                    while time.perf_counter() < deadline:
+                        t0 = time.perf_counter()
+                        r = c.post("/api/upload/grades", params={"course_name": "Bench"},
+                                   files={"file": ("scores.xlsx", sheet)})
+                        writes.append(time.perf_counter() - t0)
+                        errors[0] += r.status_code != 200
+
+            threads = [threading.Thread(target=reader) for _ in range(clients - writers)]
+            threads += [threading.Thread(target=writer) for _ in range(writers)]
+            t0 = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - t0
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    return {
+        "workers": workers,
+        "reads_per_s": round(len(reads) / elapsed, 1),
+        "read_p50_ms": round(percentile(reads, 50) * 1000, 1),
+        "read_p95_ms": round(percentile(reads, 95) * 1000, 1),
+        "imports": len(writes),
+        "errors": errors[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--writers", type=int, default=2, help="clients uploading grade sheets")
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    roster_df = datagen.make_roster(args.students)
+    roster = datagen.to_xlsx(roster_df)
+    sheet = datagen.to_xlsx(datagen.make_grade_sheet(roster_df, "Bench", 4))
+
+    print(f"cpu_count={os.cpu_count()}")
+    for n in args.workers:
+        print(run(n, args.clients, args.writers, args.seconds, roster, sheet, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Synthetic school-scale data for benchmarks.
+
+Generates a roster and one grade workbook per course, with the kind of mess
+real exam sheets have: title rows above the header, header spelling variants,
+shuffled rows, an optional class column, blank cells, students missing from some courses.
+
+Usage (from backend/):
+    python benchmarks/datagen.py --students 3000 --courses 6 --items 5 --out /tmp/school
+"""
+import argparse
+import io
+import os
+import random
+
+import pandas as pd
+
+ID_HEADERS = ["学号", "Student ID", "Student No.", "学籍号", "ID"]
+NAME_HEADERS = ["姓名", "Name", "Student Name", "学生姓名"]
+CLASS_HEADERS = ["班级", "Class", "行政班"]
+TOTAL_HEADERS = ["总分", "Total", "Total Score", "总成绩"]
+COURSES = ["English", "Math", "Chinese", "Physics", "Chemistry", "Biology", "History", "Geography", "Politics", "Music"]
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗"
+GIVEN = "伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华"
+
+
+def make_roster(n_students: int, n_classes: int = None, seed: int = 0) -> pd.DataFrame:
+    rng = random.Random(seed)
+    n_classes = n_classes or max(1, n_students // 45)
+    rows = []
+    for i in range(n_students):
+        cls = i % n_classes
+        rows.append({
+            "学号": f"2024{i:06d}",
+            # Small name pool on purpose, so name-only matching hits duplicates
+            "姓名": rng.choice(SURNAMES) + rng.choice(GIVEN) + rng.choice(["", rng.choice(GIVEN)]),
+            "班级": f"Class {cls + 1}",
+            "年级": f"Grade {10 + cls % 3}",
+        })
+    return pd.DataFrame(rows)
+
+
+def make_grade_sheet(roster: pd.DataFrame, course: str, n_items: int, messy: bool = True,
+                     seed: int = 0, coverage: float = 0.95) -> list:
+    """Rows (header included) of one course sheet, as a list of lists."""
+    rng = random.Random(f"{seed}-{course}")
+    items = [f"{course} Part {chr(65 + k)}" for k in range(n_items)]
+    full_marks = [rng.choice([10, 20, 25, 30, 40]) for _ in items]
+
+    id_h = rng.choice(ID_HEADERS) if messy else "学号"
+    name_h = rng.choice(NAME_HEADERS) if messy else "姓名"
+    total_h = rng.choice(TOTAL_HEADERS) if messy else "总分"
+    header = [id_h, name_h, total_h] + items
+    if messy and rng.random() < 0.5:
+        header.insert(2, rng.choice(CLASS_HEADERS))
+
+    body = []
+    for rec in roster.itertuples(index=False):
+        if rng.random() > coverage:
+            continue
+        scores = [round(rng.betavariate(5, 2) * m) for m in full_marks]
+        values = {
+            id_h: rec.学号,
+            name_h: rec.姓名,
+            total_h: sum(scores),
+        }
+        for it, sc in zip(items, scores):
+            # Some blanks, as in real sheets
+            values[it] = None if messy and rng.random() < 0.02 else sc
+        for h in CLASS_HEADERS:
+            values[h] = rec.班级
+        body.append([values.get(h) for h in header])
+    rng.shuffle(body)
+
+    rows = []
+    if messy:
+        # Title and blank rows above the real header
+        rows.append([f"2024-2025 学年 {course} 期末考试成绩"] + [None] * (len(header) - 1))
+        rows.append([None] * len(header))
+    rows.append(header)
+    rows.extend(body)
+    return rows
+
+
+def to_xlsx(rows_or_df) -> bytes:
+    buf = io.BytesIO()
+    if isinstance(rows_or_df, pd.DataFrame):
+        rows_or_df.to_excel(buf, index=False)
+    else:
+        pd.DataFrame(rows_or_df).to_excel(buf, index=False, header=False)
+    return buf.getvalue()
+
+
+def generate(n_students: int = 1000, n_courses: int = 6, n_items: int = 4, messy: bool = True, seed: int = 0):
+    """Returns (roster_xlsx_bytes, {course: xlsx_bytes})."""
+    roster = make_roster(n_students, seed=seed)
+    courses = {}
+    for c in COURSES[:n_courses]:
+        courses[c] = to_xlsx(make_grade_sheet(roster, c, n_items, messy=messy, seed=seed))
+    return to_xlsx(roster), courses
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--courses", type=int, default=6)
+    parser.add_argument("--items", type=int, default=4)
+    parser.add_argument("--clean", action="store_true", help="plain headers, no title rows or blanks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_data")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    roster, courses = generate(args.students, args.courses, args.items, messy=not args.clean, seed=args.seed)
+    with open(os.path.join(args.out, "roster.xlsx"), "wb") as f:
+        f.write(roster)
+    for c, data in courses.items():
+        with open(os.path.join(args.out, f"{c}_scores.xlsx"), "wb") as f:
+            f.write(data)
+    print(f"Wrote roster ({args.students} students) and {len(courses)} course sheets to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
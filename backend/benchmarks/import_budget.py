@@ -0,0 +1,89 @@
+"""
+Import-time budget for the API process.
+
+Runs `python -X importtime -c "import main"` in a fresh interpreter and
+reports the total import time, the slowest top-level packages and the RSS
+after import. Fails (exit 1) when the total is over budget or a heavy module
+(pandas, numpy, openpyxl) gets imported at startup.
+
+Usage (from backend/):
+    python benchmarks/import_budget.py
+    python benchmarks/import_budget.py --budget-ms 800 --top 15 --runs 5
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+from lazy_imports import HEAVY_MODULES
+
+PROBE = (
+    "import main, resource, sys; "
+    "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss); "
+    "print(','.join(sorted(m for m in sys.modules if '.' not in m)))"
+)
+
+
+def measure(module: str = "main"):
+    """One cold import. Returns (total_ms, {package: cumulative_ms}, rss_mb, loaded_top_level)."""
+    probe = PROBE.replace("import main", f"import {module}")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    packages, total_us = {}, 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            cumulative = int(cumulative)
+        except ValueError:
+            continue  # header line
+        depth = len(name) - len(name.lstrip())
+        name = name.strip()
+        if depth == 1:
+            # Top level of the import tree, so nothing is counted twice
+            total_us += cumulative
+        # Cost per package = its most expensive import, wherever it happened first
+        root = name.split(".")[0]
+        if root != module:
+            packages[root] = max(packages.get(root, 0), cumulative / 1000)
+    rss_kb, loaded = proc.stdout.strip().splitlines()[-2:]
+    return total_us / 1000, packages, round(int(rss_kb) / 1024, 1), set(loaded.split(","))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("IMPORT_BUDGET_MS", 1100)))
+    parser.add_argument("--runs", type=int, default=3, help="best of N (the first run also warms .pyc files)")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.runs)]
+    total_ms, packages, rss_mb, loaded = min(runs, key=lambda r: r[0])
+
+    print(f"import {args.module}: {total_ms:.0f} ms (best of {args.runs}), RSS {rss_mb} MB, budget {args.budget_ms:.0f} ms")
+    for name, ms in sorted(packages.items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"  {ms:8.1f} ms  {name}")
+
+    heavy = sorted(m for m in HEAVY_MODULES if m in loaded)
+    failed = False
+    if heavy:
+        print(f"FAIL heavy modules imported at startup: {', '.join(heavy)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"FAIL over budget by {total_ms - args.budget_ms:.0f} ms")
+        failed = True
+    if not failed:
+        print("OK")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
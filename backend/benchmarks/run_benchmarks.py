@@ -0,0 +1,219 @@
+"""
+End-to-end benchmarks through FastAPI's TestClient against a temp SQLite file.
+
+Scenarios: roster import, grade import, preview/confirm, /api/students,
+/api/stats, login and roster export. For each: latency percentiles, throughput,
+SQL statements per call and peak RSS. Results are JSON so runs on different
+commits can be compared.
+
+Usage (from backend/):
+    python benchmarks/run_benchmarks.py --students 2000 --courses 6 --output bench.json
+    python benchmarks/run_benchmarks.py --students 2000 --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import datagen
+
+
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = (len(values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+
+
+class QueryCounter:
+    """Counts SQL statements sent to the engine."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def bench(name: str, fn, counter: QueryCounter, repeat: int, rows_per_call: int = 1) -> dict:
+    """Run fn() `repeat` times; fn returns a response that must be 200."""
+    latencies = []
+    queries = []
+    for _ in range(repeat):
+        before = counter.count
+        t0 = time.perf_counter()
+        resp = fn()
+        latencies.append(time.perf_counter() - t0)
+        queries.append(counter.count - before)
+        if resp.status_code != 200:
+            raise RuntimeError(f"{name}: HTTP {resp.status_code} {resp.text[:200]}")
+
+    total = sum(latencies)
+    result = {
+        "name": name,
+        "repeat": repeat,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(total / repeat * 1000, 2),
+        "rows_per_call": rows_per_call,
+        "rows_per_sec": round(rows_per_call * repeat / total, 1) if total else 0.0,
+        "queries_per_call": round(sum(queries) / repeat, 1),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    print(f"  {name:<24} p50 {result['p50_ms']:>9.1f} ms  p95 {result['p95_ms']:>9.1f} ms  "
+          f"{result['rows_per_sec']:>10.1f} rows/s  {result['queries_per_call']:>8.1f} queries", file=sys.stderr)
+    return result
+
+
+def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="smartgrade-bench-")
+    # Must be set before the app (and database.py) is imported
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["UPLOAD_DIR"] = os.path.join(workdir, "uploads")
+
+    from fastapi.testclient import TestClient
+    import main
+    from database import engine
+
+    print(f"Generating {args.students} students x {args.courses} courses x {args.items} items...", file=sys.stderr)
+    roster, courses = datagen.generate(args.students, args.courses, args.items, messy=not args.clean, seed=args.seed)
+    course_names = list(courses)
+
+    counter = QueryCounter(engine)
+    results = []
+    with TestClient(main.app) as client:
+        upload = lambda url, data, name="sheet.xlsx": client.post(url, files={"file": (name, data)})
+
+        results.append(bench("roster_import_new", lambda: upload("/api/upload/roster", roster),
+                             counter, 1, args.students))
+        results.append(bench("roster_import_unchanged", lambda: upload("/api/upload/roster", roster),
+                             counter, args.repeat, args.students))
+
+        it = iter(course_names * args.repeat)
+        results.append(bench("grade_import",
+                             lambda: (lambda c: upload(f"/api/upload/grades?course_name={c}", courses[c]))(next(it)),
+                             counter, len(course_names), args.students))
+
+        state = {}
+
+        def preview():
+            resp = upload("/api/upload/preview", courses[course_names[0]])
+            state["preview"] = resp.json()
+            return resp
+
+        def confirm():
+            p = state["preview"]
+            return client.post("/api/upload/confirm", json={
+                "file_key": p["file_key"], "course_name": course_names[0], "mapping": p["mapping"],
+            })
+
+        results.append(bench("upload_preview", preview, counter, args.repeat, args.students))
+        results.append(bench("upload_confirm", confirm, counter, args.repeat, args.students))
+
+        limit = args.students
+        results.append(bench("students_list", lambda: client.get(f"/api/students?limit={limit}"),
+                             counter, args.repeat, args.students))
+        results.append(bench("students_list_columnar", lambda: client.get(f"/api/students?limit={limit}&format=columnar"),
+                             counter, args.repeat, args.students))
+        results.append(bench("stats_summary_all", lambda: client.get("/api/stats/summary?course=All"),
+                             counter, args.repeat, args.students))
+        results.append(bench("stats_courses", lambda: client.get("/api/stats/courses"),
+                             counter, args.repeat, args.students))
+        results.append(bench("login", lambda: client.post("/api/token", data={"username": "admin", "password": "admin123"}),
+                             counter, args.login_repeat))
+        results.append(bench("export_roster", lambda: client.get("/api/export/roster"),
+                             counter, args.repeat, args.students))
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "students": args.students,
+            "courses": args.courses,
+            "items": args.items,
+            "messy": not args.clean,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict):
+    """Print p50 / queries change per scenario against an earlier run."""
+    old = {r["name"]: r for r in baseline["results"]}
+    print(f"\nvs {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')}):", file=sys.stderr)
+    for r in current["results"]:
+        b = old.get(r["name"])
+        if not b:
+            continue
+        change = (r["p50_ms"] - b["p50_ms"]) / b["p50_ms"] * 100 if b["p50_ms"] else 0.0
+        print(f"  {r['name']:<24} p50 {b['p50_ms']:>9.1f} -> {r['p50_ms']:>9.1f} ms ({change:+.0f}%)  "
+              f"queries {b['queries_per_call']:.0f} -> {r['queries_per_call']:.0f}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--courses", type=int, default=6)
+    parser.add_argument("--items", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--login-repeat", type=int, default=5, help="bcrypt makes logins slow on purpose")
+    parser.add_argument("--clean", action="store_true", help="plain headers, no title rows or blanks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write JSON results here (default: stdout)")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Concurrency stress test for grade imports.
+
+Starts `python main.py --workers N` on a temp SQLite file (as bench_workers)
+and checks, with parallel importers:
+
+1. Parallel uploads of the same and of different (new) courses, plus roster
+   re-uploads, all succeed: no "database is locked", no unique-constraint
+   errors, exactly one grade per student and course afterwards.
+2. Retries with one Idempotency-Key import once: every 200 carries the same
+   body, all but one are replays (or 409 while the first is running), and a
+   late retry is replayed.
+3. Reusing a key for a different request is rejected (422).
+4. A workbook whose second sheet fails mid-import leaves the database as it
+   was (checked in-process against the same file).
+
+Exits 1 on any failure. The in-process version of checks 1-3 runs with the
+test suite (tests/test_concurrent_imports.py); this script is for load over
+real worker processes.
+
+Usage (from backend/):
+    python benchmarks/stress_imports.py --workers 4 --importers 12 --rounds 3
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import uuid
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+import datagen
+from bench_workers import start_server
+
+
+def parallel(n: int, target):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def grade_counts(db_path: str) -> dict:
+    with sqlite3.connect(db_path) as conn:
+        return dict(conn.execute(
+            "SELECT c.name, COUNT(*) FROM grades g JOIN courses c ON c.id = g.course_id GROUP BY c.name"
+        ).fetchall())
+
+
+def integrity_problems(db_path: str) -> list:
+    problems = []
+    with sqlite3.connect(db_path) as conn:
+        dupes = conn.execute(
+            "SELECT COUNT(*) FROM (SELECT 1 FROM grades GROUP BY student_id, course_id HAVING COUNT(*) > 1)"
+        ).fetchone()[0]
+        if dupes:
+            problems.append(f"{dupes} duplicate (student, course) grades")
+        courses = conn.execute("SELECT COUNT(*) - COUNT(DISTINCT name) FROM courses").fetchone()[0]
+        if courses:
+            problems.append(f"{courses} duplicate course names")
+        students = conn.execute("SELECT COUNT(*) - COUNT(DISTINCT student_number) FROM students").fetchone()[0]
+        if students:
+            problems.append(f"{students} duplicate student numbers")
+    return problems
+
+
+class FailingMatcher:
+    """Delegates to the real matcher, raises on call number `fail_at`."""
+
+    def __init__(self, inner, fail_at: int):
+        self.inner, self.fail_at, self.calls = inner, fail_at, 0
+
+    def match(self, **kwargs):
+        self.calls += 1
+        if self.calls == self.fail_at:
+            raise RuntimeError("simulated failure mid-import")
+        return self.inner.match(**kwargs)
+
+
+def check_atomic_workbook(db_path: str, sheets: dict) -> list:
+    """Import two sheets in one workbook transaction, failing halfway through the second."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from grade_import import read_grade_sheet
+    from column_mapping import suggest_mapping, GRADE_FIELDS
+    from matching import StudentMatcher
+    import workbook_import
+
+    before = grade_counts(db_path)
+    engine = create_engine(f"sqlite:///{db_path}")
+    plans, rows = [], 0
+    for n, (course, sheet) in enumerate(sheets.items()):
+        df, header_row = read_grade_sheet(sheet)
+        plans.append(workbook_import.SheetPlan(sheet=course, header_row=header_row,
+                                               frames=[(f"Atomic {n}", df, suggest_mapping(df.columns, GRADE_FIELDS))]))
+        rows += len(df) if n == 0 else len(df) // 2
+    with Session(engine) as db:
+        matcher = FailingMatcher(StudentMatcher.from_db(db), fail_at=rows)
+        report = workbook_import.import_workbook(db, plans, matcher=matcher)
+    engine.dispose()
+
+    problems = []
+    if report["status"] != "rolled_back":
+        problems.append(f"failing workbook finished with status {report['status']}")
+    if grade_counts(db_path) != before:
+        problems.append("failing workbook left grades behind")
+    return problems
+
+
+def run(args) -> list:
+    roster_df = datagen.make_roster(args.students)
+    roster = datagen.to_xlsx(roster_df)
+    courses = [f"Stress {k}" for k in range(args.courses)]
+    sheets = {c: datagen.to_xlsx(datagen.make_grade_sheet(roster_df, c, 4, messy=False)) for c in courses}
+    problems = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        proc, base = start_server(args.workers, args.port, tmp)
+        try:
+            client = httpx.Client(base_url=base, timeout=300)
+            r = client.post("/api/upload/roster", files={"file": ("roster.xlsx", roster)})
+            if r.status_code != 200:
+                return [f"roster import failed: {r.status_code} {r.text[:200]}"]
+
+            # 1. Parallel importers: several per course, courses created on the fly, roster re-uploads in between
+            statuses, matched = [], {}
+
+            def importer(i):
+                with httpx.Client(base_url=base, timeout=300) as c:
+                    for n in range(args.rounds):
+                        if i == 0 and n % 2:
+                            r = c.post("/api/upload/roster", files={"file": ("roster.xlsx", roster)},
+                                       headers={"Idempotency-Key": uuid.uuid4().hex})
+                        else:
+                            course = courses[(i + n) % len(courses)]
+                            r = c.post("/api/upload/grades", params={"course_name": course},
+                                       files={"file": ("scores.xlsx", sheets[course])},
+                                       headers={"Idempotency-Key": uuid.uuid4().hex})
+                            if r.status_code == 200:
+                                matched.setdefault(course, set()).add(r.json()["matched"])
+                        statuses.append((r.status_code, r.text[:200]))
+
+            parallel(args.importers, importer)
+            failed = [s for s in statuses if s[0] != 200]
+            print(f"parallel imports: {len(statuses)} requests, {len(failed)} failed")
+            problems += [f"parallel import failed: {code} {text}" for code, text in failed[:5]]
+            counts = grade_counts(db_path)
+            for course, seen in matched.items():
+                if len(seen) != 1 or counts.get(course) != min(seen):
+                    problems.append(f"{course}: {counts.get(course)} grades stored, responses said {sorted(seen)}")
+
+            # 2. Retries with one key, sent at the same time
+            key, course = uuid.uuid4().hex, courses[0]
+            retries = []
+
+            def retry(i):
+                with httpx.Client(base_url=base, timeout=300) as c:
+                    r = c.post("/api/upload/grades", params={"course_name": course},
+                               files={"file": ("scores.xlsx", sheets[course])}, headers={"Idempotency-Key": key})
+                    retries.append((r.status_code, r.headers.get("Idempotent-Replayed"), r.content))
+
+            parallel(args.importers, retry)
+            retry(-1)  # a late retry, after the first one finished
+            ok = [r for r in retries if r[0] == 200]
+            fresh = [r for r in ok if r[1] != "true"]
+            print(f"same-key retries: {len(retries)} requests, {len(ok)} ok, {len(fresh)} executed, "
+                  f"{sum(r[0] == 409 for r in retries)} in progress")
+            if len(fresh) != 1:
+                problems.append(f"same-key retries executed {len(fresh)} times")
+            if len({r[2] for r in ok}) != 1:
+                problems.append("replayed responses differ from the original")
+            if retries[-1][1] != "true":
+                problems.append("late retry was not replayed")
+            if any(r[0] not in (200, 409) for r in retries):
+                problems.append(f"unexpected retry statuses {sorted({r[0] for r in retries})}")
+
+            # 3. Same key, different request
+            r = client.post("/api/upload/grades", params={"course_name": courses[-1]},
+                            files={"file": ("scores.xlsx", sheets[courses[-1]])}, headers={"Idempotency-Key": key})
+            if r.status_code != 422:
+                problems.append(f"key reuse for another request returned {r.status_code}, expected 422")
+            client.close()
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+        problems += integrity_problems(db_path)
+        # 4. All-or-nothing workbook import
+        problems += check_atomic_workbook(db_path, {c: sheets[c] for c in courses[:2]})
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=max(2, os.cpu_count() or 1))
+    parser.add_argument("--importers", type=int, default=8, help="parallel clients")
+    parser.add_argument("--rounds", type=int, default=3, help="uploads per client")
+    parser.add_argument("--courses", type=int, default=3)
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    problems = run(args)
+    for p in problems:
+        print(f"FAIL {p}")
+    if not problems:
+        print("OK")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+One-time startup work: schema migrations and the default admin account.
+
+With several workers every process starts the app, so this runs under an
+exclusive file lock next to the database; the first process does the work,
+the others wait and then find nothing left to do.
+"""
+import os
+from contextlib import contextmanager
+
+from sqlalchemy.exc import IntegrityError
+
+import models, auth, migrations
+from database import SessionLocal, engine as default_engine, SQLALCHEMY_DATABASE_URL
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process dev server, no lock needed
+    fcntl = None
+
+DEFAULT_ADMIN_USERNAME = "admin"
+DEFAULT_ADMIN_PASSWORD = "admin123"
+
+
+def lock_path() -> str:
+    path = os.environ.get("BOOTSTRAP_LOCK")
+    if path:
+        return path
+    if SQLALCHEMY_DATABASE_URL.startswith("sqlite:///"):
+        db_file = SQLALCHEMY_DATABASE_URL[len("sqlite:///"):]
+        return os.path.join(os.path.dirname(os.path.abspath(db_file)), ".smartgrade-bootstrap.lock")
+    return os.path.abspath(".smartgrade-bootstrap.lock")
+
+
+@contextmanager
+def startup_lock():
+    if fcntl is None:
+        yield
+        return
+    with open(lock_path(), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def create_default_admin():
+    db = SessionLocal()
+    try:
+        admin = db.query(models.User).filter(models.User.username == DEFAULT_ADMIN_USERNAME).first()
+        if not admin:
+            hashed_pwd = auth.get_password_hash(DEFAULT_ADMIN_PASSWORD)
+            admin_user = models.User(username=DEFAULT_ADMIN_USERNAME, hashed_password=hashed_pwd, role="admin")
+            db.add(admin_user)
+            try:
+                db.commit()
+                print(f"Default admin created: {DEFAULT_ADMIN_USERNAME}/{DEFAULT_ADMIN_PASSWORD}")
+            except IntegrityError:
+                # Another process without the lock (e.g. a second host) got there first
+                db.rollback()
+    finally:
+        db.close()
+
+
+def bootstrap(engine=default_engine):
+    """Migrate the schema and make sure the admin exists. Safe to call from every worker."""
+    with startup_lock():
+        migrations.upgrade(engine)
+        create_default_admin()
+
+
+if __name__ == "__main__":
+    bootstrap()
@@ -0,0 +1,254 @@
+"""
+Offline bulk grade import: a folder (or glob) of subject workbooks in one go.
+
+Workbooks are parsed and matched to students in worker processes, with the
+same header detection, column mapping (saved profiles first) and matching
+as the upload endpoints. The results come back to this process, the only
+writer, which saves each workbook in one transaction with bulk upserts.
+
+Course names: a single-subject sheet is named after the file
+("Biology_scores.xlsx" -> "Biology") when the workbook has one sheet, after
+the sheet otherwise; side-by-side subjects use their group labels. Names
+match existing courses exactly, as in the upload endpoints.
+
+Running servers pick the new grades up through the cache bus and the change
+feed, no restart needed. A "pre-import" snapshot is taken before the first
+write (see backups.py); restoring it undoes the whole run.
+
+Usage (from backend/):
+    python bulk_import.py ../*_scores.xlsx
+    python bulk_import.py /data/term1 --workers 4 --dry-run
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import models, crud, cache_bus, migrations, backups, grade_store
+from database import SessionLocal
+
+WORKBOOK_PATTERNS = ("*.xlsx", "*.xlsm", "*.xls")
+COURSE_SUFFIX = re.compile(r"[\s_\-]*(scores?|grades?|marks?|results?|成绩单?|分数)$", re.IGNORECASE)
+
+# Set in each worker by _init_worker
+_matcher = None
+_profiles = None
+
+
+def find_workbooks(sources: list) -> list:
+    """Workbook paths from files, directories and glob patterns; Excel lock files (~$...) are skipped."""
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            found = [p for pattern in WORKBOOK_PATTERNS for p in glob.glob(os.path.join(source, pattern))]
+        elif os.path.exists(source):
+            found = [source]
+        else:
+            found = glob.glob(source)
+        paths.extend(p for p in sorted(found) if not os.path.basename(p).startswith("~$"))
+    # Same file named twice (directory and glob) is imported once
+    seen = set()
+    return [p for p in paths if not (os.path.abspath(p) in seen or seen.add(os.path.abspath(p)))]
+
+
+def course_from_filename(path: str) -> str:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return COURSE_SUFFIX.sub("", stem).strip() or stem
+
+
+def _init_worker(matcher, profiles):
+    global _matcher, _profiles
+    _matcher, _profiles = matcher, profiles
+
+
+def parse_workbook_file(path: str) -> dict:
+    """
+    Parse and match one workbook (runs in a worker process).
+    Returns {"path", "seconds", "rows", "sheets": [{"sheet", "layout", "error",
+    "courses": [{"course", "mapping", "grades", "unmatched", "ambiguous"}]}]}.
+    """
+    import pandas as pd
+    from column_mapping import header_signature
+    from grade_import import match_grade_frame
+    import workbook_import
+
+    t0 = time.perf_counter()
+    sheets = pd.read_excel(path, sheet_name=None, header=None)
+    # One sheet: the file name says which subject it is
+    course_map = {name: course_from_filename(path) for name in sheets} if len(sheets) == 1 else {}
+
+    result = {"path": path, "rows": 0, "sheets": []}
+    for name, df_raw in sheets.items():
+        plan = workbook_import.plan_sheet(str(name), df_raw, workbook_import.MODE_AUTO, course_map)
+        entry = {"sheet": plan.sheet, "layout": plan.layout, "error": plan.error, "courses": []}
+        for course_name, df, mapping in plan.frames:
+            if plan.layout == "single":
+                # A confirmed template wins over the guess, as in /api/upload/grades
+                mapping = _profiles.get(header_signature(df.columns), mapping)
+                # Cells are read as objects, so look at the values: item columns without a total still count
+                if not mapping.get("total_score") and not any(
+                        pd.to_numeric(df[col], errors="coerce").notna().any()
+                        for col in df.columns if col not in mapping.values()):
+                    # A roster or other list that happens to have 学号 / 姓名 in the same folder
+                    entry["error"] = "No score columns"
+                    continue
+            grades, unmatched, ambiguous = match_grade_frame(df, mapping, _matcher)
+            result["rows"] += len(df)
+            entry["courses"].append({
+                "course": course_name,
+                "mapping": mapping,
+                "grades": grades,
+                "unmatched": len(unmatched),
+                "ambiguous": len(ambiguous),
+            })
+        result["sheets"].append(entry)
+    result["seconds"] = time.perf_counter() - t0
+    return result
+
+
+def save_workbook(db, parsed: dict) -> int:
+    """
+    Write one parsed workbook in a single transaction, with the grade store
+    version bump that makes running servers drop their snapshots.
+    Returns the number of grades written.
+    """
+    crud.begin_write(db)
+    written = 0
+    try:
+        for entry in parsed["sheets"]:
+            for c in entry["courses"]:
+                course = crud.get_or_create_course(db, c["course"], commit=False)
+                written += crud.upsert_grades(db, course.id, c["grades"], commit=False)
+        if written:
+            cache_bus.bump(db, grade_store.CHANNEL)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return written
+
+
+def run(paths: list, workers: int, dry_run: bool = False, snapshot: bool = True) -> dict:
+    from matching import StudentMatcher
+
+    migrations.upgrade(verbose=False)
+    db = SessionLocal()
+    try:
+        matcher = StudentMatcher.from_db(db)
+        if not matcher.by_number and not matcher.by_name:
+            print("Warning: no students in the database, import the roster first")
+        profiles = {p.signature: dict(p.mapping) for p in db.query(models.MappingProfile) if p.mapping}
+
+        totals = {"files": len(paths), "failed": 0, "sheets": 0, "rows": 0, "matched": 0, "written": 0,
+                  "unmatched": 0, "ambiguous": 0, "courses": set(), "parse_seconds": 0.0, "write_seconds": 0.0,
+                  "snapshot": None}
+        if snapshot and not dry_run:
+            totals["snapshot"] = backups.snapshot_before_import("bulk_import")
+        t0 = time.perf_counter()
+        if workers > 1 and len(paths) > 1:
+            # spawn: same start method as the report pool, nothing inherited from this process
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_init_worker, initargs=(matcher, profiles))
+            futures = {pool.submit(parse_workbook_file, p): p for p in paths}
+            results = (_outcome(f, futures[f]) for f in as_completed(futures))
+        else:
+            pool = None
+            _init_worker(matcher, profiles)
+            results = (_outcome_inline(p) for p in paths)
+
+        try:
+            for n, (path, parsed, error) in enumerate(results, 1):
+                prefix = f"[{n}/{len(paths)}] {os.path.basename(path)}"
+                if error is not None:
+                    totals["failed"] += 1
+                    print(f"{prefix}: FAILED {error}")
+                    continue
+
+                totals["parse_seconds"] += parsed["seconds"]
+                totals["rows"] += parsed["rows"]
+                parts = []
+                for entry in parsed["sheets"]:
+                    totals["sheets"] += 1
+                    if entry["error"]:
+                        parts.append(f"sheet '{entry['sheet']}' skipped ({entry['error']})")
+                    for c in entry["courses"]:
+                        totals["courses"].add(c["course"])
+                        totals["matched"] += len(c["grades"])
+                        totals["unmatched"] += c["unmatched"]
+                        totals["ambiguous"] += c["ambiguous"]
+                        parts.append(f"{c['course']} {len(c['grades'])} matched"
+                                     + (f", {c['unmatched']} unmatched" if c["unmatched"] else "")
+                                     + (f", {c['ambiguous']} ambiguous" if c["ambiguous"] else ""))
+
+                if not dry_run:
+                    w0 = time.perf_counter()
+                    try:
+                        totals["written"] += save_workbook(db, parsed)
+                    except Exception as e:
+                        totals["failed"] += 1
+                        print(f"{prefix}: FAILED to save, nothing written ({e})")
+                        continue
+                    totals["write_seconds"] += time.perf_counter() - w0
+                print(f"{prefix}: {'; '.join(parts) or 'nothing to import'} ({parsed['seconds']:.2f} s parse)")
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+        totals["seconds"] = time.perf_counter() - t0
+        return totals
+    finally:
+        db.close()
+
+
+def _outcome(future, path):
+    try:
+        return path, future.result(), None
+    except Exception as e:
+        return path, None, e
+
+
+def _outcome_inline(path):
+    try:
+        return path, parse_workbook_file(path), None
+    except Exception as e:
+        return path, None, e
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a folder of grade workbooks")
+    parser.add_argument("sources", nargs="+", help="workbook files, directories or glob patterns")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="parser processes")
+    parser.add_argument("--dry-run", action="store_true", help="parse and match only, write nothing")
+    parser.add_argument("--no-snapshot", action="store_true", help="skip the pre-import database snapshot")
+    args = parser.parse_args()
+
+    paths = find_workbooks(args.sources)
+    if not paths:
+        print("No workbooks found.")
+        sys.exit(1)
+    print(f"{len(paths)} workbooks, {min(args.workers, len(paths))} workers{' (dry run)' if args.dry_run else ''}")
+
+    t = run(paths, args.workers, args.dry_run, snapshot=not args.no_snapshot)
+    elapsed = max(t["seconds"], 1e-9)
+    print(
+        f"\n{t['files'] - t['failed']}/{t['files']} workbooks, {t['sheets']} sheets, {len(t['courses'])} courses, "
+        f"{t['rows']} rows: {t['matched']} matched, {t['unmatched']} unmatched, {t['ambiguous']} ambiguous"
+    )
+    print(
+        f"{elapsed:.2f} s wall, {t['rows'] / elapsed:.0f} rows/s, {t['files'] / elapsed:.1f} workbooks/s "
+        f"(parse {t['parse_seconds']:.2f} s in workers, write {t['write_seconds']:.2f} s)"
+    )
+    if args.dry_run:
+        print("Dry run: nothing was written.")
+    else:
+        print(f"{t['written']} grades written.")
+        if t["snapshot"]:
+            print(f"Undo with: python backups.py restore {t['snapshot']}")
+    sys.exit(1 if t["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
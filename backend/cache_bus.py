@@ -0,0 +1,95 @@
+"""
+Cross-worker cache invalidation through the database.
+
+Each cache has a named channel in the `cache_versions` table. A write that
+makes a cache stale bumps the channel in the same transaction; every process
+compares its last seen version at most once per CACHE_CHECK_INTERVAL seconds
+and drops its local copy when the version moved. No extra services needed,
+and a worker never serves data more than one interval older than the DB.
+"""
+import os
+import threading
+import time
+
+from sqlalchemy import text
+
+from database import engine as default_engine
+
+CACHE_CHECK_INTERVAL = float(os.environ.get("CACHE_CHECK_INTERVAL", 1.0))
+
+_bump_sql = text(
+    "INSERT INTO cache_versions (name, version) VALUES (:name, 1) "
+    "ON CONFLICT(name) DO UPDATE SET version = version + 1 RETURNING version"
+)
+
+
+def bump(db, name: str) -> int:
+    """Mark channel `name` stale. Runs in the caller's transaction (Session or Connection). Returns the new version."""
+    version = db.execute(_bump_sql, {"name": name}).scalar()
+    cache = _caches.get(name)
+    if cache is not None:
+        cache.clear()
+    return version
+
+
+def read_version(name: str, engine=default_engine) -> int:
+    with engine.connect() as conn:
+        row = conn.execute(text("SELECT version FROM cache_versions WHERE name = :name"), {"name": name}).first()
+    return row[0] if row else 0
+
+
+_caches = {}
+
+
+class VersionedCache:
+    """In-process dict cache for one channel."""
+
+    def __init__(self, name: str, check_interval: float = CACHE_CHECK_INTERVAL, engine=default_engine):
+        self.name = name
+        self.check_interval = check_interval
+        self.engine = engine
+        self._data = {}
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        _caches[name] = self
+
+    def _sync(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        version = read_version(self.name, self.engine)
+        with self._lock:
+            if version != self._version:
+                self._data.clear()
+                self._version = version
+            self._checked_at = now
+
+    def get(self, key, default=None):
+        self._sync()
+        with self._lock:
+            return self._data.get(key, default)
+
+    def __contains__(self, key):
+        self._sync()
+        with self._lock:
+            return key in self._data
+
+    def set(self, key, value):
+        self._sync()
+        with self._lock:
+            self._data[key] = value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        """Drop local entries and re-read the version on next access."""
+        with self._lock:
+            self._data.clear()
+            self._checked_at = 0.0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
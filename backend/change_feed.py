@@ -0,0 +1,179 @@
+"""
+Change feed: compact deltas of grade, course and student writes with
+monotonic sequence numbers, for dashboards to patch their local state
+instead of refetching /api/students and /api/courses.
+
+- Writers call record() in their own transaction, so an event exists exactly
+  when its change is committed. SQLite has a single writer, so sequence
+  order is commit order.
+- Each worker polls the table every CHANGE_FEED_POLL seconds while it has
+  open streams (one query for all of them) and fans new events out.
+- Clients resume with ?since=<seq> or the Last-Event-ID header. If the events
+  they missed were pruned (only the last CHANGE_FEED_RETAIN are kept), they
+  get a "reset" event and should refetch everything.
+
+Event kinds and payloads:
+    grades          {"course": name, "rows": [[student_id, total, sub_scores], ...]}
+    course          {"course": name, "is_visible": bool}
+    course_deleted  {"course": name}
+    students        {"rows": [{"id": ..., <fields that changed>}, ...]}
+    reset           {"latest": seq}, or {"restored": snapshot name} after a restore (backups.py)
+"""
+import asyncio
+import contextvars
+import json
+import os
+import time
+from collections import deque
+
+from sqlalchemy import delete, func, insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+import models
+from database import SessionLocal
+
+CHANGE_FEED_POLL = float(os.environ.get("CHANGE_FEED_POLL", 0.5))
+CHANGE_FEED_RETAIN = int(os.environ.get("CHANGE_FEED_RETAIN", 5000))
+HEARTBEAT_SECONDS = 15
+BATCH = 500
+PRUNE_EVERY = 100
+
+GRADES, COURSE, COURSE_DELETED, STUDENTS, RESET = "grades", "course", "course_deleted", "students", "reset"
+
+
+def record(db: Session, kind: str, payload: dict) -> int:
+    """Append an event in the caller's transaction. Returns its sequence number."""
+    seq = db.execute(
+        insert(models.ChangeEvent)
+        .values(kind=kind, payload=payload, created_at=time.time())
+        .returning(models.ChangeEvent.seq)
+    ).scalar()
+    if seq % PRUNE_EVERY == 0:
+        db.execute(delete(models.ChangeEvent).where(models.ChangeEvent.seq <= seq - CHANGE_FEED_RETAIN))
+    return seq
+
+
+def latest_seq(db: Session) -> int:
+    return db.query(func.max(models.ChangeEvent.seq)).scalar() or 0
+
+
+def read(since: int, limit: int = BATCH) -> dict:
+    """Events after `since`: {"latest", "reset", "events": [{"seq", "kind", "payload"}]}."""
+    with SessionLocal() as db:
+        latest = latest_seq(db)
+        oldest = db.query(func.min(models.ChangeEvent.seq)).scalar()
+        if since > latest or (oldest is not None and since < oldest - 1):
+            # From another database, or the events in between were pruned
+            return {"latest": latest, "reset": True, "events": []}
+        rows = (
+            db.query(models.ChangeEvent.seq, models.ChangeEvent.kind, models.ChangeEvent.payload)
+            .filter(models.ChangeEvent.seq > since)
+            .order_by(models.ChangeEvent.seq)
+            .limit(limit)
+            .all()
+        )
+    return {
+        "latest": latest,
+        "reset": False,
+        "events": [{"seq": seq, "kind": kind, "payload": payload} for seq, kind, payload in rows],
+    }
+
+
+def sse_message(seq: int, kind: str, payload: dict) -> str:
+    data = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str)
+    return f"id: {seq}\nevent: {kind}\ndata: {data}\n\n"
+
+
+class ChangeFeed:
+    """Per-process fan-out: one poller for any number of SSE streams."""
+
+    def __init__(self, poll_interval: float = CHANGE_FEED_POLL, buffer_size: int = 1000):
+        self.poll_interval = poll_interval
+        self._buffer = deque(maxlen=buffer_size)  # recent events as (seq, kind, payload)
+        self._covered = 0  # every event after this seq is in the buffer
+        self._latest = 0
+        self._loop = None
+        self._task = None
+        self._ready = None
+        self._changed = None
+        self.streams = 0
+
+    def _ensure_polling(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._loop is not loop:
+            self._loop = loop
+            self._ready = asyncio.Event()
+            self._changed = asyncio.Condition()
+            # Fresh context: the poller's queries must not be profiled as part of the request that started it
+            self._task = loop.create_task(self._poll(), context=contextvars.Context())
+
+    async def _poll(self):
+        try:
+            with SessionLocal() as db:
+                latest = await run_in_threadpool(latest_seq, db)
+            self._buffer.clear()
+            self._covered = self._latest = latest
+            self._ready.set()
+            while self.streams:
+                try:
+                    page = await run_in_threadpool(read, self._latest)
+                except Exception as e:
+                    print(f"Change feed poll failed: {e}")
+                    page = {"reset": False, "events": []}
+                if page["reset"]:
+                    # The table was reset under us (restore); streams fall back to read() and get a reset
+                    self._buffer.clear()
+                    self._covered = self._latest = page["latest"]
+                for ev in page["events"]:
+                    if len(self._buffer) == self._buffer.maxlen:
+                        self._covered = self._buffer[0][0]
+                    self._buffer.append((ev["seq"], ev["kind"], ev["payload"]))
+                    self._latest = ev["seq"]
+                if page["events"] or page["reset"]:
+                    async with self._changed:
+                        self._changed.notify_all()
+                if len(page["events"]) < BATCH:
+                    await asyncio.sleep(self.poll_interval)
+        finally:
+            if self._task is asyncio.current_task():
+                self._task = None
+
+    async def _wait(self, timeout: float) -> bool:
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
+
+    async def stream(self, since: int = None):
+        """SSE text for every event after `since` (default: from now on), until the client goes away."""
+        self.streams += 1
+        try:
+            self._ensure_polling()
+            await self._ready.wait()
+            seq = self._latest if since is None else since
+            yield "retry: 3000\n\n"
+            while True:
+                if self._covered <= seq <= self._latest:
+                    events = [ev for ev in self._buffer if ev[0] > seq]
+                else:
+                    # Behind the buffer (long reconnect) or ahead of this worker's poller
+                    page = await run_in_threadpool(read, seq)
+                    if page["reset"]:
+                        seq = page["latest"]
+                        yield sse_message(seq, RESET, {"latest": seq})
+                        continue
+                    events = [(ev["seq"], ev["kind"], ev["payload"]) for ev in page["events"]]
+                for ev_seq, kind, payload in events:
+                    seq = ev_seq
+                    yield sse_message(ev_seq, kind, payload)
+                if not events and not await self._wait(HEARTBEAT_SECONDS):
+                    # Comment line: keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+        finally:
+            self.streams -= 1
+
+
+feed = ChangeFeed()
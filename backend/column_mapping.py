@@ -0,0 +1,164 @@
+"""
+Column mapping engine shared by all upload endpoints.
+
+- score_header / suggest_mapping: token + fuzzy matching of sheet headers
+  against known keywords (Chinese and English).
+- detect_header_row: pick the header row in the first rows of a raw sheet.
+- Mapping profiles: once a teacher confirms a mapping in the preview UI it is
+  stored under a hash of the header row, so the next upload of the same
+  template maps itself.
+"""
+import difflib
+import hashlib
+import re
+import unicodedata
+
+from sqlalchemy.orm import Session
+
+import crud, cache_bus
+
+# Fields for grade sheets (keys match ImportConfirmRequest.mapping)
+GRADE_FIELDS = {
+    "student_id": ["学号", "学籍号", "考号", "准考证号", "student id", "student no", "student number", "id", "no"],
+    "name": ["姓名", "名字", "学生姓名", "name", "student name", "full name"],
+    "class_name": ["班级", "行政班", "class", "class name", "form"],
+    "total_score": ["总分", "总成绩", "成绩", "得分", "total", "total score", "score", "sum"],
+}
+
+# Fields for the roster sheet
+ROSTER_FIELDS = {
+    "student_id": GRADE_FIELDS["student_id"],
+    "name": GRADE_FIELDS["name"],
+    "class_name": GRADE_FIELDS["class_name"],
+    "grade_name": ["年级", "grade", "grade level", "year"],
+}
+
+# A row is a header row if it contains at least one of these
+KEY_FIELDS = ("student_id", "name")
+
+MIN_SCORE = 0.6
+FUZZY_RATIO = 0.85
+HEADER_SCAN_ROWS = 10
+
+_punct = re.compile(r"[\s_\-:：()（）\[\]【】/\\.#*]+")
+_cjk = re.compile(r"[一-鿿]")
+
+
+def normalize_header(value) -> str:
+    if value is None or value != value:  # None / NaN
+        return ""
+    s = unicodedata.normalize("NFKC", str(value)).casefold()
+    return _punct.sub(" ", s).strip()
+
+
+def is_unnamed(col) -> bool:
+    return not normalize_header(col) or str(col).startswith("Unnamed")
+
+
+def score_header(header, keywords) -> float:
+    """How well one header matches a field's keywords, 0..1."""
+    h = normalize_header(header)
+    if not h:
+        return 0.0
+    tokens = set(h.split())
+    best = 0.0
+    for kw in keywords:
+        if h == kw:
+            return 1.0
+        if _cjk.search(kw):
+            # No word boundaries in Chinese, substring is the best we have
+            score = 0.9 if kw in h else 0.0
+        elif set(kw.split()) <= tokens:
+            score = 0.85
+        elif len(kw) >= 4 and kw in h:
+            score = 0.65
+        else:
+            # Typos / variants ("Totl Score", "Student Nmae"), only when close
+            ratio = difflib.SequenceMatcher(None, h, kw).ratio()
+            score = 0.75 * ratio if ratio >= FUZZY_RATIO else 0.0
+        best = max(best, score)
+    return best
+
+
+def suggest_mapping(columns, fields=GRADE_FIELDS, min_score: float = MIN_SCORE) -> dict:
+    """
+    Assign each field to at most one column (and each column to one field),
+    best scores first. Returns {field: column}, only for fields that matched.
+    """
+    candidates = []
+    for ci, col in enumerate(columns):
+        if is_unnamed(col):
+            continue
+        for fi, (field, keywords) in enumerate(fields.items()):
+            score = score_header(col, keywords)
+            if score >= min_score:
+                # Ties: earlier field, then earlier column
+                candidates.append((-score, fi, ci, field, col))
+
+    mapping = {}
+    used = set()
+    for _, _, ci, field, col in sorted(candidates, key=lambda c: c[:3]):
+        if field in mapping or ci in used:
+            continue
+        mapping[field] = col
+        used.add(ci)
+    return mapping
+
+
+def detect_header_row(df_raw, fields=GRADE_FIELDS, max_rows: int = HEADER_SCAN_ROWS) -> int:
+    """Index of the row (in a header=None frame) that looks most like a header."""
+    best_idx, best_score = 0, 0.0
+    for i in range(min(max_rows, len(df_raw))):
+        values = df_raw.iloc[i].tolist()
+        mapping = suggest_mapping(values, fields)
+        keys = sum(1 for f in KEY_FIELDS if f in mapping)
+        if not keys:
+            continue
+        score = keys + 0.1 * (len(mapping) - keys)
+        if score > best_score:
+            best_idx, best_score = i, score
+    return best_idx
+
+
+def header_signature(columns) -> str:
+    """Stable hash of a header row, used as the mapping profile key."""
+    names = [normalize_header(c) for c in columns if not is_unnamed(c)]
+    return hashlib.sha256("\x1f".join(names).encode("utf-8")).hexdigest()[:32]
+
+
+# signature -> mapping, for profiles already read from the DB; shared invalidation across workers
+PROFILE_CHANNEL = "mapping_profiles"
+_profile_cache = cache_bus.VersionedCache(PROFILE_CHANNEL)
+
+
+def get_profile(db: Session, signature: str):
+    mapping = _profile_cache.get(signature)
+    if mapping is not None:
+        return mapping
+    profile = crud.get_mapping_profile(db, signature)
+    mapping = dict(profile.mapping) if profile else None
+    if mapping is not None:
+        _profile_cache.set(signature, mapping)
+    return mapping
+
+
+def save_profile(db: Session, signature: str, mapping: dict, header_row: int = 0):
+    # Only keep the fields we know about, empty selections mean "none"
+    clean = {k: v for k, v in mapping.items() if v and k in GRADE_FIELDS}
+    # Committed together with the profile by crud.save_mapping_profile
+    cache_bus.bump(db, PROFILE_CHANNEL)
+    crud.save_mapping_profile(db, signature, clean, header_row)
+    return clean
+
+
+def resolve_mapping(db: Session, columns):
+    """
+    Mapping for a grade sheet: the stored profile if this template was seen
+    before, otherwise the engine's suggestion.
+    Returns (mapping, signature, profile_hit).
+    """
+    signature = header_signature(columns)
+    profile = get_profile(db, signature)
+    if profile is not None:
+        return profile, signature, True
+    return suggest_mapping(columns, GRADE_FIELDS), signature, False
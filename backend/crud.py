@@ -1,6 +1,26 @@
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-import models, schemas
+import models, schemas, change_feed
+
+def upsert_insert(db: Session):
+    """insert() of the session's dialect, the one with on_conflict_do_update / do_nothing."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+def begin_write(db: Session):
+    """
+    SQLite: take the write lock at the start of the transaction (BEGIN IMMEDIATE).
+    A deferred transaction that reads first and writes later fails with "database is
+    locked" when another worker wrote in between; an immediate one waits for busy_timeout.
+    """
+    if db.get_bind().dialect.name != "sqlite":
+        return
+    if not db.connection().connection.driver_connection.in_transaction:
+        db.execute(text("BEGIN IMMEDIATE"))
 
 def get_student_by_number(db: Session, student_number: str):
     return db.query(models.Student).filter(models.Student.student_number == student_number).first()
@@ -9,9 +29,18 @@ def create_student(db: Session, student: schemas.StudentCreate):
     db_student = models.Student(
         student_number=student.student_number,
         name=student.name,
+        grade_name=student.grade_name,
         class_name=student.class_name
     )
     db.add(db_student)
+    db.flush()
+    change_feed.record(db, change_feed.STUDENTS, {"rows": [{
+        "id": db_student.id,
+        "student_number": db_student.student_number,
+        "name": db_student.name,
+        "class_name": db_student.class_name,
+        "grade_name": db_student.grade_name,
+    }]})
     db.commit()
     db.refresh(db_student)
     return db_student
@@ -19,35 +48,95 @@ def create_student(db: Session, student: schemas.StudentCreate):
 def get_course_by_name(db: Session, name: str):
     return db.query(models.Course).filter(models.Course.name == name).first()
 
-def create_course(db: Session, name: str):
+def create_course(db: Session, name: str, commit: bool = True):
     db_course = models.Course(name=name)
     db.add(db_course)
+    if not commit:
+        # Caller owns the transaction, just get the id
+        db.flush()
+        return db_course
     db.commit()
     db.refresh(db_course)
     return db_course
 
-def create_or_update_grade(db: Session, student_id: int, course_id: int, total_score: float, sub_scores: dict):
-    # Check if grade exists
-    db_grade = db.query(models.Grade).filter(
+def get_or_create_course(db: Session, name: str, commit: bool = True):
+    # INSERT OR IGNORE: two imports creating the same new course don't collide on the unique name
+    insert = upsert_insert(db)
+    created = db.execute(
+        insert(models.Course).values(name=name, is_visible=True).on_conflict_do_nothing(index_elements=["name"])
+    ).rowcount
+    if created:
+        change_feed.record(db, change_feed.COURSE, {"course": name, "is_visible": True})
+    if commit:
+        db.commit()
+    return get_course_by_name(db, name)
+
+def upsert_grades(db: Session, course_id: int, grades: dict, commit: bool = True) -> int:
+    """
+    Insert or update the grades of one course in bulk: {student_id: (total_score, sub_scores)}.
+    Native upsert on (student_id, course_id), so concurrent imports of the same course
+    can't race into the unique constraint. Returns the number of rows written.
+    """
+    if grades:
+        insert = upsert_insert(db)
+        stmt = insert(models.Grade)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["student_id", "course_id"],
+            set_={"total_score": stmt.excluded.total_score, "sub_scores": stmt.excluded.sub_scores},
+        )
+        db.execute(stmt, [
+            {"student_id": student_id, "course_id": course_id, "total_score": total, "sub_scores": sub_scores}
+            for student_id, (total, sub_scores) in grades.items()
+        ])
+        change_feed.record(db, change_feed.GRADES, {
+            "course": db.get(models.Course, course_id).name,
+            "rows": [[student_id, total, sub_scores] for student_id, (total, sub_scores) in grades.items()],
+        })
+    if commit:
+        db.commit()
+    return len(grades)
+
+def create_or_update_grade(db: Session, student_id: int, course_id: int, total_score: float, sub_scores: dict, commit: bool = True):
+    upsert_grades(db, course_id, {student_id: (total_score, sub_scores)}, commit=commit)
+    return db.query(models.Grade).filter(
         models.Grade.student_id == student_id,
         models.Grade.course_id == course_id
     ).first()
 
-    if db_grade:
-        db_grade.total_score = total_score
-        db_grade.sub_scores = sub_scores
+def delete_course_by_name(db: Session, name: str, commit: bool = True) -> int:
+    """Delete a course and all its grades. Returns the number of grades deleted."""
+    course = get_course_by_name(db, name)
+    if not course:
+        return 0
+    count = db.query(models.Grade).filter(models.Grade.course_id == course.id).delete(synchronize_session=False)
+    db.delete(course)
+    change_feed.record(db, change_feed.COURSE_DELETED, {"course": name})
+    if commit:
+        db.commit()
+    return count
+
+def toggle_course_visibility(db: Session, course: models.Course, commit: bool = True) -> bool:
+    course.is_visible = not course.is_visible
+    change_feed.record(db, change_feed.COURSE, {"course": course.name, "is_visible": course.is_visible})
+    if commit:
+        db.commit()
+    return course.is_visible
+
+def get_mapping_profile(db: Session, signature: str):
+    return db.query(models.MappingProfile).filter(models.MappingProfile.signature == signature).first()
+
+def save_mapping_profile(db: Session, signature: str, mapping: dict, header_row: int = 0):
+    profile = get_mapping_profile(db, signature)
+    if profile:
+        profile.mapping = mapping
+        profile.header_row = header_row
+        profile.use_count = (profile.use_count or 0) + 1
     else:
-        db_grade = models.Grade(
-            student_id=student_id,
-            course_id=course_id,
-            total_score=total_score,
-            sub_scores=sub_scores
-        )
-        db.add(db_grade)
-    
+        profile = models.MappingProfile(signature=signature, mapping=mapping, header_row=header_row, use_count=1)
+        db.add(profile)
     db.commit()
-    db.refresh(db_grade)
-    return db_grade
+    db.refresh(profile)
+    return profile
 
 def get_all_students(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Student).offset(skip).limit(limit).all()
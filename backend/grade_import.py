@@ -0,0 +1,141 @@
+"""
+Grade sheet parsing and import, shared by /api/upload/grades,
+/api/upload/preview and /api/upload/confirm.
+"""
+import io
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+import crud
+from column_mapping import detect_header_row, is_unnamed, GRADE_FIELDS
+from matching import StudentMatcher, AMBIGUOUS
+from profiling import timed
+
+
+def frame_with_header(df_raw, header_idx: int):
+    """
+    Turn a header=None frame into one with the detected header row as columns,
+    without parsing the file a second time.
+    """
+    header = df_raw.iloc[header_idx].tolist()
+    columns = []
+    seen = {}
+    for i, h in enumerate(header):
+        name = str(h).strip() if h == h and h is not None and str(h).strip() else f"Unnamed: {i}"
+        # Same de-duplication as pandas: "Score", "Score.1", ...
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        columns.append(name)
+
+    df = df_raw.iloc[header_idx + 1:].copy()
+    df.columns = columns
+    df = df.dropna(how="all").reset_index(drop=True)
+    return df
+
+
+def read_grade_sheet(source, sheet_name=0):
+    """
+    Read one sheet (path, bytes or file-like), auto-detecting the header row.
+    Returns (df, header_idx).
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    with timed("parse"):
+        df_raw = pd.read_excel(source, header=None, sheet_name=sheet_name)
+        header_idx = detect_header_row(df_raw, GRADE_FIELDS)
+        return frame_with_header(df_raw, header_idx), header_idx
+
+
+def preview_rows(df, n: int = 3) -> list:
+    # Handle NaN in preview to avoid JSON error
+    head = df.head(n)
+    return head.where(head.notna(), '').astype(str).to_dict(orient='records')
+
+
+def row_scores(row, columns, used_cols, total_col):
+    """(total_score, sub_scores) for one row; every unmapped column is a sub-score."""
+    total_score = 0.0
+    if total_col:
+        try:
+            total_score = float(row[total_col])
+            if total_score != total_score:  # empty cell
+                total_score = 0.0
+        except (TypeError, ValueError):
+            pass
+
+    sub_scores = {}
+    for col in columns:
+        if col in used_cols or is_unnamed(col):
+            continue
+        val = row[col]
+        if pd.isna(val):
+            continue
+        sub_scores[str(col).strip()] = val
+    return total_score, sub_scores
+
+
+def match_grade_frame(df, mapping: dict, matcher: StudentMatcher):
+    """
+    Match the rows of one parsed sheet to students with a {field: column} mapping.
+    Returns (grades, unmatched, ambiguous): grades is {student id: (total, sub scores)},
+    a student listed twice keeps the last row. No database access, runs in worker processes too.
+    """
+    columns = list(df.columns)
+    student_col = mapping.get("student_id") if mapping.get("student_id") in columns else None
+    name_col = mapping.get("name") if mapping.get("name") in columns else None
+    class_col = mapping.get("class_name") if mapping.get("class_name") in columns else None
+    total_col = mapping.get("total_score") if mapping.get("total_score") in columns else None
+    used_cols = {student_col, name_col, class_col, total_col}
+
+    grades = {}
+    unmatched = []
+    ambiguous = []
+    for row in df.to_dict(orient="records"):
+        # Prioritize ID, fallback to Name (+ Class if the sheet has it)
+        match = matcher.match(
+            number=row[student_col] if student_col else None,
+            name=row[name_col] if name_col else None,
+            class_name=row[class_col] if class_col else None,
+        )
+        if match.status == AMBIGUOUS:
+            ambiguous.append({"row": str(row), "candidates": match.candidates})
+            continue
+        if not match.matched:
+            unmatched.append(str(row))
+            continue
+        grades[match.student_id] = row_scores(row, columns, used_cols, total_col)
+    return grades, unmatched, ambiguous
+
+
+def import_grade_frame(db: Session, df, course_name: str, mapping: dict, matcher: StudentMatcher = None, commit: bool = True) -> dict:
+    """
+    Import one parsed sheet for one course with a {field: column} mapping.
+    Returns matched / unmatched / ambiguous counts (with the first few rows of each).
+    All rows are written with one bulk upsert: the sheet is saved completely or not at all.
+    With commit=False nothing is committed and the caller owns the transaction.
+    """
+    crud.begin_write(db)
+    try:
+        course = crud.get_or_create_course(db, course_name, commit=False)
+        if matcher is None:
+            # One query for all students, then dict lookups per row
+            matcher = StudentMatcher.from_db(db)
+        grades, unmatched, ambiguous = match_grade_frame(df, mapping, matcher)
+        matched_count = crud.upsert_grades(db, course.id, grades, commit=commit)
+    except Exception:
+        if commit:
+            db.rollback()
+        raise
+
+    return {
+        "course_name": course_name,
+        "matched": matched_count,
+        "unmatched_count": len(unmatched),
+        "unmatched_rows": unmatched[:5], # Return top 5 errors
+        "ambiguous_count": len(ambiguous),
+        "ambiguous_rows": ambiguous[:5]
+    }
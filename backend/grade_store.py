@@ -0,0 +1,463 @@
+"""
+In-memory, read-optimized copy of the grade data for the analytics endpoints.
+
+A Snapshot holds NumPy arrays:
+    scores[student_row, course_col]   float32, NaN = no grade
+    items[course] = (item names, float32[student_row, item])   sub_scores, NaN = missing
+    class_code / grade_code[student_row]   int32 codes into class_names / grade_names
+    visible[course_col]   course visibility
+so every statistic is a masked, vectorized reduction. No joins and no JSON
+parsing per request.
+
+Lifecycle:
+- built on the first stats request (GRADE_STORE_WARM=1 builds it when
+  main.py starts instead);
+- patched after this process's own writes: a course column or the student
+  attributes are re-read, not the whole dataset; each patch swaps in a new
+  Snapshot so readers never see a half-updated one;
+- every write bumps the "grades" cache_bus channel in its own transaction
+  (GradeStore.bump before the commit); a store that
+  sees a version it didn't produce rebuilds on the next read (checked at
+  most once per CACHE_CHECK_INTERVAL).
+
+Memory, per 10,000 students: 40 KB per course for totals + 40 KB per
+sub-score item + ~1.5 MB for the student index (arrays and the id -> row
+dict). 10 courses with 5 items each is ~4 MB. Item arrays are dropped
+(totals only) when the estimate goes over GRADE_STORE_MAX_MB (default 256).
+"""
+import bisect
+import itertools
+import os
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+import models, cache_bus
+from database import SessionLocal
+
+CHANNEL = "grades"
+GRADE_STORE_MAX_MB = float(os.environ.get("GRADE_STORE_MAX_MB", 256))
+
+# Column versions, unique across snapshots of this process
+_tokens = itertools.count(1)
+
+# Bands, same as the frontend's ClassStatistics
+EXCELLENT, GOOD, PASS = 85, 75, 60
+SEGMENTS = [("full", 100, None), ("s95", 95, 100), ("s90", 90, 95), ("s85", 85, 90),
+            ("s75", 75, 85), ("s60", 60, 75), ("fail", None, 60)]
+# Scales on marks out of 100, where the bands above mean something (not z / t / percentile)
+BANDED_SCALES = ("raw", "curved")
+
+
+@dataclass
+class Snapshot:
+    student_ids: np.ndarray                 # int64 [n]
+    row_of: Dict[int, int]                  # student id -> row
+    class_code: np.ndarray                  # int32 [n]
+    class_names: List[str]
+    grade_code: np.ndarray                  # int32 [n]
+    grade_names: List[str]
+    courses: List[str]
+    visible: np.ndarray                     # bool [c]
+    scores: np.ndarray                      # float32 [n, c]
+    items: Dict[str, Tuple[List[str], np.ndarray]] = field(default_factory=dict)
+    # course -> version of its column, new whenever the column or the student rows change
+    # (cache key for derived data, see standardize.py)
+    tokens: Dict[str, int] = field(default_factory=dict)
+    built_at: float = 0.0
+
+    @property
+    def n_students(self) -> int:
+        return len(self.student_ids)
+
+    def nbytes(self) -> int:
+        arrays = [self.student_ids, self.class_code, self.grade_code, self.visible, self.scores]
+        arrays += [a for _, a in self.items.values()]
+        # dict entries ~ 100 bytes each (key, value, slot)
+        return sum(a.nbytes for a in arrays) + 100 * len(self.row_of)
+
+
+def _codes(values: list):
+    """Categorical codes: (int32 codes, sorted category names)."""
+    names = sorted({v or "" for v in values})
+    index = {name: i for i, name in enumerate(names)}
+    return np.array([index[v or ""] for v in values], dtype=np.int32), names
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _load_students(db: Session):
+    rows = db.query(models.Student.id, models.Student.class_name, models.Student.grade_name).order_by(models.Student.id).all()
+    ids = np.array([r[0] for r in rows], dtype=np.int64)
+    class_code, class_names = _codes([r[1] for r in rows])
+    grade_code, grade_names = _codes([r[2] for r in rows])
+    return ids, {int(i): k for k, i in enumerate(ids)}, class_code, class_names, grade_code, grade_names
+
+
+def _load_column(db: Session, course_id: int, row_of: dict, n: int, with_items: bool):
+    """Totals (and item matrix) of one course."""
+    rows = db.query(models.Grade.student_id, models.Grade.total_score, models.Grade.sub_scores) \
+        .filter(models.Grade.course_id == course_id).all()
+    totals = np.full(n, np.nan, dtype=np.float32)
+    item_names, item_index, cells = [], {}, []
+    for student_id, total, sub_scores in rows:
+        r = row_of.get(student_id)
+        if r is None:
+            continue
+        totals[r] = _number(total)
+        if with_items and sub_scores:
+            for name, value in sub_scores.items():
+                if name not in item_index:
+                    item_index[name] = len(item_names)
+                    item_names.append(name)
+                cells.append((r, item_index[name], _number(value)))
+    items = np.full((n, len(item_names)), np.nan, dtype=np.float32)
+    if cells:
+        r, k, v = zip(*cells)
+        items[np.array(r), np.array(k)] = np.array(v, dtype=np.float32)
+    return totals, (item_names, items)
+
+
+def build(db: Session) -> Snapshot:
+    ids, row_of, class_code, class_names, grade_code, grade_names = _load_students(db)
+    courses = db.query(models.Course.id, models.Course.name, models.Course.is_visible).order_by(models.Course.name).all()
+    n, c = len(ids), len(courses)
+    scores = np.full((n, c), np.nan, dtype=np.float32)
+    items = {}
+    with_items = True
+    for j, (course_id, name, _) in enumerate(courses):
+        totals, course_items = _load_column(db, course_id, row_of, n, with_items)
+        scores[:, j] = totals
+        if with_items:
+            items[name] = course_items
+            if sum(a.nbytes for _, a in items.values()) + scores.nbytes > GRADE_STORE_MAX_MB * 1024 * 1024:
+                print(f"Grade store over {GRADE_STORE_MAX_MB:.0f} MB, keeping totals only")
+                items, with_items = {}, False
+    return Snapshot(
+        student_ids=ids, row_of=row_of,
+        class_code=class_code, class_names=class_names,
+        grade_code=grade_code, grade_names=grade_names,
+        courses=[name for _, name, _ in courses],
+        visible=np.array([v is not False for _, _, v in courses], dtype=bool),
+        scores=scores, items=items, tokens={name: next(_tokens) for _, name, _ in courses}, built_at=time.time(),
+    )
+
+
+class GradeStore:
+    def __init__(self, check_interval: float = cache_bus.CACHE_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._snapshot: Optional[Snapshot] = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"builds": 0, "patches": 0, "last_build_seconds": 0.0}
+
+    def rebuild(self) -> Snapshot:
+        t0 = time.perf_counter()
+        db = SessionLocal()
+        try:
+            with self._lock:
+                # Version first: a write committed during the build shows up as a newer version later
+                version = cache_bus.read_version(CHANNEL)
+                snap = self._snapshot = build(db)
+                self._version = version
+                self._checked_at = time.monotonic()
+                self.stats["builds"] += 1
+                self.stats["last_build_seconds"] = round(time.perf_counter() - t0, 3)
+        finally:
+            db.close()
+        return snap
+
+    def snapshot(self) -> Snapshot:
+        """Current snapshot, rebuilt first if another worker changed the data."""
+        snap = self._snapshot
+        now = time.monotonic()
+        if snap is None:
+            return self.rebuild()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            if cache_bus.read_version(CHANNEL) != self._version:
+                return self.rebuild()
+        return snap
+
+    # --- Patches after a committed write in this process ---
+
+    @staticmethod
+    def bump(db: Session) -> int:
+        """
+        Mark the grade data changed, in the write's own transaction (call it
+        before the commit). Returns the version to pass to changed().
+        """
+        return cache_bus.bump(db, CHANNEL)
+
+    def changed(self, db: Session, version: int, courses: list = (), students: bool = False,
+                deleted_courses: list = ()):
+        """
+        After the commit of a write that called bump(): patch the local
+        snapshot. Pass the courses whose grades or visibility changed,
+        students=True after roster changes, deleted_courses after deletes.
+        """
+        with self._lock:
+            snap = self._snapshot
+            if snap is None:
+                return
+            if self._version is None or version != self._version + 1:
+                # Someone else wrote in between, a patch would miss their change
+                self._snapshot = None
+                return
+            if students:
+                snap = self._patch_students(db, snap)
+            for name in deleted_courses:
+                snap = self._drop_course(snap, name)
+            for name in courses:
+                snap = self._patch_course(db, snap, name)
+            self._snapshot = snap
+            self._version = version
+            self.stats["patches"] += 1
+
+    @staticmethod
+    def _patch_students(db: Session, snap: Snapshot) -> Snapshot:
+        ids, row_of, class_code, class_names, grade_code, grade_names = _load_students(db)
+        scores = np.full((len(ids), len(snap.courses)), np.nan, dtype=np.float32)
+        # Carry existing rows over to their new positions (ids only ever get added)
+        old_rows = np.array([snap.row_of.get(int(i), -1) for i in ids], dtype=np.int64)
+        keep = old_rows >= 0
+        scores[keep] = snap.scores[old_rows[keep]]
+        items = {}
+        for course, (names, values) in snap.items.items():
+            new_values = np.full((len(ids), len(names)), np.nan, dtype=np.float32)
+            new_values[keep] = values[old_rows[keep]]
+            items[course] = (names, new_values)
+        return replace(snap, student_ids=ids, row_of=row_of, class_code=class_code, class_names=class_names,
+                       grade_code=grade_code, grade_names=grade_names, scores=scores, items=items,
+                       tokens={c: next(_tokens) for c in snap.courses})
+
+    @staticmethod
+    def _drop_course(snap: Snapshot, name: str) -> Snapshot:
+        if name not in snap.courses:
+            return snap
+        j = snap.courses.index(name)
+        items = {k: v for k, v in snap.items.items() if k != name}
+        tokens = {k: v for k, v in snap.tokens.items() if k != name}
+        return replace(snap, courses=snap.courses[:j] + snap.courses[j + 1:],
+                       visible=np.delete(snap.visible, j), scores=np.delete(snap.scores, j, axis=1),
+                       items=items, tokens=tokens)
+
+    def _patch_course(self, db: Session, snap: Snapshot, name: str) -> Snapshot:
+        course = db.query(models.Course).filter(models.Course.name == name).first()
+        if course is None:
+            return self._drop_course(snap, name)
+        with_items = bool(snap.items) or not snap.courses
+        totals, course_items = _load_column(db, course.id, snap.row_of, snap.n_students, with_items)
+        courses, visible, scores = list(snap.courses), snap.visible.copy(), snap.scores
+        if name in courses:
+            j = courses.index(name)
+            scores = scores.copy()
+        else:
+            # Keep columns sorted by name, like build()
+            j = bisect.bisect_left(courses, name)
+            courses.insert(j, name)
+            visible = np.insert(visible, j, True)
+            scores = np.insert(scores, j, np.nan, axis=1)
+        scores[:, j] = totals
+        visible[j] = course.is_visible is not False
+        items = dict(snap.items)
+        if with_items:
+            items[name] = course_items
+        return replace(snap, courses=courses, visible=visible, scores=scores, items=items,
+                       tokens={**snap.tokens, name: next(_tokens)})
+
+    def metrics(self) -> dict:
+        snap = self._snapshot
+        return {
+            "built": snap is not None,
+            "students": snap.n_students if snap else 0,
+            "courses": len(snap.courses) if snap else 0,
+            "bytes": snap.nbytes() if snap else 0,
+            "items_kept": bool(snap.items) if snap else False,
+            **self.stats,
+        }
+
+
+store = GradeStore()
+
+
+# --- Statistics (all vectorized over a Snapshot) ---
+
+def _mask(snap: Snapshot, grade_name: str = None, class_names: list = None) -> np.ndarray:
+    mask = np.ones(snap.n_students, dtype=bool)
+    if grade_name and grade_name != "All":
+        code = snap.grade_names.index(grade_name) if grade_name in snap.grade_names else -1
+        mask &= snap.grade_code == code
+    class_names = [c for c in (class_names or []) if c and c != "All"]
+    if class_names:
+        codes = [snap.class_names.index(c) for c in class_names if c in snap.class_names]
+        mask &= np.isin(snap.class_code, codes)
+    return mask
+
+
+def student_scores(snap: Snapshot, course: str) -> np.ndarray:
+    """Score per student row: one course, or for "All" the mean over the visible courses the student has."""
+    if course == "All":
+        visible = snap.scores[:, snap.visible]
+        counts = np.sum(~np.isnan(visible), axis=1)
+        sums = np.nansum(visible, axis=1)
+        out = np.full(snap.n_students, np.nan, dtype=np.float64)
+        has = counts > 0
+        out[has] = sums[has] / counts[has]
+        return out
+    if course not in snap.courses:
+        return np.full(snap.n_students, np.nan)
+    return snap.scores[:, snap.courses.index(course)].astype(np.float64)
+
+
+def scores_for(snap: Snapshot, course: str, scale: str = "raw", curve=None) -> np.ndarray:
+    """student_scores, or standardized / curved scores when scale is not "raw" (see standardize.py)."""
+    if scale == "raw":
+        return student_scores(snap, course)
+    import standardize
+    return standardize.scaled(snap, course, scale, curve)
+
+
+def summary(snap: Snapshot, course: str = "All", grade_name: str = None, class_names: list = None,
+            scale: str = "raw", curve=None) -> dict:
+    """
+    count / max / min / avg, band rates and score segments (ClassStatistics), plus the class comparison.
+    Rates, counts and segments use the mark bands, so they are left out for z / t / percentile.
+    """
+    mask = _mask(snap, grade_name, class_names)
+    values = scores_for(snap, course, scale, curve)
+    has = mask & ~np.isnan(values)
+    scores = values[has]
+    count = int(scores.size)
+    if count == 0:
+        return {"count": 0}
+
+    # Class comparison: mean per class code with bincount
+    codes = snap.class_code[has]
+    sums = np.bincount(codes, weights=scores, minlength=len(snap.class_names))
+    counts = np.bincount(codes, minlength=len(snap.class_names))
+    classes = [
+        {"name": snap.class_names[k], "avg": round(float(sums[k] / counts[k]), 1), "count": int(counts[k])}
+        for k in np.flatnonzero(counts)
+    ]
+    classes.sort(key=lambda c: -c["avg"])
+
+    result = {
+        "course": course,
+        "scale": scale,
+        "count": count,
+        "max": float(scores.max()),
+        "min": float(scores.min()),
+        "avg": float(scores.mean()),
+        "median": float(np.median(scores)),
+        "std": float(scores.std()),
+        "class_comparison": classes,
+    }
+    if scale in BANDED_SCALES:
+        result.update(_bands(scores))
+    return result
+
+
+def _bands(scores: np.ndarray) -> dict:
+    """Band rates / counts and score segments of marks out of 100."""
+    count = scores.size
+    excellent = int(np.count_nonzero(scores >= EXCELLENT))
+    good = int(np.count_nonzero((scores >= GOOD) & (scores < EXCELLENT)))
+    passed = int(np.count_nonzero(scores >= PASS))
+    standard = passed - excellent - good
+    segments = {}
+    for name, lo, hi in SEGMENTS:
+        if hi is None:
+            segments[name] = int(np.count_nonzero(scores == lo))
+        elif lo is None:
+            segments[name] = int(np.count_nonzero(scores < hi))
+        else:
+            segments[name] = int(np.count_nonzero((scores >= lo) & (scores < hi)))
+    return {
+        "rates": {
+            "excellent": excellent / count * 100,
+            "good": good / count * 100,
+            "standard": standard / count * 100,
+            "pass": passed / count * 100,
+            "failRate": (count - passed) / count * 100,
+        },
+        "counts": {"excellent": excellent, "good": good, "standard": standard, "pass": passed, "fail": count - passed},
+        "segments": segments,
+    }
+
+
+def course_averages(snap: Snapshot, grade_name: str = None, class_names: list = None, include_hidden: bool = False) -> list:
+    """Per course: count / avg / max / min / pass rate for the selected students."""
+    mask = _mask(snap, grade_name, class_names)
+    cols = np.arange(len(snap.courses)) if include_hidden else np.flatnonzero(snap.visible)
+    block = snap.scores[mask][:, cols].astype(np.float64)
+    present = ~np.isnan(block)
+    counts = present.sum(axis=0)
+    sums = np.nansum(block, axis=0)
+    filled_hi = np.where(present, block, -np.inf).max(axis=0, initial=-np.inf)
+    filled_lo = np.where(present, block, np.inf).min(axis=0, initial=np.inf)
+    passed = np.sum(present & (np.nan_to_num(block, nan=-1) >= PASS), axis=0)
+    result = []
+    for k, j in enumerate(cols):
+        n = int(counts[k])
+        result.append({
+            "course": snap.courses[j],
+            "visible": bool(snap.visible[j]),
+            "count": n,
+            "avg": round(float(sums[k] / n), 2) if n else None,
+            "max": float(filled_hi[k]) if n else None,
+            "min": float(filled_lo[k]) if n else None,
+            "pass_rate": round(float(passed[k] / n * 100), 2) if n else None,
+        })
+    return result
+
+
+def distribution(snap: Snapshot, course: str = "All", grade_name: str = None, class_names: list = None,
+                 bins: int = 10, max_score: float = None, scale: str = "raw", curve=None) -> dict:
+    mask = _mask(snap, grade_name, class_names)
+    values = scores_for(snap, course, scale, curve)
+    scores = values[mask & ~np.isnan(values)]
+    if scale == "z":
+        # Centred on 0, whole standard deviations on both sides
+        bottom = float(np.floor(scores.min())) if scores.size else -3.0
+        top = max_score or (float(np.ceil(scores.max())) if scores.size else 3.0)
+    else:
+        bottom = 0.0
+        top = max_score or (100.0 if scores.size == 0 or scores.max() <= 100 else float(scores.max()))
+    counts, edges = np.histogram(scores, bins=bins, range=(bottom, max(top, bottom + 1)))
+    return {"course": course, "scale": scale, "count": int(scores.size),
+            "edges": edges.round(2).tolist(), "counts": counts.tolist()}
+
+
+def item_averages(snap: Snapshot, course: str, grade_name: str = None, class_names: list = None) -> Optional[dict]:
+    """Average of each sub-score item of a course, overall and per class. None if the course has no item data."""
+    if course not in snap.items:
+        return None
+    names, values = snap.items[course]
+    mask = _mask(snap, grade_name, class_names)
+    block = values[mask].astype(np.float64)
+    present = ~np.isnan(block)
+    counts = present.sum(axis=0)
+    sums = np.nansum(block, axis=0)
+    overall = {name: (round(float(sums[k] / counts[k]), 2) if counts[k] else None) for k, name in enumerate(names)}
+
+    per_class = {}
+    codes = snap.class_code[mask]
+    for code in np.unique(codes):
+        rows = codes == code
+        c_counts = present[rows].sum(axis=0)
+        c_sums = np.nansum(block[rows], axis=0)
+        per_class[snap.class_names[code]] = {
+            name: (round(float(c_sums[k] / c_counts[k]), 2) if c_counts[k] else None) for k, name in enumerate(names)
+        }
+    return {"course": course, "items": names, "average": overall, "by_class": per_class}
@@ -0,0 +1,30 @@
+"""
+Gunicorn settings for production:  gunicorn main:app -c gunicorn.conf.py
+
+Workers are separate processes, so CPU-bound work (Excel parsing, bcrypt)
+in one request no longer stalls the others. Env overrides: BIND, WEB_CONCURRENCY,
+GUNICORN_TIMEOUT.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+# Large workbook imports can take a while
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+graceful_timeout = 30
+# Recycle workers now and then so a leak in pandas/openpyxl can't grow forever
+max_requests = 2000
+max_requests_jitter = 200
+accesslog = "-"
+
+
+def on_starting(server):
+    # Migrate once in the master before any worker exists
+    import bootstrap
+    from database import engine
+
+    bootstrap.bootstrap()
+    # Don't hand the master's SQLite connections to forked workers
+    engine.dispose()
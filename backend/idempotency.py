@@ -0,0 +1,100 @@
+"""
+Idempotent uploads: a client sends an `Idempotency-Key` header with an import
+and may retry the same request (e.g. after a timeout) without importing twice.
+
+- The first request with a key claims it (row in `import_requests`, status
+  in_progress) in its own short transaction, then runs the import.
+- The import and the stored response are committed together, so a key is
+  marked done exactly when its data is in the database.
+- A retry with a done key gets the stored response back; one that arrives
+  while the first is still running gets 409; the same key with a different
+  file or parameters gets 422.
+- A failed import releases its key so it can be retried. Keys of a crashed
+  worker are taken over after IDEMPOTENCY_LOCK_SECONDS; all keys expire after
+  IDEMPOTENCY_TTL_SECONDS.
+"""
+import hashlib
+import os
+import time
+
+from sqlalchemy import delete, update
+from sqlalchemy.orm import Session
+
+import crud
+import models
+from database import SessionLocal
+
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", 24 * 3600))
+IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get("IDEMPOTENCY_LOCK_SECONDS", 600))
+
+NEW, REPLAY, IN_PROGRESS, MISMATCH = "new", "replay", "in_progress", "mismatch"
+
+
+def request_hash(*parts) -> str:
+    """sha256 over the request's file bytes and parameters (str / bytes / None)."""
+    h = hashlib.sha256()
+    for part in parts:
+        if part is None:
+            part = b""
+        elif isinstance(part, str):
+            part = part.encode("utf-8")
+        h.update(len(part).to_bytes(8, "big"))
+        h.update(part)
+    return h.hexdigest()
+
+
+def claim(key: str, endpoint: str, req_hash: str):
+    """Claim `key` for this request. Returns (NEW | REPLAY | IN_PROGRESS | MISMATCH, stored response or None)."""
+    now = time.time()
+    db = SessionLocal()
+    try:
+        crud.begin_write(db)
+        db.execute(delete(models.ImportRequest).where(models.ImportRequest.created_at < now - IDEMPOTENCY_TTL_SECONDS))
+        insert = crud.upsert_insert(db)
+        inserted = db.execute(
+            insert(models.ImportRequest)
+            .values(key=key, endpoint=endpoint, request_hash=req_hash, status=IN_PROGRESS, created_at=now)
+            .on_conflict_do_nothing(index_elements=["key"])
+        ).rowcount
+        if inserted:
+            db.commit()
+            return NEW, None
+
+        record = db.get(models.ImportRequest, key)
+        if record.endpoint != endpoint or record.request_hash != req_hash:
+            state, response = MISMATCH, None
+        elif record.status == "done":
+            state, response = REPLAY, record.response
+        elif record.created_at < now - IDEMPOTENCY_LOCK_SECONDS:
+            # The worker that claimed it died mid-import; its transaction never committed
+            record.created_at = now
+            state, response = NEW, None
+        else:
+            state, response = IN_PROGRESS, None
+        db.commit()
+        return state, response
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def complete(db: Session, key: str, response: dict):
+    """Store the response in the caller's transaction; it becomes visible with the import's commit."""
+    db.execute(
+        update(models.ImportRequest)
+        .where(models.ImportRequest.key == key)
+        .values(status="done", response=response)
+    )
+
+
+def release(key: str):
+    """Forget an in-progress key after a failed import, so a retry runs it again."""
+    db = SessionLocal()
+    try:
+        db.execute(delete(models.ImportRequest).where(
+            models.ImportRequest.key == key, models.ImportRequest.status == IN_PROGRESS))
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,59 @@
+"""
+Deferred imports for the heavy parts of the API.
+
+pandas (and through it numpy) costs several hundred ms and tens of MB per
+process, but only the upload routes need it. Those modules are referenced
+through LazyModule, which imports them on first attribute access, so login
+and read-only workers never load them.
+
+    python benchmarks/import_budget.py   # checks main.py stays light
+"""
+import importlib
+import os
+import threading
+
+# Modules that must not be loaded by `import main`
+HEAVY_MODULES = ("pandas", "numpy", "openpyxl")
+
+# Import the lazy modules at startup anyway (workers that mostly handle uploads)
+PRELOAD = os.environ.get("PRELOAD_IMPORTERS", "").lower() in ("1", "true", "yes")
+
+
+class LazyModule:
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+_registry = {}
+
+
+def lazy_module(name: str) -> LazyModule:
+    if name not in _registry:
+        _registry[name] = LazyModule(name)
+    return _registry[name]
+
+
+def preload():
+    """Import every registered lazy module now."""
+    for module in _registry.values():
+        module._load()
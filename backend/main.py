@@ -1,36 +1,57 @@
-from fastapi import FastAPI, Depends, UploadFile, File, HTTPException, status, Body
+from fastapi import FastAPI, Depends, UploadFile, File, Form, HTTPException, status, Body, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse, FileResponse
+from sqlalchemy.orm import Session, selectinload, joinedload
+from typing import List, Optional
 from pydantic import BaseModel
-import pandas as pd
 import io
 import json
-
-import models, schemas, crud, auth
-from database import SessionLocal, engine, get_db
-import uuid
 import os
 
-models.Base.metadata.create_all(bind=engine)
+import models, schemas, crud, auth, bootstrap, idempotency, change_feed, backups
+from database import SessionLocal, engine, get_db, SQLALCHEMY_DATABASE_URL
+from responses import FastJSONResponse, CompressionMiddleware, to_columnar
+import column_mapping, user_admin, report_cards
+from upload_store import store as upload_store
+import profiling
+import lazy_imports
+
+# pandas-based importers, loaded on the first upload (see lazy_imports.py)
+roster_import = lazy_imports.lazy_module("roster_import")
+grade_import = lazy_imports.lazy_module("grade_import")
+workbook_import = lazy_imports.lazy_module("workbook_import")
+# numpy-based analytics snapshot
+grade_store = lazy_imports.lazy_module("grade_store")
+standardize = lazy_imports.lazy_module("standardize")
+
+profiling.instrument_engine(engine)
 
 app = FastAPI(title="Smart Grade Platform")
 
-# Create default admin on startup
+# Migrate schema + create default admin. Runs in every worker but under a
+# file lock, so only the first one does the work.
 @app.on_event("startup")
-def create_default_admin():
-    db = SessionLocal()
-    try:
-        admin = db.query(models.User).filter(models.User.username == "admin").first()
-        if not admin:
-            hashed_pwd = auth.get_password_hash("admin123")
-            admin_user = models.User(username="admin", hashed_password=hashed_pwd, role="admin")
-            db.add(admin_user)
-            db.commit()
-            print("Default admin created: admin/admin123")
-    finally:
-        db.close()
+def run_bootstrap():
+    bootstrap.bootstrap()
+
+@app.on_event("startup")
+def warm_grade_store():
+    # Off by default: workers that never serve stats don't import numpy or hold the grades.
+    # GRADE_STORE_WARM=1 builds the snapshot at boot instead of on the first stats request.
+    if os.environ.get("GRADE_STORE_WARM", "0").lower() in ("1", "true", "yes"):
+        grade_store.store.rebuild()
+
+@app.on_event("startup")
+def preload_importers():
+    if lazy_imports.PRELOAD:
+        lazy_imports.preload()
+
+@app.on_event("startup")
+def start_upload_sweeper():
+    # Abandoned previews expire instead of piling up in temp/
+    upload_store.start_sweeper()
 
 app.add_middleware(
     CORSMiddleware,
@@ -38,8 +59,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Change-Seq"],
 )
 
+# Compress large responses (student list etc.), brotli if available, else gzip
+app.add_middleware(CompressionMiddleware)
+
+# Query counts / DB time / parse + bcrypt time per request, see /api/metrics
+app.add_middleware(profiling.ProfilingMiddleware)
+
 # Auth Endpoints
 @app.post("/api/token", response_model=schemas.Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
@@ -59,193 +87,90 @@ async def read_users_me(current_user: models.User = Depends(auth.get_current_act
 
 
 
+def run_import(db: Session, idempotency_key: Optional[str], endpoint: str, request_hash: str, work, on_commit=None):
+    """
+    Commit the import done by work() (which must not commit) and return its response.
+    With an Idempotency-Key, the response is stored in the same transaction and
+    a retry of the same request gets it back instead of importing again.
+    The grade store version is bumped in the same transaction; on_commit(result, version)
+    runs after the commit (grade store patch, profiles).
+    A snapshot of the database is taken first; its name comes back as "snapshot",
+    restoring it undoes the import (see backups.py).
+    Blocking (snapshot, import, commit): the async upload routes run it with run_in_threadpool.
+    """
+    if idempotency_key:
+        state, stored = idempotency.claim(idempotency_key, endpoint, request_hash)
+        if state == idempotency.REPLAY:
+            return FastJSONResponse(stored, headers={"Idempotent-Replayed": "true"})
+        if state == idempotency.IN_PROGRESS:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still being processed.")
+        if state == idempotency.MISMATCH:
+            raise HTTPException(status_code=422, detail="This Idempotency-Key was already used for a different request.")
+    snapshot = backups.snapshot_before_import(endpoint)
+    try:
+        result = work()
+        if snapshot and isinstance(result, dict):
+            result["snapshot"] = snapshot
+        version = grade_store.store.bump(db)
+        if idempotency_key:
+            idempotency.complete(db, idempotency_key, result)
+        db.commit()
+    except Exception:
+        db.rollback()
+        if idempotency_key:
+            idempotency.release(idempotency_key)
+        raise
+    if on_commit is not None:
+        on_commit(result, version)
+    return result
+
 @app.post("/api/upload/roster")
-async def upload_roster(file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def upload_roster(file: UploadFile = File(...), idempotency_key: Optional[str] = Header(None),
+                        db: Session = Depends(get_db)):
     """
     Upload a master roster Excel file.
-    Expected columns: '学号' (Student Number), '姓名' (Name), '班级' (Class)
+    Expected columns: '学号' (Student Number), '姓名' (Name), '班级' (Class), optional '年级' (Grade)
+    New students get a login account (username = student number, password 123456).
     """
     contents = await file.read()
-    df = pd.read_excel(io.BytesIO(contents))
-    
-    # Normalize headers
-    # Simple mapping for demo purposes
-    df.columns = [str(c).strip() for c in df.columns]
-    
-    # Map columns
-    col_map = {}
-    for c in df.columns:
-        if "学号" in c or "ID" in c.upper(): col_map["id"] = c
-        elif "姓名" in c or "Name" in c.upper(): col_map["name"] = c
-        elif "班级" in c or "Class" in c.upper(): col_map["class"] = c
-        elif "年级" in c or "Grade" in c.upper(): col_map["grade"] = c
-        
-    count = 0
-    for index, row in df.iterrows():
-        s_id = str(row[col_map["id"]]) if "id" in col_map else f"unknown_{index}"
-        name = str(row[col_map["name"]]) if "name" in col_map else "Unknown"
-        c_name = str(row[col_map["class"]]) if "class" in col_map else "Default Class"
-        g_name = str(row[col_map["grade"]]) if "grade" in col_map else "Default Grade"
-        
-        # Check exist
-        existing = crud.get_student_by_number(db, s_id)
-        if not existing:
-            # Create a StudentCreate schema object
-            student_data = schemas.StudentCreate(
-                student_number=s_id,
-                name=name,
-                class_name=c_name,
-                grade_name=g_name # Assuming schemas.StudentCreate and models.Student have grade_name
-            )
-            new_student = crud.create_student(db, student_data)
-            
-            # Create User Account for Student
-            # Check if user already exists (unlikely if student is new, but safecheck)
-            user_exists = db.query(models.User).filter(models.User.username == s_id).first()
-            if not user_exists:
-                hashed_pwd = auth.get_password_hash("123456")
-                new_user = models.User(
-                    username=s_id, 
-                    hashed_password=hashed_pwd, 
-                    role="student", 
-                    student_id=new_student.id
-                )
-                db.add(new_user)
-            
-            count += 1
-        else:
-            # Update info if needed
-            existing.name = name
-            existing.class_name = c_name
-            existing.grade_name = g_name # Update grade_name
-            db.add(existing) # Re-add to session for update
-    
-    db.commit()
-    return {"message": f"Successfully imported {count} new students."}
+    rows = roster_import.read_roster(contents)
+
+    def work():
+        counts = roster_import.import_roster(db, rows, commit=False)
+        return {"message": f"Successfully imported {counts['created']} new students.", **counts}
+
+    return await run_in_threadpool(
+        run_import, db, idempotency_key, "roster", idempotency.request_hash(contents), work,
+        on_commit=lambda result, version: grade_store.store.changed(db, version, students=True))
 
 @app.post("/api/upload/grades")
-async def upload_grades(course_name: str, file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def upload_grades(course_name: str, file: UploadFile = File(...), idempotency_key: Optional[str] = Header(None),
+                        db: Session = Depends(get_db)):
     """
     Smart upload for grades.
     1. Auto-detects header row (looks for '学号', 'ID', '姓名', 'Name').
-    2. Finds 'Total' column.
+    2. Maps columns with the saved profile for this template, or the mapping engine.
     3. Treat all other columns as sub-scores.
+    The whole sheet is saved or nothing is; send an Idempotency-Key to make retries safe.
     """
     try:
         contents = await file.read()
-        # Read without header first to find the real header row
-        df_raw = pd.read_excel(io.BytesIO(contents), header=None)
-        
-        # Find header row
-        header_row_idx = 0
-        found_header = False
-        
-        # Scan first 10 rows
-        for i in range(min(10, len(df_raw))):
-            row_values = df_raw.iloc[i].astype(str).tolist()
-            # Check for keywords
-            if any("学号" in v or "ID" in v.upper() for v in row_values) and \
-               any("姓名" in v or "Name" in v.upper() for v in row_values):
-                header_row_idx = i
-                found_header = True
-                break
-        
-        if found_header:
-            # Reload with correct header
-            df = pd.read_excel(io.BytesIO(contents), header=header_row_idx)
-        else:
-            # Fallback to default
-            df = pd.read_excel(io.BytesIO(contents))
-
-        # Ensure course exists
-        course = crud.get_course_by_name(db, course_name)
-        if not course:
-            course = crud.create_course(db, course_name)
-        
-        # Identify Key Columns
-        student_col = None
-        name_col = None
-        total_col = None
-        
-        for col in df.columns:
-            c_str = str(col).strip()
-            # ID
-            if any(k in c_str for k in ['学号', 'Student ID', 'Student No', '学籍号']):
-                student_col = col
-            elif c_str.upper() == 'ID': # Strict for just 'ID'
-                student_col = col
-            
-            # Name
-            elif any(k in c_str for k in ['姓名', 'Name', 'Student Name']):
-                name_col = col
-            
-            # Total
-            elif any(k in c_str for k in ['总分', '成绩', '得分', 'Total', 'Score']):
-                total_col = col
-
-        matched_count = 0
-        unmatched = []
+        df, header_idx = grade_import.read_grade_sheet(contents)
+        mapping, _, _ = column_mapping.resolve_mapping(db, df.columns)
 
-        if not student_col and not name_col:
+        if not mapping.get("student_id") and not mapping.get("name"):
              raise HTTPException(status_code=400, detail="Could not find '学号' or '姓名' columns in Excel.")
 
-        for _, row in df.iterrows():
-            student = None
-            # Prioritize ID
-            if student_col:
-                val = str(row[student_col]).strip()
-                # Remove .0 if it's a float-string (e.g. "1001.0")
-                if val.endswith('.0'): val = val[:-2]
-                student = crud.get_student_by_number(db, val)
-            
-            # Fallback to Name
-            if not student and name_col:
-                 val = str(row[name_col]).strip()
-                 # Simple match (Warning: duplicates)
-                 student = db.query(models.Student).filter(models.Student.name == val).first()
-            
-            if not student:
-                unmatched.append(str(row.to_dict()))
-                continue
-                
-            # Parse Total Score
-            total_score = 0.0
-            if total_col:
-                try:
-                    total_score = float(row[total_col])
-                except:
-                    pass
-            
-            # Sub-scores (Everything else)
-            sub_scores = {}
-            for col in df.columns:
-                if col not in [student_col, name_col, total_col]:
-                    # Ignore empty/unnamed columns
-                    if "Unnamed" in str(col): continue
-                    
-                    val = row[col]
-                    try: 
-                        if pd.isna(val): continue
-                        # Clean key name
-                        key_name = str(col).strip()
-                        sub_scores[key_name] = val
-                        
-                        # Calculate total if 0 (optional feature)
-                        # if total_score == 0 and isinstance(val, (int, float)):
-                        #    total_score += val
-                    except:
-                        pass
-                        
-            crud.create_or_update_grade(db, student.id, course.id, total_score, sub_scores)
-            matched_count += 1
-            
-        return {
-            "message": f"Processed grades for {course_name}",
-            "matched": matched_count,
-            "unmatched_count": len(unmatched),
-            "unmatched_rows": unmatched[:5] # Return top 5 errors
-        }
+        def work():
+            result = grade_import.import_grade_frame(db, df, course_name, mapping, commit=False)
+            return {"message": f"Processed grades for {course_name}", "mapping": mapping, **result}
+
+        return await run_in_threadpool(
+            run_import, db, idempotency_key, "grades", idempotency.request_hash(contents, course_name), work,
+            on_commit=lambda result, version: grade_store.store.changed(db, version, courses=[course_name]))
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Upload Error: {e}")
         raise HTTPException(status_code=500, detail=f"Server Error: {str(e)}")
@@ -256,129 +181,154 @@ class ImportConfirmRequest(BaseModel):
     mapping: dict
 
 @app.post("/api/upload/preview")
-async def upload_preview(file: UploadFile = File(...)):
+async def upload_preview(file: UploadFile = File(...), course_name: str = None,
+                         idempotency_key: Optional[str] = Header(None), db: Session = Depends(get_db)):
     """
     Step 1: Save file and return columns for mapping.
+    If this header layout was confirmed before, the saved mapping is returned
+    (profile_hit=true); when course_name is also given the file is imported
+    right away and step 2 is skipped (auto_imported=true).
     """
-    if not os.path.exists("temp"):
-        os.makedirs("temp")
-        
-    file_ext = file.filename.split(".")[-1]
-    file_key = f"{uuid.uuid4()}.{file_ext}"
-    file_path = f"temp/{file_key}"
-    
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
+    # Same bytes -> same key, so re-uploads reuse the stored file and its parse
+    contents = await file.read()
+    file_key, _ = upload_store.put(contents, file.filename)
     
     # Smart Scan Header
-    df_raw = pd.read_excel(file_path, header=None)
-    header_idx = 0
-    
-    # Scan first 10 rows for keywords
-    for i in range(min(10, len(df_raw))):
-        row_values = df_raw.iloc[i].astype(str).tolist()
-        if any("学号" in v or "ID" in v.upper() for v in row_values) or \
-           any("姓名" in v or "Name" in v.upper() for v in row_values):
-            header_idx = i
-            break
-            
-    # Read columns
-    df = pd.read_excel(file_path, header=header_idx)
-    # Get first few rows for preview
-    # Handle NaN in preview to avoid JSON error
-    df_preview = df.head(3).fillna('')
-    preview = df_preview.astype(str).to_dict(orient='records')
+    df, header_idx = upload_store.get_parsed(file_key, grade_import.read_grade_sheet)
+    mapping, signature, profile_hit = column_mapping.resolve_mapping(db, df.columns)
+
+    if profile_hit and course_name:
+        def work():
+            result = grade_import.import_grade_frame(db, df, course_name, mapping, commit=False)
+            return {
+                "message": f"Successfully imported {result['matched']} records.",
+                "auto_imported": True,
+                "profile_hit": True,
+                "mapping": mapping,
+                **result
+            }
+
+        def on_commit(result, version):
+            column_mapping.save_profile(db, signature, mapping, header_idx)
+            grade_store.store.changed(db, version, courses=[course_name])
+
+        return await run_in_threadpool(
+            run_import, db, idempotency_key, "preview", idempotency.request_hash(contents, course_name), work,
+            on_commit=on_commit)
     
     return {
         "file_key": file_key,
         "columns": list(df.columns),
-        "preview": preview,
-        "detected_header_row": header_idx
+        "preview": grade_import.preview_rows(df),
+        "detected_header_row": header_idx,
+        "mapping": mapping,
+        "profile_hit": profile_hit,
+        "auto_imported": False
+    }
+
+@app.get("/api/metrics")
+def prometheus_metrics():
+    """Prometheus text format: request, SQL, parse and bcrypt costs per endpoint."""
+    from fastapi.responses import PlainTextResponse
+    store = upload_store.metrics()
+    gauges = {
+        "smartgrade_upload_store_files": store["files"],
+        "smartgrade_upload_store_bytes": store["bytes"],
+        "smartgrade_upload_store_upload_hit_rate": store["upload_hit_rate"],
+        "smartgrade_upload_store_parse_hit_rate": store["parse_hit_rate"],
+        "smartgrade_report_cache_hit_rate": report_cards.cache.metrics()["hit_rate"],
     }
+    return PlainTextResponse(profiling.metrics.render(gauges), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/upload/metrics")
+def upload_store_metrics():
+    """Temp upload store size and hit rates."""
+    return upload_store.metrics()
 
 @app.post("/api/upload/confirm")
-async def upload_confirm(req: ImportConfirmRequest, db: Session = Depends(get_db)):
+async def upload_confirm(req: ImportConfirmRequest, idempotency_key: Optional[str] = Header(None),
+                         db: Session = Depends(get_db)):
     """
     Step 2: Process file with user-defined mapping.
+    The mapping is saved as a profile for this header layout.
     """
-    file_path = f"temp/{req.file_key}"
-    if not os.path.exists(file_path):
+    if upload_store.path(req.file_key) is None:
         raise HTTPException(status_code=404, detail="File expired or not found. Please upload again.")
         
     try:
-        # Re-read file (we assume header row detection was correct or we could pass it too, 
-        # but reusing the smart scan logic is redundant. Ideally pass header_idx. 
-        # For MVP, we scan again or trust default/smart scan works same way.
-        # Let's Scan again to be safe.
-        df_raw = pd.read_excel(file_path, header=None)
-        header_idx = 0
-        for i in range(min(10, len(df_raw))):
-            row_values = df_raw.iloc[i].astype(str).tolist()
-            if any("学号" in v or "ID" in v.upper() for v in row_values) or \
-               any("姓名" in v or "Name" in v.upper() for v in row_values):
-                header_idx = i
-                break
-        
-        df = pd.read_excel(file_path, header=header_idx)
-        
-        # Ensure course
-        course = crud.get_course_by_name(db, req.course_name)
-        if not course:
-            course = crud.create_course(db, req.course_name)
-            
-        mapping = req.mapping
-        student_col = mapping.get("student_id")
-        name_col = mapping.get("name")
-        total_col = mapping.get("total_score")
-        
-        matched_count = 0
-        
-        for _, row in df.iterrows():
-            student = None
-            if student_col and student_col in df.columns:
-                val = str(row[student_col]).strip()
-                if val.endswith('.0'): val = val[:-2]
-                student = crud.get_student_by_number(db, val)
-                
-            if not student and name_col and name_col in df.columns:
-                val = str(row[name_col]).strip()
-                student = db.query(models.Student).filter(models.Student.name == val).first()
-                
-            if not student:
-                 continue
-                 
-            # Total Score
-            total_score = 0.0
-            if total_col and total_col in df.columns:
-                try:
-                    total_score = float(row[total_col])
-                except:
-                    pass
-            
-            # Sub Scores (All columns NOT selected in mapping)
-            sub_scores = {}
-            used_cols = [student_col, name_col, total_col]
-            for col in df.columns:
-                if col not in used_cols:
-                     if "Unnamed" in str(col): continue
-                     val = row[col]
-                     if pd.isna(val): continue
-                     sub_scores[str(col).strip()] = val
-            
-            crud.create_or_update_grade(db, student.id, course.id, total_score, sub_scores)
-            matched_count += 1
-            
-        # Cleanup
-        os.remove(file_path)
-        
-        return {"message": f"Successfully imported {matched_count} records.", "matched": matched_count}
+        df, header_idx = upload_store.get_parsed(req.file_key, grade_import.read_grade_sheet)
 
+        def work():
+            result = grade_import.import_grade_frame(db, df, req.course_name, req.mapping, commit=False)
+            return {"message": f"Successfully imported {result['matched']} records.", **result}
+
+        def on_commit(result, version):
+            # Remember the teacher's choice for the next upload of this template
+            column_mapping.save_profile(db, column_mapping.header_signature(df.columns), req.mapping, header_idx)
+            grade_store.store.changed(db, version, courses=[req.course_name])
+
+        request_hash = idempotency.request_hash(req.file_key, req.course_name, json.dumps(req.mapping, sort_keys=True))
+        return await run_in_threadpool(run_import, db, idempotency_key, "confirm", request_hash, work, on_commit=on_commit)
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/upload/workbook")
+async def upload_workbook(
+    file: UploadFile = File(...),
+    mode: str = Form("auto"),
+    course_map: str = Form(None),
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Import a whole workbook in one go.
+    mode: "auto" (detect per sheet), "sheets" (one course per sheet, named after the sheet)
+          or "wide" (courses side by side, grouped by a subject header row or "Course-Item" headers).
+    course_map: optional JSON {"sheet or group label": "course name"}, "" skips that sheet/group.
+    All sheets are committed together; on any error nothing is saved.
+    """
+    if mode not in (workbook_import.MODE_AUTO, workbook_import.MODE_SHEETS, workbook_import.MODE_WIDE):
+        raise HTTPException(status_code=400, detail=f"Unknown mode '{mode}'")
+    try:
+        mapping = json.loads(course_map) if course_map else {}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="course_map must be a JSON object")
+
+    contents = await file.read()
+    plans = workbook_import.parse_workbook(contents, mode, mapping)
+
+    def work():
+        report = workbook_import.import_workbook(db, plans, commit=False)
+        if report["status"] != "committed":
+            raise HTTPException(status_code=500, detail=report)
+        report["message"] = f"Imported {report['matched']} grades for {len(report['courses'])} courses from {len(plans)} sheets."
+        return report
+
+    return await run_in_threadpool(
+        run_import, db, idempotency_key, "workbook", idempotency.request_hash(contents, mode, course_map), work,
+        on_commit=lambda report, version: grade_store.store.changed(db, version, courses=report["courses"]))
+
 @app.get("/api/students")
-def read_students(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    students = crud.get_all_students(db, skip=skip, limit=limit)
+def read_students(skip: int = 0, limit: int = 100, format: str = "rows", db: Session = Depends(get_db)):
+    """
+    List students with their grades.
+    format=rows (default): one object per student.
+    format=columnar: parallel arrays, much smaller for large limits.
+    """
+    # Read first: changes made while we load are replayed by the feed (patches are idempotent)
+    seq = change_feed.latest_seq(db)
+    # Load grades and courses up front instead of one query per student / grade
+    students = (
+        db.query(models.Student)
+        .options(selectinload(models.Student.grades).joinedload(models.Grade.course))
+        .order_by(models.Student.id)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
     # Enrich with grades for simple view
     result = []
     for s in students:
@@ -387,6 +337,7 @@ def read_students(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)
             "student_number": s.student_number,
             "name": s.name,
             "class_name": s.class_name,
+            "grade_name": s.grade_name,
             "grades": {}
         }
         for g in s.grades:
@@ -395,8 +346,128 @@ def read_students(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)
                 "details": g.sub_scores
             }
         result.append(s_dict)
+
+    headers = {"X-Change-Seq": str(seq)}
+    if format == "columnar":
+        return FastJSONResponse(to_columnar(result), headers=headers)
+    return FastJSONResponse(result, headers=headers)
+
+# --- Statistics (from the in-memory grade store) ---
+# course: a course name or "All" (mean over the visible courses each student has)
+# class_name can be repeated; "All" or nothing means every class
+
+# scale: raw, z, t, percentile or curved (see standardize.py); curve / target_mean /
+# target_std / full configure the curve for scale=curved
+
+def parse_scale(scale: str, curve: str = None, target_mean: float = None, target_std: float = None,
+                full: float = None, scales=("raw", "z", "t", "percentile", "curved")):
+    if scale not in scales:
+        raise HTTPException(status_code=400, detail=f"scale must be one of {', '.join(scales)}")
+    if scale != "curved" and curve is None:
+        return None
+    try:
+        return standardize.Curve.from_params(curve, target_mean, target_std, full)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/stats/summary")
+def stats_summary(course: str = "All", grade_name: str = None, class_name: List[str] = Query(None),
+                  scale: str = "raw", curve: str = None, target_mean: float = None, target_std: float = None,
+                  full: float = None):
+    curve = parse_scale(scale, curve, target_mean, target_std, full)
+    return grade_store.summary(grade_store.store.snapshot(), course, grade_name, class_name, scale, curve)
+
+@app.get("/api/stats/courses")
+def stats_courses(grade_name: str = None, class_name: List[str] = Query(None), include_hidden: bool = False):
+    return grade_store.course_averages(grade_store.store.snapshot(), grade_name, class_name, include_hidden)
+
+@app.get("/api/stats/distribution")
+def stats_distribution(course: str = "All", grade_name: str = None, class_name: List[str] = Query(None),
+                       bins: int = 10, max_score: float = None, scale: str = "raw", curve: str = None,
+                       target_mean: float = None, target_std: float = None, full: float = None):
+    if not 1 <= bins <= 200:
+        raise HTTPException(status_code=400, detail="bins must be between 1 and 200")
+    curve = parse_scale(scale, curve, target_mean, target_std, full)
+    return grade_store.distribution(grade_store.store.snapshot(), course, grade_name, class_name, bins, max_score,
+                                    scale, curve)
+
+@app.get("/api/stats/items")
+def stats_items(course: str, grade_name: str = None, class_name: List[str] = Query(None)):
+    result = grade_store.item_averages(grade_store.store.snapshot(), course, grade_name, class_name)
+    if result is None:
+        raise HTTPException(status_code=404, detail="No item scores for this course")
     return result
 
+@app.get("/api/stats/standardized")
+def stats_standardized(course: str, grade_name: str = None, class_name: List[str] = Query(None),
+                       curve: str = None, target_mean: float = None, target_std: float = None, full: float = None,
+                       offset: int = 0, limit: int = Query(100, ge=1, le=5000)):
+    """z / T / percentile / rank / curved score per student for one course, compared within the grade level."""
+    curve = parse_scale("curved", curve, target_mean, target_std, full)
+    snap = grade_store.store.snapshot()
+    if course not in snap.courses:
+        raise HTTPException(status_code=404, detail="Course not found")
+    return standardize.course_table(snap, course, grade_name, class_name, curve, max(offset, 0), limit)
+
+@app.get("/api/stats/composite")
+def stats_composite(course: List[str] = Query(None), score: str = "t", grade_name: str = None,
+                    class_name: List[str] = Query(None), curve: str = None, target_mean: float = None,
+                    target_std: float = None, full: float = None,
+                    offset: int = 0, limit: int = Query(100, ge=1, le=5000)):
+    """
+    Cross-subject ranking: mean standardized score over `course` (repeatable,
+    default the visible courses), ranked within the grade level.
+    """
+    curve = parse_scale(score, curve, target_mean, target_std, full, scales=("z", "t", "percentile", "curved"))
+    return standardize.composite_table(grade_store.store.snapshot(), course, score, curve,
+                                       grade_name, class_name, max(offset, 0), limit)
+
+@app.get("/api/stats/store")
+def grade_store_metrics():
+    """Size of the in-memory snapshot and build / patch counts, standardization cache hits."""
+    return {**grade_store.store.metrics(), "standardize_cache": standardize.cache.metrics()}
+
+# --- Report cards ---
+
+@app.get("/api/reports")
+def batch_report_cards(class_name: str = None, grade_name: str = None, format: str = "html",
+                       db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_active_user)):
+    """ZIP of the report cards of a class and/or grade, streamed while the cards are rendered."""
+    if current_user.role in ["parent", "student"]:
+        raise HTTPException(status_code=403, detail="Not allowed")
+    if format not in report_cards.report_render.FORMATS:
+        raise HTTPException(status_code=400, detail="format must be html or xlsx")
+    if not (class_name or grade_name):
+        raise HTTPException(status_code=400, detail="Select a class or a grade")
+    students = user_admin.select_students(db, class_name, grade_name)
+    if not students:
+        raise HTTPException(status_code=404, detail="No students found")
+    cards = report_cards.build_cards(db, students)
+    filename = f"report_cards_{class_name or grade_name}.zip"
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+    return StreamingResponse(report_cards.zip_stream(cards, format), headers=headers, media_type="application/zip")
+
+@app.get("/api/reports/metrics")
+def report_cache_metrics():
+    return report_cards.cache.metrics()
+
+@app.get("/api/reports/{student_id}")
+def student_report_card(student_id: int, format: str = "html", db: Session = Depends(get_db),
+                        current_user: models.User = Depends(auth.get_current_active_user)):
+    # Parents / students only get their own card
+    if current_user.role in ["parent", "student"] and current_user.student_id != student_id:
+        raise HTTPException(status_code=403, detail="Not allowed")
+    if format not in report_cards.report_render.FORMATS:
+        raise HTTPException(status_code=400, detail="format must be html or xlsx")
+    student = db.query(models.Student).filter(models.Student.id == student_id).first()
+    if not student:
+        raise HTTPException(status_code=404, detail="Student not found")
+    card = report_cards.build_cards(db, [student])[0]
+    data = report_cards.render_card(card, format)
+    ext, media_type = report_cards.report_render.FORMATS[format]
+    headers = {'Content-Disposition': f'inline; filename="{report_cards.card_filename(card, format)}"'}
+    return Response(content=data, media_type=media_type, headers=headers)
+
 @app.get("/api/export/roster")
 def export_roster(class_name: str = None, db: Session = Depends(get_db)):
     """
@@ -405,7 +476,7 @@ def export_roster(class_name: str = None, db: Session = Depends(get_db)):
     """
     from openpyxl import Workbook
     from openpyxl.styles import Protection
-    from fastapi.responses import StreamingResponse
+    from fastapi.responses import Response, StreamingResponse
 
     # 1. Fetch Students
     query = db.query(models.Student)
@@ -450,7 +521,8 @@ def export_roster(class_name: str = None, db: Session = Depends(get_db)):
 
     # Save to buffer
     output = io.BytesIO()
-    wb.save(output)
+    with profiling.timed("parse"):
+        wb.save(output)
     output.seek(0)
     
     filename = f"roster_{class_name if class_name else 'all'}.xlsx"
@@ -463,23 +535,33 @@ def export_roster(class_name: str = None, db: Session = Depends(get_db)):
 
     return StreamingResponse(output, headers=headers, media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
 
+@app.get("/api/export/standardized")
+def export_standardized(course: List[str] = Query(None), score: str = "t", grade_name: str = None,
+                        class_name: List[str] = Query(None), curve: str = None, target_mean: float = None,
+                        target_std: float = None, full: float = None, db: Session = Depends(get_db),
+                        current_user: models.User = Depends(auth.get_current_active_user)):
+    """Excel of raw / T / percentile scores per course plus the composite ranking."""
+    if current_user.role in ["parent", "student"]:
+        raise HTTPException(status_code=403, detail="Not allowed")
+    curve = parse_scale(score, curve, target_mean, target_std, full, scales=("z", "t", "percentile", "curved"))
+    students = {sid: (number, name) for sid, number, name in
+                db.query(models.Student.id, models.Student.student_number, models.Student.name)}
+    output = standardize.standardized_workbook(grade_store.store.snapshot(), students, course, score, curve,
+                                               grade_name, class_name)
+    filename = f"standardized_{grade_name or 'all'}.xlsx"
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+    return StreamingResponse(output, headers=headers, media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
 @app.delete("/api/courses/{course_name}")
 def delete_course(course_name: str, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_active_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admin can delete courses")
-    students = db.query(models.Student).all()
-    count = 0
-    for s in students:
-        if s.grades and course_name in s.grades:
-            # Create a copy to trigger SQLAlchemy update detection for JSON
-            new_grades = dict(s.grades)
-            del new_grades[course_name]
-            s.grades = new_grades
-            db.add(s) # Mark as modified
-            count += 1
+    if not crud.get_course_by_name(db, course_name):
+        raise HTTPException(status_code=404, detail="Course not found")
+    count = crud.delete_course_by_name(db, course_name, commit=False)
+    version = grade_store.store.bump(db)
     db.commit()
-    # Also delete from Course table
-    crud.delete_course_by_name(db, course_name)
+    grade_store.store.changed(db, version, deleted_courses=[course_name])
     return {"message": f"Course '{course_name}' deleted from {count} students."}
 
 @app.get("/api/courses")
@@ -491,14 +573,39 @@ def read_courses(db: Session = Depends(get_db)):
     # Current upload_grades ensures Course entity exists.
     return [{"name": c.name, "is_visible": c.is_visible} for c in courses]
 
+# --- Change feed (see change_feed.py) ---
+# Dashboards load /api/students once (X-Change-Seq header), then apply these deltas
+
+@app.get("/api/changes")
+def read_changes(since: int = 0, limit: int = change_feed.BATCH):
+    """Events after `since`, for clients that poll instead of streaming."""
+    return change_feed.read(since, max(1, min(limit, change_feed.BATCH)))
+
+@app.get("/api/changes/stream")
+async def stream_changes(since: Optional[int] = None, last_event_id: Optional[int] = Header(None)):
+    """
+    Server-sent events, one per change (id = sequence number).
+    Resumes after Last-Event-ID (sent by EventSource when it reconnects), else after `since`,
+    else starts from now.
+    """
+    if last_event_id is not None:
+        since = last_event_id
+    return StreamingResponse(
+        change_feed.feed.stream(since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.put("/api/courses/{course_name}/toggle")
 def toggle_course_visibility(course_name: str, db: Session = Depends(get_db)):
     course = crud.get_course_by_name(db, course_name)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
     
-    course.is_visible = not course.is_visible
+    crud.toggle_course_visibility(db, course, commit=False)
+    version = grade_store.store.bump(db)
     db.commit()
+    grade_store.store.changed(db, version, courses=[course_name])
     return {"message": f"Course '{course_name}' visibility set to {course.is_visible}", "is_visible": course.is_visible}
 
 # --- User Management Endpoints ---
@@ -518,6 +625,59 @@ async def create_user(user: schemas.UserCreate, db: Session = Depends(get_db), c
         raise HTTPException(status_code=400, detail="Username already registered")
     return crud.create_user(db=db, user=user)
 
+# --- Bulk user administration (by class, grade or ids) ---
+# Declared before the /api/users/{user_id} routes so "bulk" isn't taken for an id
+
+XLSX_MEDIA_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+def require_admin(current_user: models.User = Depends(auth.get_current_active_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can manage users")
+    return current_user
+
+def require_selection(req: schemas.BulkUserSelection):
+    if not (req.class_name or req.grade_name or req.ids):
+        raise HTTPException(status_code=400, detail="Select a class, a grade or a list of ids")
+
+def credentials_response(result: dict, format: str, filename: str):
+    if format == "xlsx":
+        output = user_admin.credentials_workbook(result["credentials"])
+        headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+        return StreamingResponse(output, headers=headers, media_type=XLSX_MEDIA_TYPE)
+    return result
+
+@app.post("/api/users/bulk/create")
+def bulk_create_users(req: schemas.BulkPasswordRequest, format: str = "json", db: Session = Depends(get_db),
+                      current_user: models.User = Depends(require_admin)):
+    """Create accounts for the selected students that have none. format=xlsx returns the credentials sheet."""
+    require_selection(req)
+    students = user_admin.select_students(db, req.class_name, req.grade_name, req.ids)
+    result = user_admin.bulk_create_users(db, students, req.password, req.random_password)
+    return credentials_response(result, format, "new_accounts.xlsx")
+
+@app.post("/api/users/bulk/reset-password")
+def bulk_reset_passwords(req: schemas.BulkPasswordRequest, format: str = "json", db: Session = Depends(get_db),
+                         current_user: models.User = Depends(require_admin)):
+    require_selection(req)
+    users = user_admin.select_users(db, req.class_name, req.grade_name, req.ids)
+    result = user_admin.bulk_reset_passwords(db, users, req.password, req.random_password)
+    return credentials_response(result, format, "reset_passwords.xlsx")
+
+@app.post("/api/users/bulk/delete")
+def bulk_delete_users(req: schemas.BulkUserSelection, db: Session = Depends(get_db),
+                      current_user: models.User = Depends(require_admin)):
+    require_selection(req)
+    users = user_admin.select_users(db, req.class_name, req.grade_name, req.ids)
+    return user_admin.bulk_delete_users(db, [u for u in users if u.id != current_user.id])
+
+@app.get("/api/users/credentials")
+def download_credentials(class_name: str = None, grade_name: str = None, db: Session = Depends(get_db),
+                         current_user: models.User = Depends(require_admin)):
+    """Sheet of accounts still on their initial password (to hand out again)."""
+    users = user_admin.select_users(db, class_name, grade_name)
+    result = {"credentials": user_admin.stored_credentials(users)}
+    return credentials_response(result, "xlsx", f"credentials_{class_name or grade_name or 'all'}.xlsx")
+
 @app.delete("/api/users/{user_id}")
 async def delete_user(user_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_active_user)):
     if current_user.role != "admin":
@@ -551,6 +711,70 @@ async def change_password(request: schemas.PasswordChange, db: Session = Depends
     updated_user = crud.update_user_password(db, current_user.id, request.new_password)
     return {"message": "Password changed successfully"}
 
+# --- Database snapshots (see backups.py) ---
+
+def backup_call(fn, *args):
+    if not SQLALCHEMY_DATABASE_URL.startswith("sqlite:///"):
+        raise HTTPException(status_code=400, detail="Snapshots are only supported for SQLite databases")
+    try:
+        return fn(*args)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/backups")
+def list_backups(current_user: models.User = Depends(auth.get_current_active_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can manage backups")
+    return backup_call(backups.list_snapshots)
+
+@app.post("/api/backups")
+def create_backup(label: str = backups.MANUAL, current_user: models.User = Depends(auth.get_current_active_user)):
+    """Online snapshot: copied page by page while the server keeps serving, then gzipped."""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can manage backups")
+    return backup_call(backups.snapshot, label)
+
+@app.get("/api/backups/{name}")
+def download_backup(name: str, current_user: models.User = Depends(auth.get_current_active_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can manage backups")
+    path = backup_call(backups.snapshot_path, name)
+    return FileResponse(path, filename=name, media_type="application/gzip")
+
+@app.post("/api/backups/{name}/restore")
+def restore_backup(name: str, current_user: models.User = Depends(auth.get_current_active_user)):
+    """Replace the database with a snapshot; the current data is snapshotted first ("pre_restore_snapshot")."""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can manage backups")
+    result = backup_call(backups.restore, name)
+    # This worker rebuilds right away, the others on their next cache check
+    grade_store.store.rebuild()
+    return result
+
+@app.delete("/api/backups/{name}")
+def delete_backup(name: str, current_user: models.User = Depends(auth.get_current_active_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can manage backups")
+    backup_call(backups.delete, name)
+    return {"message": f"Snapshot {name} deleted"}
+
 if __name__ == "__main__":
+    import argparse
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+
+    parser = argparse.ArgumentParser(description="Smart Grade API server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", 1)),
+                        help="worker processes (production: one per core, or use gunicorn.conf.py)")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        # Do the one-time work before the workers start
+        bootstrap.bootstrap()
+        engine.dispose()
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+    else:
+        uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,113 @@
+"""
+In-memory student matching for one import session.
+
+Built once from the students table, then every sheet row is matched with dict
+lookups instead of a query per row. Name matching is explicit about collisions:
+if two students share a name (and the sheet gives no class to tell them apart)
+the row is reported as ambiguous instead of silently picking one.
+"""
+import unicodedata
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+import models
+
+MATCHED = "matched"
+AMBIGUOUS = "ambiguous"
+NOT_FOUND = "not_found"
+
+
+def normalize(value) -> str:
+    """NFKC (full-width -> half-width), collapse whitespace, casefold."""
+    if value is None or value != value:  # None / NaN from pandas
+        return ""
+    s = unicodedata.normalize("NFKC", str(value))
+    return " ".join(s.split()).casefold()
+
+
+def normalize_number(value) -> str:
+    s = normalize(value)
+    # Excel gives numeric IDs back as floats ("1001.0")
+    if s.endswith(".0"):
+        s = s[:-2]
+    return s
+
+
+@dataclass
+class MatchResult:
+    status: str
+    student_id: Optional[int] = None
+    candidates: List[int] = field(default_factory=list)
+
+    @property
+    def matched(self) -> bool:
+        return self.status == MATCHED
+
+
+class StudentMatcher:
+    def __init__(self, students):
+        """students: iterable of objects with id, student_number, name, class_name, grade_name."""
+        self.by_number = {}
+        self.by_name = {}
+        self.by_name_class = {}
+        self.by_name_class_grade = {}
+
+        for s in students:
+            if s.student_number:
+                self.by_number[normalize_number(s.student_number)] = s.id
+            name = normalize(s.name)
+            if not name:
+                continue
+            cls = normalize(s.class_name)
+            grade = normalize(s.grade_name)
+            self.by_name.setdefault(name, []).append(s.id)
+            self.by_name_class.setdefault((name, cls), []).append(s.id)
+            self.by_name_class_grade.setdefault((name, cls, grade), []).append(s.id)
+
+    @classmethod
+    def from_db(cls, db: Session):
+        rows = db.query(
+            models.Student.id, models.Student.student_number, models.Student.name,
+            models.Student.class_name, models.Student.grade_name,
+        ).all()
+        return cls(rows)
+
+    def match_number(self, number) -> MatchResult:
+        sid = self.by_number.get(normalize_number(number))
+        if sid is None:
+            return MatchResult(NOT_FOUND)
+        return MatchResult(MATCHED, sid, [sid])
+
+    def match_name(self, name, class_name=None, grade_name=None) -> MatchResult:
+        key = normalize(name)
+        if not key:
+            return MatchResult(NOT_FOUND)
+
+        candidates = self.by_name.get(key, [])
+        # Narrow down with class / grade when the sheet provides them
+        if len(candidates) > 1 and normalize(class_name):
+            cls = normalize(class_name)
+            if normalize(grade_name):
+                narrowed = self.by_name_class_grade.get((key, cls, normalize(grade_name)), [])
+            else:
+                narrowed = self.by_name_class.get((key, cls), [])
+            if narrowed:
+                candidates = narrowed
+
+        if not candidates:
+            return MatchResult(NOT_FOUND)
+        if len(candidates) > 1:
+            return MatchResult(AMBIGUOUS, None, list(candidates))
+        return MatchResult(MATCHED, candidates[0], list(candidates))
+
+    def match(self, number=None, name=None, class_name=None, grade_name=None) -> MatchResult:
+        """Student number first, then name (+ class / grade)."""
+        if number is not None and normalize_number(number):
+            result = self.match_number(number)
+            if result.matched:
+                return result
+        if name is not None:
+            return self.match_name(name, class_name, grade_name)
+        return MatchResult(NOT_FOUND)
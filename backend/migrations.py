@@ -0,0 +1,169 @@
+"""
+Versioned schema migrations (replaces the one-off migrate_v2.py).
+
+Applied versions are recorded in `schema_migrations`; `upgrade()` runs the
+missing ones in order, each in its own transaction. Every step is written to
+be safe on a database that already has the change (old installs created
+tables with create_all and patched them by hand).
+
+    python migrations.py                 # upgrade the configured database
+    python migrations.py --status        # list applied / pending versions
+    python migrations.py --check-plans   # EXPLAIN the hot queries, exit 1 if one scans a table
+"""
+import argparse
+import sys
+from datetime import datetime
+
+from sqlalchemy import text
+
+import models
+from database import engine as default_engine
+
+
+def _columns(conn, table: str) -> set:
+    return {row[1] for row in conn.execute(text(f"PRAGMA table_info({table})"))}
+
+
+def m001_create_tables(conn):
+    # Only creates what is missing, existing tables are left alone
+    models.Base.metadata.create_all(bind=conn)
+
+
+def m002_course_visibility(conn):
+    if "is_visible" not in _columns(conn, "courses"):
+        conn.execute(text("ALTER TABLE courses ADD COLUMN is_visible BOOLEAN DEFAULT TRUE"))
+
+
+def m003_hot_path_indexes(conn):
+    # Grades by course (stats, rankings), ordered by score
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_grades_course_total ON grades (course_id, total_score)"))
+    # Students by class within a grade; also serves class_name-only lookups
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_students_class_grade ON students (class_name, grade_name)"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_students_class_name"))
+    # Account of a student (bulk user admin, roster sync)
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_student_id ON users (student_id)"))
+    conn.execute(text("ANALYZE"))
+
+
+def m004_cache_versions(conn):
+    models.CacheVersion.__table__.create(bind=conn, checkfirst=True)
+
+
+def m005_import_requests(conn):
+    models.ImportRequest.__table__.create(bind=conn, checkfirst=True)
+
+
+def m006_change_events(conn):
+    models.ChangeEvent.__table__.create(bind=conn, checkfirst=True)
+
+
+# (version, name, function) - append only, never renumber
+MIGRATIONS = [
+    (1, "create tables", m001_create_tables),
+    (2, "courses.is_visible", m002_course_visibility),
+    (3, "hot path indexes", m003_hot_path_indexes),
+    (4, "cache_versions", m004_cache_versions),
+    (5, "import_requests", m005_import_requests),
+    (6, "change_events", m006_change_events),
+]
+
+
+def applied_versions(engine=default_engine) -> set:
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, applied_at VARCHAR NOT NULL)"
+        ))
+        return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def upgrade(engine=default_engine, verbose: bool = True) -> list:
+    """Apply pending migrations. Returns the versions applied."""
+    done = applied_versions(engine)
+    applied = []
+    for version, name, fn in MIGRATIONS:
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            fn(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                {"v": version, "n": name, "t": datetime.utcnow().isoformat(timespec="seconds")},
+            )
+        applied.append(version)
+        if verbose:
+            print(f"Migration {version:03d} applied: {name}")
+    return applied
+
+
+# (name, sql, params, index the plan must use)
+HOT_QUERIES = [
+    ("grades by course ranked",
+     "SELECT student_id, total_score FROM grades WHERE course_id = :c ORDER BY total_score DESC",
+     {"c": 1}, "ix_grades_course_total"),
+    ("students by class and grade",
+     "SELECT id, name FROM students WHERE class_name = :cls AND grade_name = :g",
+     {"cls": "Class 1", "g": "Grade 10"}, "ix_students_class_grade"),
+    ("students by class",
+     "SELECT id, name FROM students WHERE class_name = :cls",
+     {"cls": "Class 1"}, "ix_students_class_grade"),
+    ("class grades for a course",
+     "SELECT s.id, g.total_score FROM students s JOIN grades g ON g.student_id = s.id "
+     "WHERE s.class_name = :cls AND g.course_id = :c",
+     {"cls": "Class 1", "c": 1}, "ix_grades_course_total"),
+    ("user of a student",
+     "SELECT id, username FROM users WHERE student_id = :s",
+     {"s": 1}, "ix_users_student_id"),
+    ("user by username",
+     "SELECT id FROM users WHERE username = :u",
+     {"u": "admin"}, "ix_users_username"),
+    ("student by number",
+     "SELECT id FROM students WHERE student_number = :n",
+     {"n": "2023001"}, "ix_students_student_number"),
+]
+
+
+def check_query_plans(engine=default_engine) -> list:
+    """
+    EXPLAIN QUERY PLAN every hot query.
+    A plan passes if no step is a full table scan and the expected index is used.
+    Returns [(name, ok, plan_lines)].
+    """
+    results = []
+    with engine.connect() as conn:
+        for name, sql, params, index in HOT_QUERIES:
+            plan = [row[-1] for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql), params)]
+            full_scan = any(step.startswith("SCAN") and "INDEX" not in step for step in plan)
+            uses_index = any(index in step for step in plan)
+            results.append((name, not full_scan and uses_index, plan))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Smart Grade schema migrations")
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    parser.add_argument("--check-plans", action="store_true", help="verify the hot queries use indexes")
+    args = parser.parse_args()
+
+    if args.status:
+        done = applied_versions()
+        for version, name, _ in MIGRATIONS:
+            print(f"{version:03d} {'applied' if version in done else 'pending'}  {name}")
+        return
+
+    if args.check_plans:
+        upgrade()
+        failed = 0
+        for name, ok, plan in check_query_plans():
+            print(f"{'OK  ' if ok else 'FAIL'} {name}")
+            for step in plan:
+                print(f"       {step}")
+            failed += not ok
+        sys.exit(1 if failed else 0)
+
+    applied = upgrade()
+    print(f"Database up to date ({len(applied)} migrations applied).")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, JSON, UniqueConstraint, Boolean
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, JSON, UniqueConstraint, Boolean, Index
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -9,10 +9,13 @@ class Student(Base):
     student_number = Column(String, unique=True, index=True) # 学号，唯一标识
     name = Column(String, index=True)
     grade_name = Column(String, index=True) # 年级
-    class_name = Column(String, index=True)
+    class_name = Column(String) # indexed together with grade_name below
 
     grades = relationship("Grade", back_populates="student")
 
+    # Class lists (optionally within a grade); see migrations.m003_hot_path_indexes
+    __table_args__ = (Index('ix_students_class_grade', 'class_name', 'grade_name'),)
+
 class Course(Base):
     __tablename__ = "courses"
 
@@ -35,9 +38,12 @@ class Grade(Base):
     student = relationship("Student", back_populates="grades")
     course = relationship("Course", back_populates="grades")
 
-    # Ensure one grade per course per student
-    # Ensure one grade per course per student
-    __table_args__ = (UniqueConstraint('student_id', 'course_id', name='_student_course_uc'),)
+    # Ensure one grade per course per student (also the index for student -> grades)
+    # Grades of a course ordered by score (stats, rankings)
+    __table_args__ = (
+        UniqueConstraint('student_id', 'course_id', name='_student_course_uc'),
+        Index('ix_grades_course_total', 'course_id', 'total_score'),
+    )
 
 class User(Base):
     __tablename__ = "users"
@@ -46,8 +52,43 @@ class User(Base):
     username = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     role = Column(String) # "admin" or "student"
-    student_id = Column(Integer, ForeignKey("students.id"), nullable=True)
+    student_id = Column(Integer, ForeignKey("students.id"), nullable=True, index=True)
     is_password_changed = Column(Boolean, default=False)
     initial_password = Column(String, nullable=True) 
 
     student = relationship("Student")
+
+class MappingProfile(Base):
+    __tablename__ = "mapping_profiles"
+
+    id = Column(Integer, primary_key=True, index=True)
+    signature = Column(String, unique=True, index=True) # hash of the normalized header row
+    mapping = Column(JSON) # {"student_id": "学号", "name": "姓名", "total_score": "总分"}
+    header_row = Column(Integer, default=0)
+    use_count = Column(Integer, default=0)
+
+class CacheVersion(Base):
+    __tablename__ = "cache_versions"
+
+    name = Column(String, primary_key=True) # cache channel, see cache_bus.py
+    version = Column(Integer, default=0, nullable=False)
+
+class ImportRequest(Base):
+    __tablename__ = "import_requests"
+
+    key = Column(String, primary_key=True) # Idempotency-Key header, see idempotency.py
+    endpoint = Column(String, nullable=False)
+    request_hash = Column(String, nullable=False) # sha256 of the uploaded file + parameters
+    status = Column(String, nullable=False) # in_progress / done
+    response = Column(JSON) # stored result, replayed on retries
+    created_at = Column(Float, nullable=False) # unix time
+
+class ChangeEvent(Base):
+    __tablename__ = "change_events"
+    # AUTOINCREMENT: sequence numbers are never reused after old events are pruned
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq = Column(Integer, primary_key=True) # change feed position, see change_feed.py
+    kind = Column(String, nullable=False) # grades / course / course_deleted / students
+    payload = Column(JSON, nullable=False)
+    created_at = Column(Float, nullable=False) # unix time
@@ -0,0 +1,238 @@
+"""
+Per-request cost accounting.
+
+- SQLAlchemy engine events count statements, DB time and commits.
+- timed("parse") / timed("hash") blocks add pandas/openpyxl and bcrypt time.
+- ProfilingMiddleware ties it to the current request, keeps per-endpoint
+  totals for /api/metrics (Prometheus text format), adds X-* / Server-Timing
+  headers when SMARTGRADE_DEBUG is on and logs slow requests with their
+  most expensive statements when SLOW_REQUEST_MS is set.
+
+Numbers are per process; with several workers each one reports its own.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+DEBUG = os.environ.get("SMARTGRADE_DEBUG", "").lower() in ("1", "true", "yes")
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 0))
+SLOW_LOG_TOP_QUERIES = 5
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+TIMER_KINDS = ("parse", "hash")
+
+
+class RequestStats:
+    def __init__(self, keep_statements: bool = False):
+        self.keep_statements = keep_statements
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.commits = 0
+        self.timers = {k: 0.0 for k in TIMER_KINDS}
+        self.statements = {}  # sql -> [count, seconds], only kept for the slow log
+
+    def add_query(self, seconds: float, statement: str):
+        self.queries += 1
+        self.db_seconds += seconds
+        if self.keep_statements:
+            entry = self.statements.setdefault(statement, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def top_statements(self, n: int = SLOW_LOG_TOP_QUERIES):
+        """[(total_seconds, count, sql)] for the statements that took the most time overall."""
+        rows = [(seconds, count, sql) for sql, (count, seconds) in self.statements.items()]
+        return sorted(rows, reverse=True)[:n]
+
+
+_current = ContextVar("request_stats", default=None)
+
+
+def current_stats():
+    return _current.get()
+
+
+@contextmanager
+def timed(kind: str):
+    """Add the block's wall time to the current request's `kind` timer."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = _current.get()
+        if stats is not None:
+            stats.timers[kind] = stats.timers.get(kind, 0.0) + time.perf_counter() - t0
+
+
+def instrument_engine(engine):
+    """Hook statement / commit events on an engine (idempotent)."""
+    if getattr(engine, "_profiling_installed", False):
+        return
+    engine._profiling_installed = True
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        metrics.observe_query(elapsed)
+        stats = _current.get()
+        if stats is not None:
+            stats.add_query(elapsed, statement)
+
+    @event.listens_for(engine, "commit")
+    def on_commit(conn):
+        stats = _current.get()
+        if stats is not None:
+            stats.commits += 1
+
+
+class Metrics:
+    """Process-wide counters, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}   # (method, endpoint, status) -> count
+        self.endpoints = {}  # endpoint -> totals
+        self.queries_total = 0
+        self.db_seconds_total = 0.0
+
+    def observe_query(self, seconds: float):
+        with self._lock:
+            self.queries_total += 1
+            self.db_seconds_total += seconds
+
+    def observe_request(self, method: str, endpoint: str, status: int, seconds: float, stats: RequestStats):
+        with self._lock:
+            key = (method, endpoint, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            e = self.endpoints.get(endpoint)
+            if e is None:
+                e = self.endpoints[endpoint] = {
+                    "count": 0, "seconds": 0.0, "buckets": [0] * len(DURATION_BUCKETS),
+                    "queries": 0, "db_seconds": 0.0, "commits": 0,
+                    "timers": {k: 0.0 for k in TIMER_KINDS},
+                }
+            e["count"] += 1
+            e["seconds"] += seconds
+            for i, le in enumerate(DURATION_BUCKETS):
+                if seconds <= le:
+                    e["buckets"][i] += 1
+            e["queries"] += stats.queries
+            e["db_seconds"] += stats.db_seconds
+            e["commits"] += stats.commits
+            for k, v in stats.timers.items():
+                e["timers"][k] = e["timers"].get(k, 0.0) + v
+
+    def render(self, extra_gauges: dict = None) -> str:
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            metric("smartgrade_http_requests_total", "counter", "HTTP requests by method, endpoint and status.")
+            for (method, endpoint, status), n in sorted(self.requests.items()):
+                lines.append(f'smartgrade_http_requests_total{{method="{method}",endpoint="{endpoint}",status="{status}"}} {n}')
+
+            metric("smartgrade_http_request_duration_seconds", "histogram", "Request wall time.")
+            for endpoint, e in sorted(self.endpoints.items()):
+                for le, n in zip(DURATION_BUCKETS, e["buckets"]):
+                    lines.append(f'smartgrade_http_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{le}"}} {n}')
+                lines.append(f'smartgrade_http_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {e["count"]}')
+                lines.append(f'smartgrade_http_request_duration_seconds_sum{{endpoint="{endpoint}"}} {e["seconds"]:.6f}')
+                lines.append(f'smartgrade_http_request_duration_seconds_count{{endpoint="{endpoint}"}} {e["count"]}')
+
+            per_endpoint = [
+                ("smartgrade_db_queries_total", "SQL statements executed.", lambda e: e["queries"]),
+                ("smartgrade_db_seconds_total", "Time spent in SQL statements.", lambda e: round(e["db_seconds"], 6)),
+                ("smartgrade_db_commits_total", "Transactions committed.", lambda e: e["commits"]),
+            ] + [
+                (f"smartgrade_{k}_seconds_total", f"Time spent in {k} blocks.", lambda e, k=k: round(e["timers"].get(k, 0.0), 6))
+                for k in TIMER_KINDS
+            ]
+            for name, help_text, value in per_endpoint:
+                metric(name, "counter", help_text + " Per endpoint.")
+                for endpoint, e in sorted(self.endpoints.items()):
+                    lines.append(f'{name}{{endpoint="{endpoint}"}} {value(e)}')
+
+            metric("smartgrade_process_db_queries_total", "counter", "All SQL statements, including outside requests.")
+            lines.append(f"smartgrade_process_db_queries_total {self.queries_total}")
+
+        for name, value in (extra_gauges or {}).items():
+            metric(name, "gauge", name.replace("_", " ") + ".")
+            lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, debug: bool = DEBUG, slow_request_ms: float = SLOW_REQUEST_MS):
+        self.app = app
+        self.debug = debug
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(keep_statements=bool(self.slow_request_ms))
+        token = _current.set(stats)
+        t0 = time.perf_counter()
+        status = [500]
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if self.debug:
+                    headers = list(message.get("headers", []))
+                    headers.extend(self.debug_headers(stats, time.perf_counter() - t0))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - t0
+            endpoint = scope.get("endpoint")
+            endpoint_name = getattr(endpoint, "__name__", "unmatched")
+            metrics.observe_request(scope.get("method", ""), endpoint_name, status[0], elapsed, stats)
+            if self.slow_request_ms and elapsed * 1000 >= self.slow_request_ms:
+                self.log_slow(scope, elapsed, stats)
+
+    @staticmethod
+    def debug_headers(stats: RequestStats, elapsed: float):
+        values = {
+            "x-db-queries": str(stats.queries),
+            "x-db-time-ms": f"{stats.db_seconds * 1000:.1f}",
+            "x-db-commits": str(stats.commits),
+            "x-parse-time-ms": f"{stats.timers.get('parse', 0.0) * 1000:.1f}",
+            "x-hash-time-ms": f"{stats.timers.get('hash', 0.0) * 1000:.1f}",
+            "server-timing": ", ".join([
+                f"db;dur={stats.db_seconds * 1000:.1f}",
+                f"parse;dur={stats.timers.get('parse', 0.0) * 1000:.1f}",
+                f"hash;dur={stats.timers.get('hash', 0.0) * 1000:.1f}",
+                f"app;dur={elapsed * 1000:.1f}",
+            ]),
+        }
+        return [(k.encode(), v.encode()) for k, v in values.items()]
+
+    @staticmethod
+    def log_slow(scope, elapsed: float, stats: RequestStats):
+        print(f"Slow request: {scope.get('method')} {scope.get('path')} {elapsed * 1000:.0f} ms, "
+              f"{stats.queries} queries ({stats.db_seconds * 1000:.0f} ms), {stats.commits} commits, "
+              f"parse {stats.timers.get('parse', 0.0) * 1000:.0f} ms, hash {stats.timers.get('hash', 0.0) * 1000:.0f} ms")
+        for seconds, count, statement in stats.top_statements():
+            print(f"    {seconds * 1000:8.1f} ms  x{count:<5} {' '.join(statement.split())[:200]}")
@@ -0,0 +1,233 @@
+"""
+Server-side report cards, one student or a whole class / grade at a time.
+
+- build_cards: one query for every grade in the students' grade levels, then
+  class / grade averages and class ranks computed in Python.
+- Rendered files are cached on disk under REPORT_CACHE_DIR, keyed by student
+  and a hash of the card data. When the student's scores (or the class
+  averages and ranks on the card) change, the hash changes and the card is
+  rendered again. The cache is shared by all workers.
+- Batches render the cache misses on a process pool (REPORT_WORKERS) and are
+  streamed back as a ZIP while rendering goes on.
+"""
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import threading
+import zipfile
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy.orm import Session
+
+import models
+import report_render
+
+REPORT_CACHE_DIR = os.environ.get("REPORT_CACHE_DIR", "report_cache")
+REPORT_WORKERS = int(os.environ.get("REPORT_WORKERS", os.cpu_count() or 1))
+# Smaller batches render inline, starting the pool isn't worth it
+POOL_MIN_BATCH = 8
+
+
+def build_cards(db: Session, students: list) -> list:
+    """Card dicts (see report_render) for `students`, in the same order. Hidden courses are left out."""
+    if not students:
+        return []
+    grade_names = {s.grade_name for s in students}
+    rows = (
+        db.query(models.Grade.student_id, models.Student.class_name, models.Student.grade_name,
+                 models.Course.name, models.Grade.total_score, models.Grade.sub_scores)
+        .join(models.Student, models.Grade.student_id == models.Student.id)
+        .join(models.Course, models.Grade.course_id == models.Course.id)
+        .filter(models.Student.grade_name.in_(grade_names), models.Course.is_visible == True)
+        .all()
+    )
+
+    by_student = {}    # student id -> {course: (score, details)}
+    class_scores = {}  # (grade, class, course) -> [scores]
+    grade_scores = {}  # (grade, course) -> [scores]
+    class_totals = {}  # (grade, class) -> {student id: total}
+    for student_id, class_name, grade_name, course, score, details in rows:
+        by_student.setdefault(student_id, {})[course] = (score, details or {})
+        if score is None:
+            continue
+        class_scores.setdefault((grade_name, class_name, course), []).append(score)
+        grade_scores.setdefault((grade_name, course), []).append(score)
+        totals = class_totals.setdefault((grade_name, class_name), {})
+        totals[student_id] = totals.get(student_id, 0.0) + score
+    for scores in list(class_scores.values()) + list(grade_scores.values()):
+        scores.sort()
+    sorted_totals = {k: sorted(v.values()) for k, v in class_totals.items()}
+
+    def rank(sorted_scores, score):
+        # Ties share the better rank
+        if score is None or not sorted_scores:
+            return None
+        return len(sorted_scores) - bisect_right(sorted_scores, score) + 1
+
+    def avg(scores):
+        return sum(scores) / len(scores) if scores else None
+
+    cards = []
+    for s in students:
+        courses = []
+        for course, (score, details) in sorted(by_student.get(s.id, {}).items()):
+            in_class = class_scores.get((s.grade_name, s.class_name, course), [])
+            courses.append({
+                "name": course,
+                "score": score,
+                "details": details,
+                "class_avg": avg(in_class),
+                "grade_avg": avg(grade_scores.get((s.grade_name, course), [])),
+                "class_rank": rank(in_class, score),
+                "class_size": len(in_class),
+            })
+        totals = sorted_totals.get((s.grade_name, s.class_name), [])
+        total = class_totals.get((s.grade_name, s.class_name), {}).get(s.id)
+        cards.append({
+            "student": {"id": s.id, "student_number": s.student_number, "name": s.name,
+                        "class_name": s.class_name, "grade_name": s.grade_name},
+            "courses": courses,
+            "total": total,
+            "total_rank": rank(totals, total),
+            "class_size": len(totals),
+        })
+    return cards
+
+
+def fingerprint(card: dict) -> str:
+    return hashlib.sha256(json.dumps(card, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+class ReportCache:
+    """Rendered cards on disk: <root>/<student id>-<fingerprint>.<ext>"""
+
+    def __init__(self, root: str = REPORT_CACHE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _path(self, student_id: int, fp: str, fmt: str) -> str:
+        return os.path.join(self.root, f"{int(student_id)}-{fp}.{report_render.FORMATS[fmt][0]}")
+
+    def get(self, card: dict, fmt: str):
+        path = self._path(card["student"]["id"], fingerprint(card), fmt)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+        with self._lock:
+            self.stats["hits"] += 1
+        return data
+
+    def put(self, card: dict, fmt: str, data: bytes):
+        student_id = int(card["student"]["id"])
+        path = self._path(student_id, fingerprint(card), fmt)
+        os.makedirs(self.root, exist_ok=True)
+        # Older versions of this student's card are stale now
+        ext = report_render.FORMATS[fmt][0]
+        for old in glob.glob(os.path.join(self.root, f"{student_id}-*.{ext}")):
+            if old != path:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        files = glob.glob(os.path.join(self.root, "*-*.*"))
+        return {
+            "files": len(files),
+            "bytes": sum(os.path.getsize(p) for p in files if os.path.exists(p)),
+            **stats,
+            "hit_rate": round(stats["hits"] / lookups, 3) if lookups else 0.0,
+        }
+
+
+cache = ReportCache()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Shared render pool, started on first use. spawn: workers don't inherit the server's threads and sockets."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=REPORT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def render_card(card: dict, fmt: str) -> bytes:
+    data = cache.get(card, fmt)
+    if data is None:
+        data = report_render.render(card, fmt)
+        cache.put(card, fmt, data)
+    return data
+
+
+def render_cards(cards: list, fmt: str):
+    """Yield (card, bytes) in input order; cache misses are rendered in parallel."""
+    cached = [cache.get(card, fmt) for card in cards]
+    misses = [card for card, data in zip(cards, cached) if data is None]
+    if len(misses) >= POOL_MIN_BATCH and REPORT_WORKERS > 1:
+        rendered = get_pool().map(report_render.render, misses, [fmt] * len(misses), chunksize=4)
+    else:
+        rendered = (report_render.render(card, fmt) for card in misses)
+
+    for card, data in zip(cards, cached):
+        if data is None:
+            data = next(rendered)
+            cache.put(card, fmt, data)
+        yield card, data
+
+
+def card_filename(card: dict, fmt: str) -> str:
+    s = card["student"]
+    name = f"{s['class_name'] or ''}_{s['student_number']}_{s['name'] or ''}"
+    # Keep letters (any script), digits and a few separators
+    name = re.sub(r"[^\w\-]+", "_", name).strip("_")
+    return f"{name}.{report_render.FORMATS[fmt][0]}"
+
+
+class _ZipSink:
+    """Write-only buffer for ZipFile; the stream generator drains it after each card."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def zip_stream(cards: list, fmt: str):
+    """Generator of ZIP bytes, one card at a time. HTML is deflated; xlsx files are zips already and are stored."""
+    sink = _ZipSink()
+    compression = zipfile.ZIP_DEFLATED if fmt == "html" else zipfile.ZIP_STORED
+    # No seek/tell on the sink: zipfile writes data descriptors instead
+    with zipfile.ZipFile(sink, "w", compression=compression) as zf:
+        for card, data in render_cards(cards, fmt):
+            zf.writestr(card_filename(card, fmt), data)
+            yield sink.drain()
+    yield sink.drain()
@@ -0,0 +1,160 @@
+"""
+Report card renderers (HTML and XLSX).
+
+Pure functions of a card dict built by report_cards.build_cards; no database
+or app imports, so they are cheap to load in the process-pool workers.
+
+Card layout:
+    {"student": {"id", "student_number", "name", "class_name", "grade_name"},
+     "courses": [{"name", "score", "details", "class_avg", "grade_avg",
+                  "class_rank", "class_size"}],
+     "total": float, "total_rank": int, "class_size": int}
+"""
+import html
+import io
+
+SCHOOL_NAME = "Smart Grade Academy"
+REPORT_TITLE = "Official Academic Report"
+
+FORMATS = {
+    "html": ("html", "text/html"),
+    "xlsx": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+def _fmt(value, digits: int = 1) -> str:
+    if value is None:
+        return "-"
+    if float(value).is_integer():
+        return str(int(value))
+    return f"{value:.{digits}f}"
+
+
+def _diff(score, avg) -> str:
+    if score is None or avg is None:
+        return "-"
+    d = score - avg
+    return f"+{d:.1f}" if d > 0 else f"{d:.1f}"
+
+
+def _bars_svg(courses: list) -> str:
+    """Score vs class average per subject, as horizontal bars (prints without JS)."""
+    top = max([c["score"] or 0 for c in courses] + [c["class_avg"] or 0 for c in courses] + [1])
+    row_h, label_w, bar_w = 30, 110, 300
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{label_w + bar_w + 60}" height="{row_h * len(courses) + 10}">']
+    for i, c in enumerate(courses):
+        y = i * row_h + 5
+        score_w = bar_w * (c["score"] or 0) / top
+        avg_w = bar_w * (c["class_avg"] or 0) / top
+        parts.append(f'<text x="0" y="{y + 15}" font-size="12">{html.escape(c["name"])}</text>')
+        parts.append(f'<rect x="{label_w}" y="{y}" width="{score_w:.1f}" height="12" fill="#1890ff"/>')
+        parts.append(f'<rect x="{label_w}" y="{y + 13}" width="{avg_w:.1f}" height="8" fill="#52c41a" opacity="0.6"/>')
+        parts.append(f'<text x="{label_w + score_w + 4:.1f}" y="{y + 11}" font-size="11">{_fmt(c["score"])}</text>')
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def render_html(card: dict) -> bytes:
+    s = card["student"]
+    e = html.escape
+    rows = []
+    for c in card["courses"]:
+        diff = _diff(c["score"], c["class_avg"])
+        color = "green" if diff.startswith("+") else "red"
+        rows.append(
+            f"<tr><td>{e(c['name'])}</td><td><b>{_fmt(c['score'])}</b></td><td>{_fmt(c['class_avg'])}</td>"
+            f"<td>{_fmt(c['grade_avg'])}</td><td style=\"color:{color}\">{diff}</td>"
+            f"<td>{c['class_rank'] or '-'} / {c['class_size']}</td></tr>"
+        )
+    details = []
+    for c in card["courses"]:
+        if c["details"]:
+            items = ", ".join(f"{e(str(k))}: {_fmt(v) if isinstance(v, (int, float)) else e(str(v))}"
+                              for k, v in c["details"].items())
+            details.append(f"<p><b>{e(c['name'])}</b>: {items}</p>")
+
+    page = f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{e(s['name'])} - {REPORT_TITLE}</title>
+<style>
+@page {{ size: A4; margin: 15mm; }}
+body {{ font-family: sans-serif; color: #222; max-width: 180mm; margin: 0 auto; }}
+.header {{ text-align: center; border-bottom: 2px solid #1890ff; padding-bottom: 8px; margin-bottom: 16px; }}
+.header h1 {{ color: #1890ff; margin: 0; }}
+.info {{ display: flex; justify-content: space-between; background: #f5faff; padding: 10px; margin-bottom: 16px; }}
+.info span {{ color: #888; font-size: 12px; display: block; }}
+table {{ border-collapse: collapse; width: 100%; margin-bottom: 16px; }}
+th, td {{ border: 1px solid #ddd; padding: 4px 8px; text-align: center; }}
+th {{ background: #fafafa; }}
+.details p {{ margin: 2px 0; font-size: 12px; }}
+.signatures {{ display: flex; justify-content: space-around; margin-top: 48px; }}
+.signatures div {{ border-top: 1px solid #000; width: 40%; text-align: center; padding-top: 8px; }}
+</style></head>
+<body>
+<div class="header"><h1>{SCHOOL_NAME}</h1><div>{REPORT_TITLE}</div></div>
+<div class="info">
+  <div><span>Student Name</span><b>{e(s['name'] or '')}</b></div>
+  <div><span>Student ID</span><b>{e(s['student_number'] or '')}</b></div>
+  <div><span>Class</span><b>{e(s['grade_name'] or '')} {e(s['class_name'] or '')}</b></div>
+  <div><span>Total / Class Rank</span><b>{_fmt(card['total'])} ({card['total_rank'] or '-'} / {card['class_size']})</b></div>
+</div>
+<table>
+<tr><th>Subject</th><th>Score</th><th>Class Avg</th><th>Grade Avg</th><th>Diff</th><th>Class Rank</th></tr>
+{''.join(rows)}
+</table>
+{_bars_svg(card['courses']) if card['courses'] else ''}
+<div class="details">{''.join(details)}</div>
+<div class="signatures"><div>Class Teacher Signature</div><div>Principal Signature</div></div>
+</body></html>
+"""
+    return page.encode("utf-8")
+
+
+def render_xlsx(card: dict) -> bytes:
+    from openpyxl import Workbook
+    from openpyxl.styles import Font
+
+    s = card["student"]
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Report"
+    ws.append([SCHOOL_NAME, REPORT_TITLE])
+    ws["A1"].font = Font(bold=True, size=14)
+    ws.append(["学号", s["student_number"], "姓名", s["name"]])
+    ws.append(["年级", s["grade_name"], "班级", s["class_name"]])
+    ws.append(["总分", card["total"], "班级排名", f"{card['total_rank'] or '-'} / {card['class_size']}"])
+    ws.append([])
+    ws.append(["科目", "成绩", "班级平均", "年级平均", "差值", "班级排名"])
+    for cell in ws[ws.max_row]:
+        cell.font = Font(bold=True)
+    for c in card["courses"]:
+        ws.append([
+            c["name"], c["score"],
+            round(c["class_avg"], 1) if c["class_avg"] is not None else None,
+            round(c["grade_avg"], 1) if c["grade_avg"] is not None else None,
+            _diff(c["score"], c["class_avg"]),
+            f"{c['class_rank'] or '-'} / {c['class_size']}",
+        ])
+
+    # One row per subject with its item scores
+    if any(c["details"] for c in card["courses"]):
+        ws.append([])
+        ws.append(["分项成绩"])
+        ws[ws.max_row][0].font = Font(bold=True)
+        for c in card["courses"]:
+            if c["details"]:
+                row = [c["name"]]
+                for k, v in c["details"].items():
+                    row.extend([k, v])
+                ws.append(row)
+
+    ws.column_dimensions["A"].width = 16
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+
+RENDERERS = {"html": render_html, "xlsx": render_xlsx}
+
+
+def render(card: dict, fmt: str) -> bytes:
+    return RENDERERS[fmt](card)
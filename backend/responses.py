@@ -0,0 +1,127 @@
+"""
+Fast response helpers for the large list endpoints.
+
+- FastJSONResponse: orjson-encoded response, returned directly from a route so
+  FastAPI skips jsonable_encoder + json.dumps.
+- to_columnar: parallel-array layout for the student list (no repeated keys).
+- CompressionMiddleware: brotli when the client accepts it (and the `brotli`
+  package is installed), gzip otherwise. Small bodies and event streams are
+  sent as-is.
+"""
+from fastapi.responses import ORJSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is always available
+    brotli = None
+
+FastJSONResponse = ORJSONResponse
+
+# Below this size compression costs more than it saves
+COMPRESS_MIN_SIZE = 1024
+
+
+def to_columnar(students: list) -> dict:
+    """
+    Convert the row layout of /api/students into parallel arrays.
+
+    Row layout:      [{"id": 1, "name": "A", "grades": {"Math": {"total": 90, "details": {...}}}}, ...]
+    Columnar layout: {"id": [1, ...], "name": ["A", ...],
+                      "courses": ["Math", ...],
+                      "totals":  {"Math": [90, ...]},    # None where the student has no grade
+                      "details": {"Math": [{...}, ...]}}
+    """
+    fields = ["id", "student_number", "name", "class_name", "grade_name"]
+    result = {"format": "columnar", "count": len(students)}
+    for f in fields:
+        result[f] = [s.get(f) for s in students]
+
+    courses = []
+    seen = set()
+    for s in students:
+        for c in s["grades"]:
+            if c not in seen:
+                seen.add(c)
+                courses.append(c)
+
+    result["courses"] = courses
+    result["totals"] = {c: [None] * len(students) for c in courses}
+    result["details"] = {c: [None] * len(students) for c in courses}
+    for i, s in enumerate(students):
+        for c, g in s["grades"].items():
+            result["totals"][c][i] = g["total"]
+            result["details"][c][i] = g["details"]
+    return result
+
+
+class CompressionMiddleware:
+    """Pick brotli or gzip per request based on Accept-Encoding."""
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE, gzip_level: int = 6, brotli_quality: int = 5):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.brotli_quality = brotli_quality
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and "text/event-stream" in Headers(scope=scope).get("accept", ""):
+            # SSE: gzip would hold events back in its buffer until it has a block to emit
+            await self.app(scope, receive, send)
+            return
+        if scope["type"] == "http" and brotli is not None:
+            accept = Headers(scope=scope).get("accept-encoding", "")
+            if "br" in accept:
+                responder = BrotliResponder(self.app, self.minimum_size, self.brotli_quality)
+                await responder(scope, receive, send)
+                return
+        await self.gzip(scope, receive, send)
+
+
+class BrotliResponder:
+    """
+    Compresses single-body responses with brotli.
+    Streaming responses (more_body=True) are passed through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int, quality: int):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.quality = quality
+        self.send = None
+        self.start_message = None
+        self.passthrough = False
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message):
+        if message["type"] == "http.response.start":
+            # Hold the headers until we know the body size
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            self.passthrough = "content-encoding" in headers
+            return
+
+        if message["type"] != "http.response.body" or self.start_message is None:
+            await self.send(message)
+            return
+
+        start, self.start_message = self.start_message, None
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.passthrough or more_body or len(body) < self.minimum_size:
+            await self.send(start)
+            await self.send(message)
+            return
+
+        compressed = brotli.compress(body, quality=self.quality)
+        headers = MutableHeaders(raw=start["headers"])
+        headers["Content-Encoding"] = "br"
+        headers["Content-Length"] = str(len(compressed))
+        headers.add_vary_header("Accept-Encoding")
+        await self.send(start)
+        await self.send({"type": "http.response.body", "body": compressed})
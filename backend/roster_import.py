@@ -0,0 +1,178 @@
+"""
+Bulk roster import.
+
+The old path did a SELECT + INSERT + COMMIT per row. Here the whole sheet is
+diffed in memory against the existing students / usernames (two queries) and
+written back with executemany inserts and one bulk UPDATE, in one transaction.
+"""
+import io
+
+import pandas as pd
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+import models, auth, crud, change_feed
+from column_mapping import suggest_mapping, detect_header_row, ROSTER_FIELDS
+from grade_import import frame_with_header
+from profiling import timed
+
+DEFAULT_CLASS = "Default Class"
+DEFAULT_GRADE = "Default Grade"
+DEFAULT_PASSWORD = auth.DEFAULT_PASSWORD
+
+
+def clean_number(val) -> str:
+    """Excel gives numeric IDs back as floats ("1001.0"), strip that."""
+    if val is None or (isinstance(val, float) and pd.isna(val)):
+        return ""
+    s = str(val).strip()
+    if s.endswith('.0'):
+        s = s[:-2]
+    return s
+
+
+def clean_text(val):
+    if val is None or (isinstance(val, float) and pd.isna(val)):
+        return None
+    s = str(val).strip()
+    return s or None
+
+
+def read_roster(contents: bytes) -> list:
+    """
+    Parse a roster sheet into dicts: student_number, name, class_name, grade_name.
+    Fields whose column is missing are None (so updates leave them alone).
+    """
+    with timed("parse"):
+        df_raw = pd.read_excel(io.BytesIO(contents), header=None)
+        df = frame_with_header(df_raw, detect_header_row(df_raw, ROSTER_FIELDS))
+        return frame_to_roster_rows(df, suggest_mapping(df.columns, ROSTER_FIELDS))
+
+
+def frame_to_roster_rows(df, col_map: dict) -> list:
+    def column(key):
+        if key not in col_map:
+            return [None] * len(df)
+        return df[col_map[key]].tolist()
+
+    ids = column("student_id")
+    names = column("name")
+    classes = column("class_name")
+    grades = column("grade_name")
+
+    rows = []
+    for i in range(len(df)):
+        if "student_id" in col_map:
+            s_id = clean_number(ids[i])
+        else:
+            s_id = f"unknown_{i}"
+        rows.append({
+            "student_number": s_id,
+            "name": clean_text(names[i]),
+            "class_name": clean_text(classes[i]),
+            "grade_name": clean_text(grades[i]),
+        })
+    return rows
+
+
+def import_roster(db: Session, rows: list, default_password: str = DEFAULT_PASSWORD, commit: bool = True) -> dict:
+    """
+    Upsert students (and their login accounts) in one transaction.
+    Returns counts: created, updated, unchanged, skipped, users_created.
+    With commit=False the caller commits (or rolls back) the transaction.
+    """
+    # Hold the write lock from the first read, so a parallel roster import can't
+    # insert the same new students between our lookup and our insert
+    crud.begin_write(db)
+    counts = {"created": 0, "updated": 0, "unchanged": 0, "skipped": 0, "users_created": 0}
+
+    # Dedupe inside the sheet, last row wins
+    incoming = {}
+    for r in rows:
+        if not r["student_number"]:
+            counts["skipped"] += 1
+            continue
+        incoming[r["student_number"]] = r
+
+    existing = {
+        s.student_number: s
+        for s in db.query(
+            models.Student.id, models.Student.student_number, models.Student.name,
+            models.Student.class_name, models.Student.grade_name,
+        )
+    }
+    usernames = {u for (u,) in db.query(models.User.username)}
+
+    new_students = []
+    changed = []
+    for number, r in incoming.items():
+        old = existing.get(number)
+        if old is None:
+            new_students.append({
+                "student_number": number,
+                "name": r["name"] or "Unknown",
+                "class_name": r["class_name"] or DEFAULT_CLASS,
+                "grade_name": r["grade_name"] or DEFAULT_GRADE,
+            })
+            continue
+
+        patch = {}
+        for field in ("name", "class_name", "grade_name"):
+            if r[field] is not None and r[field] != getattr(old, field):
+                patch[field] = r[field]
+        if patch:
+            patch["id"] = old.id
+            changed.append(patch)
+        else:
+            counts["unchanged"] += 1
+
+    try:
+        created_ids = {}
+        if new_students:
+            result = db.execute(
+                insert(models.Student).returning(models.Student.id, models.Student.student_number),
+                new_students,
+            )
+            created_ids = {number: sid for sid, number in result}
+            counts["created"] = len(new_students)
+
+        if changed:
+            # Bulk UPDATE by primary key; rows may touch different columns so group by key set
+            groups = {}
+            for patch in changed:
+                groups.setdefault(tuple(sorted(patch)), []).append(patch)
+            for group in groups.values():
+                db.execute(update(models.Student), group)
+            counts["updated"] = len(changed)
+
+        # Dashboards add / patch these students from the change feed
+        feed_rows = [{"id": created_ids[row["student_number"]], **row} for row in new_students] + changed
+        if feed_rows:
+            change_feed.record(db, change_feed.STUDENTS, {"rows": feed_rows})
+
+        new_users = [number for number in created_ids if number not in usernames]
+        if new_users:
+            # Every new account gets the same default password, hash it once
+            hashed_pwd = auth.get_password_hash(default_password)
+            db.execute(insert(models.User), [
+                {
+                    "username": number,
+                    "hashed_password": hashed_pwd,
+                    "role": "student",
+                    "student_id": created_ids[number],
+                    # Kept until first change, so the account shows up in the credentials sheet
+                    "initial_password": default_password,
+                    "is_password_changed": False,
+                }
+                for number in new_users
+            ])
+            counts["users_created"] = len(new_users)
+
+        if commit:
+            db.commit()
+    except Exception:
+        if commit:
+            db.rollback()
+        raise
+
+    return counts
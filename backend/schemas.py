@@ -39,6 +39,16 @@ class PasswordChange(BaseModel):
 class PasswordReset(BaseModel):
     new_password: str
 
+class BulkUserSelection(BaseModel):
+    # At least one filter is required; filters combine with AND
+    class_name: str | None = None
+    grade_name: str | None = None
+    ids: List[int] | None = None # student ids for create, user ids for reset/delete
+
+class BulkPasswordRequest(BulkUserSelection):
+    password: str | None = None # None: the default initial password
+    random_password: bool = False # one random password per account
+
 class Token(BaseModel):
     access_token: str
     token_type: str
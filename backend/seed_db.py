@@ -1,8 +1,8 @@
 from database import SessionLocal, engine, get_db
-import models, auth
+import models, auth, migrations
 
 def seed_db():
-    models.Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine)
     db = SessionLocal()
     
     # Check if student exists
@@ -0,0 +1,320 @@
+"""
+Score standardization and curving over the grade store snapshot.
+
+Subjects differ in difficulty and full marks, so raw totals don't compare
+across courses. Per course, each student is compared with their own grade
+level only:
+    z           (score - mean) / std (population std; 0 when all scores are equal)
+    t           50 + 10 z
+    percentile  share of the grade level scoring lower, ties count half (0-100)
+    rank        1 = best, ties share the better rank
+Curves map raw scores onto a new scale, clipped to [0, full]:
+    linear  score * full / best score of the grade level
+    sqrt    full * sqrt(score / full)
+    shift   score + (target_mean - mean)
+    normal  target_mean + target_std * z
+A composite is the mean of one of these over the courses a student has,
+ranked within the grade level again.
+
+Everything is a vectorized NumPy pass over a whole course column. Results
+are cached by course column version (Snapshot.tokens): a course is
+standardized once after each change to it, and a composite once per
+combination of column versions. Entries of replaced versions are never hit
+again and age out of the LRU (STANDARDIZE_CACHE_SIZE entries).
+"""
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+from grade_store import Snapshot, student_scores, _mask
+
+SCALES = ("raw", "z", "t", "percentile", "curved")
+CURVES = ("linear", "sqrt", "shift", "normal")
+STANDARDIZE_CACHE_SIZE = int(os.environ.get("STANDARDIZE_CACHE_SIZE", 512))
+
+
+@dataclass(frozen=True)
+class Curve:
+    kind: str = "normal"
+    target_mean: float = 75.0
+    target_std: float = 10.0
+    full: float = 100.0
+
+    @classmethod
+    def from_params(cls, kind: str = None, target_mean: float = None, target_std: float = None, full: float = None):
+        """Curve from query parameters, defaults for the ones left out. Raises ValueError."""
+        curve = cls(
+            kind or cls.kind,
+            cls.target_mean if target_mean is None else float(target_mean),
+            cls.target_std if target_std is None else float(target_std),
+            cls.full if full is None else float(full),
+        )
+        if curve.kind not in CURVES:
+            raise ValueError(f"curve must be one of {', '.join(CURVES)}")
+        if curve.full <= 0 or curve.target_std < 0:
+            raise ValueError("full must be positive and target_std not negative")
+        return curve
+
+
+@dataclass(frozen=True)
+class CourseStandard:
+    """Standard scores of one course column; arrays are per student row, NaN / 0 = no grade."""
+    z: np.ndarray          # float64 [n]
+    percentile: np.ndarray  # float64 [n]
+    rank: np.ndarray       # int32 [n]
+    count: np.ndarray      # int64 [grade levels]
+    mean: np.ndarray       # float64 [grade levels]
+    std: np.ndarray        # float64 [grade levels]
+    top: np.ndarray        # float64 [grade levels], best score
+
+    @property
+    def t(self) -> np.ndarray:
+        return 50.0 + 10.0 * self.z
+
+
+class _LRU:
+    def __init__(self, size: int):
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.stats["hits"] += 1
+                return self._data[key]
+            self.stats["misses"] += 1
+        # Outside the lock: two threads may compute the same entry, both results are equal
+        value = compute()
+        with self._lock:
+            self._data[key] = value
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+        return value
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {"entries": len(self._data), **self.stats,
+                    "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0}
+
+
+cache = _LRU(STANDARDIZE_CACHE_SIZE)
+
+
+def _group_ranks(values: np.ndarray, groups: np.ndarray, n_groups: int):
+    """
+    Percentile rank and rank of each value within its group, in one sort.
+    Returns (present, count, percentile, rank); rows without a value get NaN / 0.
+    """
+    present = ~np.isnan(values)
+    g = groups[present].astype(np.int64)
+    x = values[present]
+    count = np.bincount(g, minlength=n_groups)
+    percentile = np.full(values.shape, np.nan)
+    rank = np.zeros(values.shape, dtype=np.int32)
+    if x.size == 0:
+        return present, count, percentile, rank
+
+    # One sorted key for all groups: group * span + value keeps groups apart
+    lo = x.min()
+    span = float(x.max() - lo) + 1.0
+    keys = g * span + (x - lo)
+    sorted_keys = np.sort(keys)
+    start = np.concatenate(([0], np.cumsum(count)[:-1]))[g]
+    below = np.searchsorted(sorted_keys, keys, side="left") - start
+    not_above = np.searchsorted(sorted_keys, keys, side="right") - start
+    n = count[g]
+    percentile[present] = (below + 0.5 * (not_above - below)) / n * 100.0
+    rank[present] = n - not_above + 1
+    return present, count, percentile, rank
+
+
+def _standardize(values: np.ndarray, groups: np.ndarray, n_groups: int) -> CourseStandard:
+    present, count, percentile, rank = _group_ranks(values, groups, n_groups)
+    g = groups[present]
+    x = values[present]
+    safe = np.maximum(count, 1)
+    mean = np.bincount(g, weights=x, minlength=n_groups) / safe
+    var = np.bincount(g, weights=(x - mean[g]) ** 2, minlength=n_groups) / safe
+    std = np.sqrt(var)
+    top = np.full(n_groups, np.nan)
+    if x.size:
+        np.fmax.at(top, g, x)
+
+    z = np.full(values.shape, np.nan)
+    dev = std[g]
+    z[present] = np.where(dev > 0, (x - mean[g]) / np.where(dev > 0, dev, 1.0), 0.0)
+    mean[count == 0] = np.nan
+    std[count == 0] = np.nan
+    return CourseStandard(z=z, percentile=percentile, rank=rank, count=count, mean=mean, std=std, top=top)
+
+
+def course_standard(snap: Snapshot, course: str) -> CourseStandard:
+    """Standard scores of a course over every grade level, cached per column version."""
+    if course not in snap.tokens:
+        raise KeyError(course)
+    key = ("course", course, snap.tokens[course])
+    return cache.get_or_compute(key, lambda: _standardize(
+        student_scores(snap, course), snap.grade_code, len(snap.grade_names)))
+
+
+def curved(snap: Snapshot, course: str, curve: Curve) -> np.ndarray:
+    std = course_standard(snap, course)
+    raw = student_scores(snap, course)
+    g = snap.grade_code
+    if curve.kind == "linear":
+        top = std.top[g]
+        out = np.where(top > 0, raw * curve.full / np.where(top > 0, top, 1.0), raw)
+    elif curve.kind == "sqrt":
+        out = curve.full * np.sqrt(np.clip(raw, 0, curve.full) / curve.full)
+    elif curve.kind == "shift":
+        out = raw + (curve.target_mean - std.mean[g])
+    else:
+        out = curve.target_mean + curve.target_std * std.z
+    return np.clip(out, 0, curve.full)
+
+
+def course_scores(snap: Snapshot, course: str, scale: str, curve: Curve = None) -> np.ndarray:
+    """One course on one scale, float64 per student row."""
+    if scale == "raw":
+        return student_scores(snap, course)
+    if scale == "curved":
+        return curved(snap, course, curve or Curve())
+    std = course_standard(snap, course)
+    return {"z": std.z, "t": std.t, "percentile": std.percentile}[scale]
+
+
+def composite(snap: Snapshot, courses: list, scale: str = "t", curve: Curve = None):
+    """
+    Mean score on `scale` over `courses`, per student, plus the number of those
+    courses they have and their rank in the grade level. Cached per column versions.
+    Returns (values, n_courses, rank).
+    """
+    courses = [c for c in courses if c in snap.tokens]
+    curve = curve or Curve() if scale == "curved" else None
+    key = ("composite", scale, curve, tuple((c, snap.tokens[c]) for c in courses))
+
+    def compute():
+        n = snap.n_students
+        if not courses:
+            return np.full(n, np.nan), np.zeros(n, dtype=np.int32), np.zeros(n, dtype=np.int32)
+        block = np.column_stack([course_scores(snap, c, scale, curve) for c in courses])
+        have = np.sum(~np.isnan(block), axis=1).astype(np.int32)
+        values = np.full(n, np.nan)
+        values[have > 0] = np.nansum(block[have > 0], axis=1) / have[have > 0]
+        _, _, _, rank = _group_ranks(values, snap.grade_code, len(snap.grade_names))
+        return values, have, rank
+
+    return cache.get_or_compute(key, compute)
+
+
+def visible_courses(snap: Snapshot) -> list:
+    return [c for c, v in zip(snap.courses, snap.visible) if v]
+
+
+def scaled(snap: Snapshot, course: str, scale: str, curve: Curve = None) -> np.ndarray:
+    """Scores on `scale` for the stats endpoints: one course, or the composite over the visible courses for "All"."""
+    if course == "All":
+        return composite(snap, visible_courses(snap), scale, curve)[0]
+    if course not in snap.tokens:
+        return np.full(snap.n_students, np.nan)
+    return course_scores(snap, course, scale, curve)
+
+
+def _round(a: np.ndarray, digits: int = 2) -> list:
+    return [None if v != v else round(float(v), digits) for v in a]
+
+
+def _ordered(snap: Snapshot, rows: np.ndarray, rank: np.ndarray) -> np.ndarray:
+    """Rows by grade level, then rank."""
+    return rows[np.lexsort((rank[rows], snap.grade_code[rows]))]
+
+
+def course_table(snap: Snapshot, course: str, grade_name: str = None, class_names: list = None,
+                 curve: Curve = None, offset: int = 0, limit: int = 100) -> dict:
+    """Standard scores of one course for the selected students, best first within each grade level."""
+    std = course_standard(snap, course)
+    raw = student_scores(snap, course)
+    curve = curve or Curve()
+    curved_scores = curved(snap, course, curve)
+    rows = np.flatnonzero(_mask(snap, grade_name, class_names) & ~np.isnan(raw))
+    page = _ordered(snap, rows, std.rank)[offset:offset + limit]
+    groups = [
+        {"grade_name": snap.grade_names[k], "count": int(std.count[k]), "mean": round(float(std.mean[k]), 2),
+         "std": round(float(std.std[k]), 2), "top": float(std.top[k])}
+        for k in np.flatnonzero(std.count)
+    ]
+    return {
+        "course": course,
+        "curve": curve.__dict__,
+        "total": int(rows.size),
+        "groups": groups,
+        "rows": [
+            {"student_id": int(snap.student_ids[r]), "grade_name": snap.grade_names[snap.grade_code[r]],
+             "class_name": snap.class_names[snap.class_code[r]], "score": s, "z": z, "t": t,
+             "percentile": p, "rank": int(std.rank[r]), "curved": c}
+            for r, s, z, t, p, c in zip(page, _round(raw[page]), _round(std.z[page], 3), _round(std.t[page]),
+                                        _round(std.percentile[page], 1), _round(curved_scores[page]))
+        ],
+    }
+
+
+def composite_table(snap: Snapshot, courses: list = None, scale: str = "t", curve: Curve = None,
+                    grade_name: str = None, class_names: list = None, offset: int = 0, limit: int = 100) -> dict:
+    """Cross-subject ranking: composite per student, best first within each grade level."""
+    courses = [c for c in (courses or visible_courses(snap)) if c in snap.tokens]
+    values, have, rank = composite(snap, courses, scale, curve)
+    rows = np.flatnonzero(_mask(snap, grade_name, class_names) & (have > 0))
+    page = _ordered(snap, rows, rank)[offset:offset + limit]
+    return {
+        "courses": courses,
+        "scale": scale,
+        "total": int(rows.size),
+        "rows": [
+            {"student_id": int(snap.student_ids[r]), "grade_name": snap.grade_names[snap.grade_code[r]],
+             "class_name": snap.class_names[snap.class_code[r]], "composite": v,
+             "courses": int(have[r]), "rank": int(rank[r])}
+            for r, v in zip(page, _round(values[page], 3))
+        ],
+    }
+
+
+def standardized_workbook(snap: Snapshot, students: dict, courses: list = None, scale: str = "t",
+                          curve: Curve = None, grade_name: str = None, class_names: list = None):
+    """
+    xlsx, one row per student: raw / T / percentile per course, then the
+    composite on `scale` and its rank. students: id -> (student number, name).
+    """
+    import io
+    from openpyxl import Workbook
+
+    courses = [c for c in (courses or visible_courses(snap)) if c in snap.tokens]
+    values, have, rank = composite(snap, courses, scale, curve)
+    rows = _ordered(snap, np.flatnonzero(_mask(snap, grade_name, class_names) & (have > 0)), rank)
+    columns = [(student_scores(snap, c), course_standard(snap, c)) for c in courses]
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Standardized")
+    header = ["学号", "姓名", "年级", "班级"]
+    for c in courses:
+        header += [c, f"{c} T", f"{c} %"]
+    ws.append(header + [f"Composite ({scale})", "Rank"])
+    for r in rows:
+        number, name = students.get(int(snap.student_ids[r]), ("", ""))
+        line = [number, name, snap.grade_names[snap.grade_code[r]], snap.class_names[snap.class_code[r]]]
+        for raw, std in columns:
+            if raw[r] != raw[r]:
+                line += [None, None, None]
+            else:
+                line += [float(raw[r]), round(float(std.t[r]), 1), round(float(std.percentile[r]), 1)]
+        ws.append(line + [round(float(values[r]), 2), int(rank[r])])
+    output = io.BytesIO()
+    wb.save(output)
+    output.seek(0)
+    return output
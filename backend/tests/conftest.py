@@ -0,0 +1,32 @@
+"""
+Tests run against a throwaway SQLite file: DATABASE_URL is read when
+database.py is imported, so it is set here before any backend module loads.
+
+Run from backend/:
+    python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="smartgrade-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ["BACKUP_DIR"] = os.path.join(_tmp, "backups")
+os.environ["UPLOAD_DIR"] = os.path.join(_tmp, "uploads")
+os.environ["REPORT_CACHE_DIR"] = os.path.join(_tmp, "report_cache")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture
+def db():
+    import migrations
+    from database import SessionLocal
+
+    migrations.upgrade(verbose=False)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
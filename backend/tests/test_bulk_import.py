@@ -0,0 +1,47 @@
+import pandas as pd
+
+import bulk_import, models, roster_import
+
+
+def _roster(db):
+    rows = [{"student_number": f"B{i:03d}", "name": f"Bulk {i}", "class_name": "Class 1", "grade_name": "Grade 10"}
+            for i in range(1, 4)]
+    roster_import.import_roster(db, rows)
+
+
+def _grades(db, course_name):
+    course = db.query(models.Course).filter(models.Course.name == course_name).one()
+    return {g.student.student_number: g for g in db.query(models.Grade).filter(models.Grade.course_id == course.id)}
+
+
+def test_items_without_total_are_imported(db, tmp_path):
+    _roster(db)
+    path = tmp_path / "Physics_scores.xlsx"
+    pd.DataFrame({
+        "学号": ["B001", "B002", "B003"],
+        "姓名": ["Bulk 1", "Bulk 2", "Bulk 3"],
+        "Module 1": [40, 35, 28],
+        "Module 2": [45, 30, 33],
+    }).to_excel(path, index=False)
+
+    totals = bulk_import.run([str(path)], workers=1, snapshot=False)
+
+    assert totals["failed"] == 0
+    assert totals["written"] == 3
+    grades = _grades(db, "Physics")
+    assert set(grades) == {"B001", "B002", "B003"}
+    assert grades["B002"].sub_scores == {"Module 1": 35, "Module 2": 30}
+
+
+def test_course_names_match_exactly(db, tmp_path):
+    _roster(db)
+    db.add(models.Course(name="History"))
+    db.commit()
+    path = tmp_path / "history_scores.xlsx"
+    pd.DataFrame({"学号": ["B001"], "姓名": ["Bulk 1"], "总分": [88]}).to_excel(path, index=False)
+
+    bulk_import.run([str(path)], workers=1, snapshot=False)
+
+    # Same rule as /api/upload/grades: "history" is not "History"
+    assert _grades(db, "history")["B001"].total_score == 88
+    assert _grades(db, "History") == {}
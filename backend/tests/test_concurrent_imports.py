@@ -0,0 +1,154 @@
+import threading
+import uuid
+
+import pandas as pd
+import pytest
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+import crud, grade_import, idempotency, models, roster_import
+from database import SessionLocal
+
+STUDENTS = 40
+IMPORTERS = 6
+MAPPING = {"student_id": "学号", "name": "姓名", "total_score": "总分"}
+
+
+def parallel(n: int, target):
+    """Run target(i) in n threads at once; returns the exceptions they raised."""
+    errors = []
+    start = threading.Barrier(n)
+
+    def run(i):
+        start.wait()
+        try:
+            target(i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return errors
+
+
+def _frame(offset: int):
+    return pd.DataFrame({
+        "学号": [f"C{i:03d}" for i in range(STUDENTS)],
+        "姓名": [f"Concurrent {i}" for i in range(STUDENTS)],
+        "总分": [float((i * 7 + offset) % 100) for i in range(STUDENTS)],
+    })
+
+
+@pytest.fixture
+def roster(db):
+    roster_import.import_roster(db, [
+        {"student_number": f"C{i:03d}", "name": f"Concurrent {i}", "class_name": "Class 2", "grade_name": "Grade 11"}
+        for i in range(STUDENTS)
+    ])
+    return db
+
+
+def _assert_one_grade_per_student(db, course_names):
+    dupes = (db.query(models.Grade.student_id, models.Grade.course_id)
+             .group_by(models.Grade.student_id, models.Grade.course_id)
+             .having(func.count() > 1).count())
+    assert dupes == 0
+    for name in course_names:
+        courses = db.query(models.Course).filter(models.Course.name == name).all()
+        assert len(courses) == 1, name
+        assert db.query(models.Grade).filter(models.Grade.course_id == courses[0].id).count() == STUDENTS
+
+
+def test_parallel_grade_imports(roster):
+    run = uuid.uuid4().hex[:6]
+    shared = f"Shared {run}"
+
+    def importer(i):
+        db = SessionLocal()
+        try:
+            # Same course from every thread, then a course only this one creates
+            result = grade_import.import_grade_frame(db, _frame(i), shared, MAPPING)
+            assert result["matched"] == STUDENTS
+            grade_import.import_grade_frame(db, _frame(i), f"New {run} {i}", MAPPING)
+        finally:
+            db.close()
+
+    errors = parallel(IMPORTERS, importer)
+
+    assert not [e for e in errors if isinstance(e, (IntegrityError, OperationalError))], errors
+    assert not errors, errors
+    roster.expire_all()
+    _assert_one_grade_per_student(roster, [shared] + [f"New {run} {i}" for i in range(IMPORTERS)])
+
+
+def test_parallel_upserts_and_roster_reimport(roster):
+    run = uuid.uuid4().hex[:6]
+    shared = f"Upsert {run}"
+    student_ids = [s.id for s in roster.query(models.Student).filter(models.Student.student_number.like("C%"))]
+
+    def writer(i):
+        db = SessionLocal()
+        try:
+            if i % 3 == 2:
+                # Roster re-upload of the same students while grades are written
+                roster_import.import_roster(db, [
+                    {"student_number": f"C{n:03d}", "name": f"Concurrent {n}", "class_name": "Class 2", "grade_name": "Grade 11"}
+                    for n in range(STUDENTS)
+                ])
+                return
+            crud.begin_write(db)
+            course = crud.get_or_create_course(db, shared, commit=False)
+            crud.upsert_grades(db, course.id, {sid: (float(i), {}) for sid in student_ids})
+        finally:
+            db.close()
+
+    errors = parallel(IMPORTERS, writer)
+
+    assert not errors, errors
+    roster.expire_all()
+    _assert_one_grade_per_student(roster, [shared])
+    assert roster.query(models.Student).filter(models.Student.student_number.like("C%")).count() == STUDENTS
+
+
+def test_idempotency_claim_outcomes(db):
+    key = f"key-{uuid.uuid4().hex}"
+    req_hash = idempotency.request_hash(b"file bytes", "Math")
+
+    assert idempotency.claim(key, "grades", req_hash) == (idempotency.NEW, None)
+    # A retry while the first request is still importing (409)
+    assert idempotency.claim(key, "grades", req_hash) == (idempotency.IN_PROGRESS, None)
+    # Same key, different file or endpoint (422)
+    other = idempotency.request_hash(b"other bytes", "Math")
+    assert idempotency.claim(key, "grades", other) == (idempotency.MISMATCH, None)
+    assert idempotency.claim(key, "roster", req_hash) == (idempotency.MISMATCH, None)
+
+    response = {"matched": 3, "course_name": "Math"}
+    idempotency.complete(db, key, response)
+    db.commit()
+    # A retry after the import gets the stored response back
+    assert idempotency.claim(key, "grades", req_hash) == (idempotency.REPLAY, response)
+    assert idempotency.claim(key, "grades", other) == (idempotency.MISMATCH, None)
+
+
+def test_idempotency_key_claimed_once(db):
+    key = f"key-{uuid.uuid4().hex}"
+    req_hash = idempotency.request_hash(b"same upload")
+    states = []
+
+    errors = parallel(IMPORTERS, lambda i: states.append(idempotency.claim(key, "grades", req_hash)[0]))
+
+    assert not errors, errors
+    assert states.count(idempotency.NEW) == 1
+    assert states.count(idempotency.IN_PROGRESS) == IMPORTERS - 1
+
+
+def test_released_key_can_be_retried(db):
+    key = f"key-{uuid.uuid4().hex}"
+    req_hash = idempotency.request_hash(b"failed upload")
+
+    assert idempotency.claim(key, "grades", req_hash)[0] == idempotency.NEW
+    idempotency.release(key)
+    assert idempotency.claim(key, "grades", req_hash)[0] == idempotency.NEW
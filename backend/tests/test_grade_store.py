@@ -0,0 +1,29 @@
+import numpy as np
+
+import grade_store
+
+
+def _snapshot(scores):
+    n = len(scores)
+    return grade_store.Snapshot(
+        student_ids=np.arange(1, n + 1), row_of={i + 1: i for i in range(n)},
+        class_code=np.zeros(n, dtype=np.int32), class_names=["Class 1"],
+        grade_code=np.zeros(n, dtype=np.int32), grade_names=["Grade 10"],
+        courses=["Math"], visible=np.ones(1, dtype=bool),
+        scores=np.array(scores, dtype=np.float32).reshape(n, 1), tokens={"Math": 1},
+    )
+
+
+def test_summary_raw_has_bands():
+    result = grade_store.summary(_snapshot([95, 80, 65, 50]), "Math")
+    assert result["counts"] == {"excellent": 1, "good": 1, "standard": 1, "pass": 3, "fail": 1}
+    assert result["segments"]["s95"] == 1
+
+
+def test_summary_z_has_no_mark_bands():
+    result = grade_store.summary(_snapshot([95, 80, 65, 50]), "Math", scale="z")
+    assert result["scale"] == "z"
+    assert abs(result["avg"]) < 1e-9
+    assert abs(result["std"] - 1) < 1e-9
+    # 85 / 75 / 60 are marks, not standard deviations
+    assert "rates" not in result and "counts" not in result and "segments" not in result
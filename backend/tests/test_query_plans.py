@@ -0,0 +1,11 @@
+import pytest
+
+import migrations
+
+
+@pytest.mark.parametrize("name", [q[0] for q in migrations.HOT_QUERIES])
+def test_hot_query_uses_index(name):
+    migrations.upgrade(verbose=False)
+    plans = {n: (ok, plan) for n, ok, plan in migrations.check_query_plans()}
+    ok, plan = plans[name]
+    assert ok, "\n".join(plan)
@@ -0,0 +1,183 @@
+"""
+Temp storage for uploaded sheets between preview and confirm.
+
+- Files are keyed by the SHA-256 of their bytes, so re-uploading the same file
+  (by anyone) reuses the stored copy and its parsed DataFrame.
+- Files expire TTL seconds after their last use; when the directory grows over
+  max_bytes the least recently used files go first. A background thread sweeps.
+- Parsed sheets are kept in a small in-process LRU next to the files.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR", "temp")
+UPLOAD_TTL_SECONDS = int(os.environ.get("UPLOAD_TTL_SECONDS", 2 * 3600))
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", 500 * 1024 * 1024))
+UPLOAD_MAX_PARSED = int(os.environ.get("UPLOAD_MAX_PARSED", 32))
+SWEEP_INTERVAL_SECONDS = 300
+
+_key_re = re.compile(r"^[0-9a-f]{32}\.[a-z0-9]{1,8}$")
+
+
+class UploadStore:
+    def __init__(self, root: str = UPLOAD_DIR, ttl_seconds: int = UPLOAD_TTL_SECONDS,
+                 max_bytes: int = UPLOAD_MAX_BYTES, max_parsed: int = UPLOAD_MAX_PARSED):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.max_parsed = max_parsed
+        self._parsed = OrderedDict()  # key -> parse result
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self.stats = {
+            "upload_hits": 0, "upload_misses": 0,
+            "parse_hits": 0, "parse_misses": 0,
+            "evicted_files": 0,
+        }
+
+    @staticmethod
+    def make_key(contents: bytes, filename: str) -> str:
+        ext = re.sub(r"[^a-z0-9]", "", (filename or "").rsplit(".", 1)[-1].lower())[:8] or "xlsx"
+        return f"{hashlib.sha256(contents).hexdigest()[:32]}.{ext}"
+
+    def _path(self, key: str) -> str:
+        # Keys come back from clients, never let them point outside the store
+        if not _key_re.match(key or ""):
+            raise ValueError("Invalid file key")
+        return os.path.join(self.root, key)
+
+    def put(self, contents: bytes, filename: str):
+        """Store an upload. Returns (key, hit) where hit means the same bytes were already stored."""
+        key = self.make_key(contents, filename)
+        path = self._path(key)
+        os.makedirs(self.root, exist_ok=True)
+        with self._lock:
+            if os.path.exists(path):
+                os.utime(path)
+                self.stats["upload_hits"] += 1
+                return key, True
+            self.stats["upload_misses"] += 1
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        with open(tmp, "wb") as f:
+            f.write(contents)
+        os.replace(tmp, path)
+        return key, False
+
+    def path(self, key: str):
+        """Path of a stored upload (refreshing its TTL), or None if missing / expired."""
+        try:
+            path = self._path(key)
+        except ValueError:
+            return None
+        if not os.path.exists(path):
+            return None
+        if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+            self.remove(key)
+            return None
+        os.utime(path)
+        return path
+
+    def get_parsed(self, key: str, parse):
+        """parse(path) once per stored file, later calls get the cached result."""
+        with self._lock:
+            if key in self._parsed:
+                self._parsed.move_to_end(key)
+                self.stats["parse_hits"] += 1
+                return self._parsed[key]
+        path = self.path(key)
+        if path is None:
+            raise FileNotFoundError(key)
+        result = parse(path)
+        with self._lock:
+            self.stats["parse_misses"] += 1
+            self._parsed[key] = result
+            while len(self._parsed) > self.max_parsed:
+                self._parsed.popitem(last=False)
+        return result
+
+    def remove(self, key: str):
+        with self._lock:
+            self._parsed.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except (OSError, ValueError):
+            pass
+
+    def _files(self):
+        if not os.path.isdir(self.root):
+            return []
+        files = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if os.path.isfile(path):
+                files.append((st.st_mtime, st.st_size, name))
+        return files
+
+    def sweep(self) -> int:
+        """Drop expired files, then least recently used ones until under max_bytes."""
+        now = time.time()
+        evicted = 0
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        for mtime, size, name in files:
+            expired = now - mtime > self.ttl_seconds
+            if not expired and total <= self.max_bytes:
+                continue
+            if not _key_re.match(name):
+                # Leftover .part file from a crashed write; fresh ones are still being written
+                if expired:
+                    try:
+                        os.remove(os.path.join(self.root, name))
+                    except OSError:
+                        pass
+                continue
+            self.remove(name)
+            total -= size
+            evicted += 1
+        with self._lock:
+            self.stats["evicted_files"] += evicted
+        return evicted
+
+    def start_sweeper(self, interval: int = SWEEP_INTERVAL_SECONDS):
+        if self._sweeper is not None:
+            return
+
+        def loop():
+            while True:
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"Upload store sweep failed: {e}")
+                time.sleep(interval)
+
+        self._sweeper = threading.Thread(target=loop, name="upload-store-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def metrics(self) -> dict:
+        files = self._files()
+        with self._lock:
+            stats = dict(self.stats)
+            parsed = len(self._parsed)
+        uploads = stats["upload_hits"] + stats["upload_misses"]
+        parses = stats["parse_hits"] + stats["parse_misses"]
+        return {
+            "files": len(files),
+            "bytes": sum(size for _, size, _ in files),
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "parsed_cached": parsed,
+            **stats,
+            "upload_hit_rate": round(stats["upload_hits"] / uploads, 3) if uploads else 0.0,
+            "parse_hit_rate": round(stats["parse_hits"] / parses, 3) if parses else 0.0,
+        }
+
+
+store = UploadStore()
@@ -0,0 +1,154 @@
+"""
+Bulk account administration: create, reset and delete users for a whole
+class, grade or list of ids.
+
+Passwords are hashed in parallel (auth.hash_passwords) and each operation
+writes in a single transaction, so a class of 50 is one request and one
+commit instead of 50 of each. The affected accounts can be returned as a
+credentials sheet built with openpyxl's write-only (streaming) workbook.
+"""
+import io
+from typing import List, Optional
+
+from sqlalchemy import delete, insert, update
+from sqlalchemy.orm import Session, selectinload
+
+import models, auth
+
+CREDENTIALS_HEADERS = ["用户名", "姓名", "班级", "年级", "初始密码"]
+
+
+def select_students(db: Session, class_name: str = None, grade_name: str = None,
+                    student_ids: Optional[List[int]] = None) -> list:
+    query = db.query(models.Student)
+    if class_name:
+        query = query.filter(models.Student.class_name == class_name)
+    if grade_name:
+        query = query.filter(models.Student.grade_name == grade_name)
+    if student_ids is not None:
+        query = query.filter(models.Student.id.in_(student_ids))
+    return query.order_by(models.Student.class_name, models.Student.student_number).all()
+
+
+def select_users(db: Session, class_name: str = None, grade_name: str = None,
+                 user_ids: Optional[List[int]] = None) -> list:
+    """Student accounts matching the filters; admin accounts are never selected."""
+    query = db.query(models.User).options(selectinload(models.User.student)).filter(models.User.role != "admin")
+    if class_name or grade_name:
+        query = query.join(models.Student, models.User.student_id == models.Student.id)
+        if class_name:
+            query = query.filter(models.Student.class_name == class_name)
+        if grade_name:
+            query = query.filter(models.Student.grade_name == grade_name)
+    if user_ids is not None:
+        query = query.filter(models.User.id.in_(user_ids))
+    return query.order_by(models.User.username).all()
+
+
+def _passwords(n: int, password: str = None, random_password: bool = False) -> list:
+    if random_password:
+        return [auth.generate_password() for _ in range(n)]
+    return [password or auth.DEFAULT_PASSWORD] * n
+
+
+def _credential(user_name: str, student, password: str) -> dict:
+    return {
+        "username": user_name,
+        "name": student.name if student else "",
+        "class_name": student.class_name if student else "",
+        "grade_name": student.grade_name if student else "",
+        "password": password,
+    }
+
+
+def bulk_create_users(db: Session, students: list, password: str = None, random_password: bool = False) -> dict:
+    """
+    Create a student account (username = student number) for every student that has none.
+    Returns {"created", "skipped", "credentials"}.
+    """
+    numbers = [s.student_number for s in students]
+    taken = set()
+    for i in range(0, len(numbers), 500):
+        chunk = numbers[i:i + 500]
+        taken.update(u for (u,) in db.query(models.User.username).filter(models.User.username.in_(chunk)))
+    todo = [s for s in students if s.student_number not in taken]
+
+    passwords = _passwords(len(todo), password, random_password)
+    hashes = auth.hash_passwords(passwords)
+    rows = [
+        {
+            "username": s.student_number,
+            "hashed_password": h,
+            "role": "student",
+            "student_id": s.id,
+            "initial_password": p,
+            "is_password_changed": False,
+        }
+        for s, p, h in zip(todo, passwords, hashes)
+    ]
+    try:
+        if rows:
+            db.execute(insert(models.User), rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return {
+        "created": len(rows),
+        "skipped": len(students) - len(rows),
+        "credentials": [_credential(s.student_number, s, p) for s, p in zip(todo, passwords)],
+    }
+
+
+def bulk_reset_passwords(db: Session, users: list, password: str = None, random_password: bool = False) -> dict:
+    """Set a new initial password on every user. Returns {"reset", "credentials"}."""
+    passwords = _passwords(len(users), password, random_password)
+    hashes = auth.hash_passwords(passwords)
+    credentials = [_credential(u.username, u.student, p) for u, p in zip(users, passwords)]
+    try:
+        if users:
+            db.execute(update(models.User), [
+                {"id": u.id, "hashed_password": h, "initial_password": p, "is_password_changed": False}
+                for u, p, h in zip(users, passwords, hashes)
+            ])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return {"reset": len(users), "credentials": credentials}
+
+
+def bulk_delete_users(db: Session, users: list) -> dict:
+    ids = [u.id for u in users]
+    try:
+        for i in range(0, len(ids), 500):
+            db.execute(delete(models.User).where(models.User.id.in_(ids[i:i + 500])))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return {"deleted": len(ids)}
+
+
+def stored_credentials(users: list) -> list:
+    """Credentials of accounts whose initial password is still in use."""
+    return [
+        _credential(u.username, u.student, u.initial_password)
+        for u in users
+        if not u.is_password_changed and u.initial_password
+    ]
+
+
+def credentials_workbook(credentials: list) -> io.BytesIO:
+    """xlsx with one row per account. Write-only mode: rows go straight to the zip stream."""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Credentials")
+    ws.append(CREDENTIALS_HEADERS)
+    for c in credentials:
+        ws.append([c["username"], c["name"], c["class_name"], c["grade_name"], c["password"]])
+    output = io.BytesIO()
+    wb.save(output)
+    output.seek(0)
+    return output
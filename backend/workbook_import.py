@@ -0,0 +1,185 @@
+"""
+Multi-sheet / multi-course workbook import.
+
+Exam offices send either one sheet per subject, or one sheet with all
+subjects side by side. Both are parsed in one read of the workbook, split
+into (course, frame, mapping) pieces and imported in a single transaction.
+
+Side-by-side subjects are recognised in two forms:
+- a subject row above the header (usually merged cells):
+      |      |      | 数学 |      | 英语 |      |
+      | 学号 | 姓名 | 总分 | 代数 | 总分 | 听力 |
+- "Course-Item" headers: 数学-总分, 数学-代数, English:Total, English:Listening
+"""
+import io
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from column_mapping import detect_header_row, suggest_mapping, is_unnamed, GRADE_FIELDS
+from grade_import import frame_with_header, import_grade_frame
+from matching import StudentMatcher
+from profiling import timed
+
+MODE_AUTO = "auto"      # detect per sheet
+MODE_SHEETS = "sheets"  # one course per sheet
+MODE_WIDE = "wide"      # courses side by side in each sheet
+
+KEY_FIELDS = ("student_id", "name", "class_name")
+GROUP_SEPARATOR = re.compile(r"\s*[-:：_/|]\s*")
+TOTAL_FIELDS = {"total_score": GRADE_FIELDS["total_score"]}
+
+
+@dataclass
+class SheetPlan:
+    sheet: str
+    layout: str = "single"   # "single", "wide" or "skipped"
+    header_row: int = 0
+    frames: list = field(default_factory=list)  # [(course_name, df, mapping)]
+    error: Optional[str] = None
+
+
+def _label(value) -> str:
+    if value is None or value != value:
+        return ""
+    return str(value).strip()
+
+
+def column_groups(df_raw, header_idx: int, columns, key_cols) -> dict:
+    """{course_label: [(column, item_name), ...]} when a sheet holds several courses, else {}."""
+    raw_header = [_label(v) for v in df_raw.iloc[header_idx].tolist()]
+    candidates = [(i, col) for i, col in enumerate(columns) if col not in key_cols and not is_unnamed(col)]
+    if not candidates:
+        return {}
+
+    # 1. Subject row above the header, merged cells leave blanks so fill right
+    if header_idx > 0:
+        above = df_raw.iloc[header_idx - 1].ffill().tolist()
+        groups = {}
+        for i, col in candidates:
+            label = _label(above[i])
+            if not label:
+                groups = {}
+                break
+            groups.setdefault(label, []).append((col, raw_header[i]))
+        if len(groups) >= 2:
+            return groups
+
+    # 2. "Course-Item" headers, every score column must have the prefix
+    groups = {}
+    for i, col in candidates:
+        parts = GROUP_SEPARATOR.split(raw_header[i], maxsplit=1)
+        if len(parts) != 2 or not parts[0] or not parts[1]:
+            return {}
+        groups.setdefault(parts[0], []).append((col, parts[1]))
+    return groups if len(groups) >= 2 else {}
+
+
+def plan_sheet(sheet_name: str, df_raw, mode: str = MODE_AUTO, course_map: dict = None) -> SheetPlan:
+    """Split one raw sheet into (course, frame, mapping) pieces."""
+    course_map = course_map or {}
+    plan = SheetPlan(sheet=sheet_name)
+
+    if df_raw.dropna(how="all").empty:
+        plan.layout = "skipped"
+        plan.error = "Empty sheet"
+        return plan
+
+    header_idx = detect_header_row(df_raw, GRADE_FIELDS)
+    df = frame_with_header(df_raw, header_idx)
+    key_map = suggest_mapping(df.columns, GRADE_FIELDS)
+    plan.header_row = header_idx
+
+    if not key_map.get("student_id") and not key_map.get("name"):
+        plan.layout = "skipped"
+        plan.error = "Could not find '学号' or '姓名' columns"
+        return plan
+
+    key_mapping = {f: key_map[f] for f in KEY_FIELDS if f in key_map}
+    key_cols = list(key_mapping.values())
+
+    groups = {} if mode == MODE_SHEETS else column_groups(df_raw, header_idx, list(df.columns), key_cols)
+    if mode == MODE_WIDE and not groups:
+        plan.layout = "skipped"
+        plan.error = "No course column groups found"
+        return plan
+
+    if not groups:
+        course_name = course_map.get(sheet_name, sheet_name)
+        if not course_name:
+            plan.layout = "skipped"
+            plan.error = "Excluded by course mapping"
+            return plan
+        plan.frames.append((course_name, df, key_map))
+        return plan
+
+    plan.layout = "wide"
+    for label, items in groups.items():
+        course_name = course_map.get(label, label)
+        if not course_name:
+            continue
+        item_cols = [col for col, _ in items]
+        names = []
+        for col, item in items:
+            # Keep item names unique inside the group
+            names.append(item if item not in names else col)
+        sub = df[key_cols + item_cols].copy()
+        sub.columns = key_cols + names
+        # A blank block means the student did not take this course
+        sub = sub.dropna(how="all", subset=names)
+
+        mapping = dict(key_mapping)
+        total = suggest_mapping(names, TOTAL_FIELDS).get("total_score")
+        if total:
+            mapping["total_score"] = total
+        plan.frames.append((course_name, sub, mapping))
+    return plan
+
+
+def parse_workbook(source, mode: str = MODE_AUTO, course_map: dict = None) -> List[SheetPlan]:
+    """Read every sheet once and plan the import."""
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    with timed("parse"):
+        sheets = pd.read_excel(source, sheet_name=None, header=None)
+        return [plan_sheet(str(name), df_raw, mode, course_map) for name, df_raw in sheets.items()]
+
+
+def import_workbook(db: Session, plans: List[SheetPlan], matcher: StudentMatcher = None, commit: bool = True) -> dict:
+    """
+    Import every planned (course, frame) in one transaction.
+    If any sheet fails everything is rolled back and status is "rolled_back".
+    With commit=False a successful import is left for the caller to commit.
+    """
+    if matcher is None:
+        matcher = StudentMatcher.from_db(db)
+
+    report = {"status": "committed", "matched": 0, "courses": [], "sheets": []}
+    try:
+        for plan in plans:
+            entry = {
+                "sheet": plan.sheet,
+                "layout": plan.layout,
+                "header_row": plan.header_row,
+                "courses": [],
+                "error": plan.error,
+            }
+            report["sheets"].append(entry)
+            for course_name, df, mapping in plan.frames:
+                result = import_grade_frame(db, df, course_name, mapping, matcher=matcher, commit=False)
+                entry["courses"].append(result)
+                report["matched"] += result["matched"]
+                if course_name not in report["courses"]:
+                    report["courses"].append(course_name)
+        if commit:
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        report["status"] = "rolled_back"
+        report["matched"] = 0
+        if report["sheets"]:
+            report["sheets"][-1]["error"] = str(e)
+    return report
@@ -0,0 +1,84 @@
+// Live updates from /api/changes/stream (see backend/change_feed.py).
+// Load /api/students once, remember its X-Change-Seq header, then patch
+// local state with the events instead of refetching everything.
+
+export interface ChangeEvent {
+  seq: number;
+  kind: 'grades' | 'course' | 'course_deleted' | 'students';
+  payload: any;
+}
+
+export interface FeedStudent {
+  id: number;
+  student_number: string;
+  name: string;
+  grade_name: string;
+  class_name: string;
+  grades: Record<string, { total: number; details: Record<string, any> }>;
+}
+
+const KINDS: ChangeEvent['kind'][] = ['grades', 'course', 'course_deleted', 'students'];
+
+// Sequence number to resume from, taken from a /api/students response
+export const changeSeq = (headers: any): number | null => {
+  const seq = headers?.['x-change-seq'];
+  return seq === undefined ? null : Number(seq);
+};
+
+// Apply one event to the /api/students list. Events are idempotent, replaying one is harmless.
+export const applyStudentChange = <T extends FeedStudent>(students: T[], ev: ChangeEvent): T[] => {
+  switch (ev.kind) {
+    case 'grades': {
+      const course: string = ev.payload.course;
+      const rows = new Map<number, [number, Record<string, any>]>();
+      ev.payload.rows.forEach(([id, total, details]: [number, number, Record<string, any>]) => rows.set(id, [total, details]));
+      return students.map(s => {
+        const row = rows.get(s.id);
+        if (!row) return s;
+        return { ...s, grades: { ...s.grades, [course]: { total: row[0], details: row[1] } } };
+      });
+    }
+    case 'course_deleted': {
+      const course: string = ev.payload.course;
+      return students.map(s => {
+        if (!(course in s.grades)) return s;
+        const grades = { ...s.grades };
+        delete grades[course];
+        return { ...s, grades };
+      });
+    }
+    case 'students': {
+      const byId = new Map<number, any>();
+      ev.payload.rows.forEach((row: any) => byId.set(row.id, row));
+      const updated = students.map(s => {
+        const row = byId.get(s.id);
+        if (!row) return s;
+        byId.delete(s.id);
+        return { ...s, ...row };
+      });
+      byId.forEach(row => updated.push({ grades: {}, ...row }));
+      return updated;
+    }
+    default:
+      return students;
+  }
+};
+
+// Open the stream; returns a function that closes it.
+// EventSource reconnects by itself and resumes after the last event it got.
+// onReset: events were missed for good, refetch everything.
+export const subscribeChanges = (
+  apiUrl: string,
+  since: number | null,
+  onEvent: (ev: ChangeEvent) => void,
+  onReset: () => void
+): (() => void) => {
+  const source = new EventSource(`${apiUrl}/changes/stream${since === null ? '' : `?since=${since}`}`);
+  KINDS.forEach(kind => {
+    source.addEventListener(kind, (e: MessageEvent) => {
+      onEvent({ seq: Number(e.lastEventId), kind, payload: JSON.parse(e.data) });
+    });
+  });
+  source.addEventListener('reset', () => onReset());
+  return () => source.close();
+};
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
-import { Table, Button, Modal, Form, Input, Select, Tag, message, Card, Popover, Tooltip } from 'antd';
-import { DeleteOutlined, PlusOutlined, EyeOutlined, EyeInvisibleOutlined, KeyOutlined } from '@ant-design/icons';
+import { Table, Button, Modal, Form, Input, Select, Tag, message, Card, Popover, Tooltip, Checkbox, Space } from 'antd';
+import { DeleteOutlined, PlusOutlined, EyeOutlined, EyeInvisibleOutlined, KeyOutlined, TeamOutlined } from '@ant-design/icons';
 import axios from 'axios';
 import { useTranslation } from 'react-i18next';
 
@@ -88,6 +88,46 @@ export const AccountsManager: React.FC<AccountsManagerProps> = ({ currentUser, a
         }
     };
 
+    // Bulk actions for a whole class / grade; create and reset download the credentials sheet
+    const [isBulkOpen, setIsBulkOpen] = useState(false);
+    const [bulkLoading, setBulkLoading] = useState(false);
+    const [bulkForm] = Form.useForm();
+
+    const handleBulk = async (values: any) => {
+        const { action, class_name, grade_name, password, random_password } = values;
+        const selection = { class_name: class_name || null, grade_name: grade_name || null };
+        const token = localStorage.getItem('token');
+        const headers = { Authorization: `Bearer ${token}` };
+        setBulkLoading(true);
+        try {
+            if (action === 'delete') {
+                const res = await axios.post(`${apiUrl}/users/bulk/delete`, selection, { headers });
+                message.success(`${t('common.delete')}: ${res.data.deleted}`);
+            } else {
+                const res = await axios.post(
+                    `${apiUrl}/users/bulk/${action}?format=xlsx`,
+                    { ...selection, password: password || null, random_password: !!random_password },
+                    { headers, responseType: 'blob' }
+                );
+                const url = window.URL.createObjectURL(new Blob([res.data]));
+                const link = document.createElement('a');
+                link.href = url;
+                link.setAttribute('download', `credentials_${class_name || grade_name}.xlsx`);
+                document.body.appendChild(link);
+                link.click();
+                link.remove();
+                message.success(t('accounts.bulk_done'));
+            }
+            setIsBulkOpen(false);
+            bulkForm.resetFields();
+            fetchUsers();
+        } catch (e: any) {
+            message.error(t('common.error'));
+        } finally {
+            setBulkLoading(false);
+        }
+    };
+
     const columns = [
         { title: t('accounts.username'), dataIndex: 'username', key: 'username' },
         {
@@ -145,7 +185,12 @@ export const AccountsManager: React.FC<AccountsManagerProps> = ({ currentUser, a
     ];
 
     return (
-        <Card title={t('menu.accounts')} extra={<Button type="primary" icon={<PlusOutlined />} onClick={() => setIsModalOpen(true)}>{t('accounts.add_user')}</Button>}>
+        <Card title={t('menu.accounts')} extra={
+            <Space>
+                <Button icon={<TeamOutlined />} onClick={() => setIsBulkOpen(true)}>{t('accounts.bulk')}</Button>
+                <Button type="primary" icon={<PlusOutlined />} onClick={() => setIsModalOpen(true)}>{t('accounts.add_user')}</Button>
+            </Space>
+        }>
             <Table dataSource={users} columns={columns} rowKey="id" />
             <Modal
                 title={t('accounts.add_user')}
@@ -189,6 +234,42 @@ export const AccountsManager: React.FC<AccountsManagerProps> = ({ currentUser, a
                     </Form.Item>
                 </Form>
             </Modal>
+
+            <Modal
+                title={t('accounts.bulk')}
+                open={isBulkOpen}
+                onCancel={() => setIsBulkOpen(false)}
+                onOk={() => bulkForm.submit()}
+                confirmLoading={bulkLoading}
+            >
+                <Form form={bulkForm} onFinish={handleBulk} layout="vertical" initialValues={{ action: 'reset-password' }}>
+                    <Form.Item name="action" label={t('common.action')} rules={[{ required: true }]}>
+                        <Select>
+                            <Option value="create">{t('accounts.bulk_create')}</Option>
+                            <Option value="reset-password">{t('accounts.reset_password')}</Option>
+                            <Option value="delete">{t('common.delete')}</Option>
+                        </Select>
+                    </Form.Item>
+                    <Form.Item name="class_name" label={t('analytics.class')}>
+                        <Input placeholder="Class 1" />
+                    </Form.Item>
+                    <Form.Item name="grade_name" label={t('analytics.grade')}>
+                        <Input placeholder="Grade 10" />
+                    </Form.Item>
+                    <Form.Item noStyle shouldUpdate={(prev, cur) => prev.action !== cur.action}>
+                        {({ getFieldValue }) => getFieldValue('action') !== 'delete' && (
+                            <>
+                                <Form.Item name="random_password" valuePropName="checked">
+                                    <Checkbox>{t('accounts.random_password')}</Checkbox>
+                                </Form.Item>
+                                <Form.Item name="password" label={t('accounts.password')} help={t('accounts.bulk_password_help')}>
+                                    <Input.Password />
+                                </Form.Item>
+                            </>
+                        )}
+                    </Form.Item>
+                </Form>
+            </Modal>
         </Card>
     );
 };
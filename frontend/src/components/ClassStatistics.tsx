@@ -1,8 +1,9 @@
-import React, { useMemo } from 'react';
-import { Card, Row, Col, Statistic, Table, Progress, Empty } from 'antd';
+import React, { useEffect, useMemo, useState } from 'react';
+import { Card, Row, Col, Statistic, Table, Progress, Empty, Segmented } from 'antd';
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip as RechartsTooltip, Legend, ResponsiveContainer, PieChart, Pie, Cell } from 'recharts';
 import { ArrowUpOutlined, ArrowDownOutlined } from '@ant-design/icons';
 import { useTranslation } from 'react-i18next';
+import axios from 'axios';
 
 interface Student {
     id: number;
@@ -16,12 +17,55 @@ interface ClassStatisticsProps {
     students: Student[];
     courseName: string; // 'All' or specific subject
     courseList: string[];
+    apiUrl?: string; // enables the standardized view for 'All'
 }
 
 const COLORS = ['#52c41a', '#1890ff', '#faad14', '#f5222d']; // Excellent, Good, Standard, Fail
 
-export const ClassStatistics: React.FC<ClassStatisticsProps> = ({ students, courseName, courseList }) => {
+type ScoreMode = 'raw' | 'standardized';
+
+// Composite of curved scores (normal curve, mean 75 / std 10 per grade level) from /api/stats/composite,
+// so a hard subject doesn't pull the average down. Pages through the whole ranking.
+const fetchComposite = async (apiUrl: string, courses: string[]): Promise<Map<number, number>> => {
+    const scores = new Map<number, number>();
+    const limit = 5000;
+    for (let offset = 0; ; offset += limit) {
+        const res = await axios.get(`${apiUrl}/stats/composite`, {
+            params: { course: courses, score: 'curved', curve: 'normal', offset, limit },
+            paramsSerializer: { indexes: null } // course=A&course=B
+        });
+        res.data.rows.forEach((r: { student_id: number; composite: number }) => scores.set(r.student_id, r.composite));
+        if (offset + limit >= res.data.total) return scores;
+    }
+};
+
+export const ClassStatistics: React.FC<ClassStatisticsProps> = ({ students, courseName, courseList, apiUrl }) => {
     const { t } = useTranslation();
+    const [mode, setMode] = useState<ScoreMode>('raw');
+    const [composite, setComposite] = useState<Map<number, number> | null>(null);
+    const standardized = mode === 'standardized' && courseName === 'All' && !!apiUrl;
+
+    useEffect(() => {
+        if (!standardized || !courseList.length) {
+            setComposite(null);
+            return;
+        }
+        let cancelled = false;
+        fetchComposite(apiUrl!, courseList)
+            .then(scores => { if (!cancelled) setComposite(scores); })
+            .catch(() => { if (!cancelled) setMode('raw'); });
+        return () => { cancelled = true; };
+    }, [standardized, apiUrl, courseList, students]);
+
+    // Score shown for a student, undefined = no grade
+    const scoreOf = (s: Student): number | undefined => {
+        if (courseName !== 'All') return s.grades[courseName]?.total;
+        if (standardized) return composite?.get(s.id);
+        // For 'All', we calculate the average of all subjects for this student
+        const validCourses = courseList.filter(c => s.grades[c]);
+        if (validCourses.length === 0) return undefined;
+        return validCourses.reduce((acc, c) => acc + s.grades[c].total, 0) / validCourses.length;
+    };
 
     const stats = useMemo(() => {
         if (students.length === 0) return null;
@@ -30,23 +74,10 @@ export const ClassStatistics: React.FC<ClassStatisticsProps> = ({ students, cour
         const studentScores: { name: string, score: number, class_name: string }[] = [];
 
         students.forEach(s => {
-            let score = 0;
-            if (courseName === 'All') {
-                // For 'All', we calculate the average of all subjects for this student
-                const validCourses = courseList.filter(c => s.grades[c]);
-                if (validCourses.length > 0) {
-                    const total = validCourses.reduce((acc, c) => acc + s.grades[c].total, 0);
-                    score = total / validCourses.length;
-                    scores.push(score);
-                    studentScores.push({ name: s.name, score, class_name: s.class_name });
-                }
-            } else {
-                if (s.grades[courseName]) {
-                    score = s.grades[courseName].total;
-                    scores.push(score);
-                    studentScores.push({ name: s.name, score, class_name: s.class_name });
-                }
-            }
+            const score = scoreOf(s);
+            if (score === undefined) return;
+            scores.push(score);
+            studentScores.push({ name: s.name, score, class_name: s.class_name });
         });
 
         if (scores.length === 0) return null;
@@ -107,23 +138,15 @@ export const ClassStatistics: React.FC<ClassStatisticsProps> = ({ students, cour
             },
             segments
         };
-    }, [students, courseName, courseList]);
+    }, [students, courseName, courseList, standardized, composite]);
 
     const classComparison = useMemo(() => {
         if (!students.length) return [];
         // Group by class
         const classMap: Record<string, { sum: number, count: number }> = {};
         students.forEach(s => {
-            let score = 0;
-            if (courseName === 'All') {
-                const validCourses = courseList.filter(c => s.grades[c]);
-                if (validCourses.length > 0) {
-                    score = validCourses.reduce((acc, c) => acc + s.grades[c].total, 0) / validCourses.length;
-                } else return; // Skip if no grades
-            } else {
-                if (s.grades[courseName]) score = s.grades[courseName].total;
-                else return;
-            }
+            const score = scoreOf(s);
+            if (score === undefined) return; // Skip if no grades
 
             if (!classMap[s.class_name]) classMap[s.class_name] = { sum: 0, count: 0 };
             classMap[s.class_name].sum += score;
@@ -134,10 +157,24 @@ export const ClassStatistics: React.FC<ClassStatisticsProps> = ({ students, cour
             name: cls,
             avg: parseFloat((data.sum / data.count).toFixed(1))
         })).sort((a, b) => b.avg - a.avg); // Sort descending
-    }, [students, courseName, courseList]);
+    }, [students, courseName, courseList, standardized, composite]);
 
 
-    if (!stats) return <Empty description={t('common.loading')} />; // Or No Data
+    const modeToggle = courseName === 'All' && apiUrl ? (
+        <div style={{ marginBottom: 16 }}>
+            <Segmented
+                value={mode}
+                onChange={v => setMode(v as ScoreMode)}
+                options={[
+                    { label: t('stats.raw_average'), value: 'raw' },
+                    { label: t('stats.standardized'), value: 'standardized' },
+                ]}
+            />
+            {standardized && <span style={{ marginLeft: 12, color: '#888' }}>{t('stats.standardized_hint')}</span>}
+        </div>
+    ) : null;
+
+    if (!stats) return <div style={{ marginTop: 24 }}>{modeToggle}<Empty description={t('common.loading')} /></div>; // Or No Data
 
     const pieData = [
         { name: t('stats.excellent_rate'), value: stats.counts.excellent },
@@ -158,6 +195,7 @@ export const ClassStatistics: React.FC<ClassStatisticsProps> = ({ students, cour
 
     return (
         <div style={{ marginTop: 24 }}>
+            {modeToggle}
             {/* Top Cards */}
             <Row gutter={16} style={{ marginBottom: 24 }}>
                 <Col span={6}>
@@ -11,6 +11,7 @@ import { StudentReport } from '../components/StudentReport';
 import { CSS } from '@dnd-kit/utilities';
 import { AccountsManager } from '../components/AccountsManager';
 import { ClassStatistics } from '../components/ClassStatistics';
+import { applyStudentChange, changeSeq, subscribeChanges, type ChangeEvent } from '../changeFeed';
 const { Header, Content, Footer, Sider } = Layout;
 const { Dragger } = Upload;
 const { Option } = Select;
@@ -60,6 +61,8 @@ export const AdminDashboard = () => {
   const [currentUser, setCurrentUser] = useState<{ username: string, role: string } | null>(null);
   const [students, setStudents] = useState<Student[]>([]);
   const [loading, setLoading] = useState(false);
+  // Change feed position of the loaded student list, see changeFeed.ts
+  const [feedSeq, setFeedSeq] = useState<number | null>(null);
 
   useEffect(() => {
     // Load initial data
@@ -136,22 +139,28 @@ export const AdminDashboard = () => {
     formData.append('file', file);
 
     try {
-      const res = await axios.post(`${API_URL}/upload/preview`, formData);
+      const res = await axios.post(`${API_URL}/upload/preview`, formData, { params: { course_name: courseName } });
+
+      // Known template: the backend already imported it with the saved mapping
+      if (res.data.auto_imported) {
+        message.success(res.data.message);
+        setIsWizardOpen(false);
+        setCurrentStep(0);
+        onSuccess("Ok");
+        return;
+      }
+
       setImportFileKey(res.data.file_key);
       setImportColumns(res.data.columns);
       setPreviewData(res.data.preview);
 
-      // Auto-guess mapping
-      const cols = res.data.columns as string[];
-      const newMapping = { student_id: '', name: '', total_score: '' };
-
-      cols.forEach(c => {
-        const cs = c.toLowerCase();
-        if (cs.includes('学号') || cs.includes('id') || cs.includes('no')) newMapping.student_id = c;
-        if (cs.includes('姓名') || cs.includes('name')) newMapping.name = c;
-        if (cs.includes('总分') || cs.includes('total') || cs.includes('score') || cs.includes('成绩')) newMapping.total_score = c;
+      // Mapping suggested by the backend (saved profile or header matching)
+      const suggested = res.data.mapping || {};
+      setMapping({
+        student_id: suggested.student_id || '',
+        name: suggested.name || '',
+        total_score: suggested.total_score || ''
       });
-      setMapping(newMapping);
 
       setCurrentStep(1);
       onSuccess("Ok");
@@ -173,7 +182,6 @@ export const AdminDashboard = () => {
       message.success(res.data.message);
       setIsWizardOpen(false);
       setCurrentStep(0);
-      fetchStudents();
     } catch (err: any) {
       console.error(err);
       message.error(err.response?.data?.detail || "Import failed: " + err.message);
@@ -202,8 +210,6 @@ export const AdminDashboard = () => {
         ...prev,
         [courseName]: !prev[courseName]
       }));
-      // Then background refresh
-      fetchCourseVisibility();
     } catch (error) {
       message.error('Failed to toggle visibility');
     }
@@ -217,6 +223,7 @@ export const AdminDashboard = () => {
     try {
       const res = await axios.get(`${API_URL}/students?limit=2000`);
       setStudents(res.data);
+      setFeedSeq(changeSeq(res.headers));
 
       // Extract unique courses
       const courses = new Set<string>();
@@ -236,9 +243,28 @@ export const AdminDashboard = () => {
     }
   };
 
+  // Uploads, toggles and deletes (from any admin) arrive as deltas, no refetch needed
+  const handleChange = (ev: ChangeEvent) => {
+    setStudents(prev => applyStudentChange(prev, ev));
+    const course: string = ev.payload.course;
+    if (ev.kind === 'grades') {
+      setCourseList(prev => prev.includes(course) ? prev : [...prev, course]);
+    } else if (ev.kind === 'course') {
+      setCourseVisibility(prev => ({ ...prev, [course]: ev.payload.is_visible }));
+    } else if (ev.kind === 'course_deleted') {
+      setCourseList(prev => prev.filter(c => c !== course));
+      setCourseVisibility(prev => {
+        const next = { ...prev };
+        delete next[course];
+        return next;
+      });
+    }
+  };
+
   useEffect(() => {
-    fetchStudents();
-  }, [activeTab]);
+    if (feedSeq === null) return;
+    return subscribeChanges(API_URL, feedSeq, handleChange, fetchStudents);
+  }, [feedSeq]);
 
   // --- Components ---
 
@@ -251,7 +277,6 @@ export const AdminDashboard = () => {
         const { status } = info.file;
         if (status === 'done') {
           message.success(`${info.file.name} Roster uploaded successfully.`);
-          fetchStudents();
         } else if (status === 'error') {
           message.error(`${info.file.name} file upload failed.`);
         }
@@ -447,7 +472,6 @@ export const AdminDashboard = () => {
       try {
         await axios.delete(`${API_URL}/courses/${courseName}`);
         message.success(`Course ${courseName} deleted successfully.`);
-        fetchStudents(); // Refresh
       } catch (error) {
         message.error('Failed to delete course');
       }
@@ -518,6 +542,31 @@ export const AdminDashboard = () => {
     const [selectedGrade, setSelectedGrade] = useState<string>('All');
     const [selectedClass, setSelectedClass] = useState<string[]>(['All']);
 
+    // Report cards of the selected class (or grade), rendered on the server as a ZIP
+    const [downloadingCards, setDownloadingCards] = useState(false);
+    const handleDownloadCards = async () => {
+      const oneClass = !selectedClass.includes('All') && selectedClass.length === 1 ? selectedClass[0] : null;
+      const params: any = oneClass ? { class_name: oneClass } : { grade_name: selectedGrade };
+      setDownloadingCards(true);
+      try {
+        const token = localStorage.getItem('token');
+        const res = await axios.get(`${API_URL}/reports`, {
+          params, headers: { Authorization: `Bearer ${token}` }, responseType: 'blob'
+        });
+        const url = window.URL.createObjectURL(new Blob([res.data]));
+        const link = document.createElement('a');
+        link.href = url;
+        link.setAttribute('download', `report_cards_${oneClass || selectedGrade}.zip`);
+        document.body.appendChild(link);
+        link.click();
+        link.remove();
+      } catch (e) {
+        message.error(t('common.error'));
+      } finally {
+        setDownloadingCards(false);
+      }
+    };
+
     // Scatter Plot State
     const [scatterX, setScatterX] = useState<string>(courseList[0] || 'English');
     const [scatterY, setScatterY] = useState<string>(courseList[1] || 'Math');
@@ -892,6 +941,15 @@ export const AdminDashboard = () => {
                     {t('analytics.print_report')}
                   </Button>
 
+                  <Button
+                    style={{ marginLeft: 16 }}
+                    loading={downloadingCards}
+                    disabled={selectedGrade === 'All' && (selectedClass.includes('All') || selectedClass.length !== 1)}
+                    onClick={handleDownloadCards}
+                  >
+                    {t('analytics.download_report_cards')}
+                  </Button>
+
                   <Modal title={t('analytics.parent_portal_visibility')} open={isVisModalOpen} onCancel={() => setIsVisModalOpen(false)} footer={null}>
                     <div style={{ display: 'flex', flexDirection: 'column', gap: 10 }}>
                       <p style={{ color: '#999', fontSize: 12 }}>{t('analytics.controls_visibility')}</p>
@@ -1039,7 +1097,7 @@ export const AdminDashboard = () => {
               {chartMode === 'Scatter' && renderScatter()}
               {chartMode === 'Heatmap' && renderHeatmap()}
               {chartMode === 'Trend' && renderTrend()}
-              {chartMode === 'Stats' && <ClassStatistics students={filteredStudents} courseList={courseList} courseName={selectedCourse} />}
+              {chartMode === 'Stats' && <ClassStatistics students={filteredStudents} courseList={courseList} courseName={selectedCourse} apiUrl={API_URL} />}
 
               {chartMode === 'Report' && (
                 <DndContext sensors={sensors} collisionDetection={closestCenter} onDragEnd={handleDragEnd}>
@@ -6,9 +6,12 @@ import { useNavigate } from 'react-router-dom';
 import { StudentReport } from '../components/StudentReport';
 import { StudentAnalytics } from '../components/StudentAnalytics';
 import { useReactToPrint } from 'react-to-print';
+import { applyStudentChange, changeSeq, subscribeChanges, type ChangeEvent } from '../changeFeed';
 
 const { Header, Content } = Layout;
 
+const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
+
 export const ParentDashboard: React.FC = () => {
     // ... (existing state & hooks)
     const navigate = useNavigate();
@@ -17,6 +20,11 @@ export const ParentDashboard: React.FC = () => {
     const [radarData, setRadarData] = useState<any[]>([]);
     const [classAverage, setClassAverage] = useState<any>({});
     const [courseList, setCourseList] = useState<string[]>([]);
+    // Loaded once, then kept current by the change feed
+    const [allStudents, setAllStudents] = useState<any[]>([]);
+    const [visibleMap, setVisibleMap] = useState<Record<string, boolean>>({});
+    const [studentId, setStudentId] = useState<number | null>(null);
+    const [feedSeq, setFeedSeq] = useState<number | null>(null);
 
     // ... (existing useEffect & loadData)
     useEffect(() => {
@@ -28,10 +36,64 @@ export const ParentDashboard: React.FC = () => {
         loadData(token);
     }, []);
 
+    // New grades, visibility changes and deletes show up without a reload
+    useEffect(() => {
+        if (feedSeq === null) return;
+        const handleChange = (ev: ChangeEvent) => {
+            setAllStudents(prev => applyStudentChange(prev, ev));
+            const course: string = ev.payload.course;
+            if (ev.kind === 'course') {
+                setVisibleMap(prev => ({ ...prev, [course]: ev.payload.is_visible }));
+            } else if (ev.kind === 'course_deleted') {
+                setVisibleMap(prev => {
+                    const next = { ...prev };
+                    delete next[course];
+                    return next;
+                });
+            }
+        };
+        const reload = () => {
+            const token = localStorage.getItem('token');
+            if (token) loadData(token);
+        };
+        return subscribeChanges(API_URL, feedSeq, handleChange, reload);
+    }, [feedSeq]);
+
+    // Charts for the linked student, recomputed whenever the data changes
+    useEffect(() => {
+        const myStudent = allStudents.find((s: any) => s.id === studentId);
+        if (!myStudent) return;
+        setStudent(myStudent);
+
+        const allCourses = Object.keys(myStudent.grades || {});
+        const courses = allCourses.filter(c => visibleMap[c] !== false); // Default True if missing
+        setCourseList(courses);
+
+        // Radar Data
+        const rData = courses.map(course => {
+            const totalScore = allStudents.reduce((acc: number, s: any) => acc + (s.grades[course]?.total || 0), 0);
+            const avg = totalScore / allStudents.length;
+
+            return {
+                subject: course,
+                A: myStudent.grades[course]?.total || 0,
+                B: Number(avg.toFixed(1)),
+                fullMark: 100
+            };
+        });
+        setRadarData(rData);
+
+        // Avg Obj
+        const avgObj: any = {};
+        courses.forEach(c => {
+            const totalScore = allStudents.reduce((acc: number, s: any) => acc + (s.grades[c]?.total || 0), 0);
+            avgObj[c] = totalScore / allStudents.length;
+        });
+        setClassAverage(avgObj);
+    }, [allStudents, visibleMap, studentId]);
+
     const loadData = async (token: string) => {
         try {
-            const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
-
             // 1. Get User Info (Role & Student ID)
             const userRes = await axios.get(`${API_URL}/users/me`, {
                 headers: { Authorization: `Bearer ${token}` }
@@ -45,50 +107,24 @@ export const ParentDashboard: React.FC = () => {
 
             // 2. Load ALL students (For simplicity, to calculate Class Average/Rank contexts)
             const studentsRes = await axios.get(`${API_URL}/students`);
-            const allStudents = studentsRes.data;
-            const myStudent = allStudents.find((s: any) => s.id === student_id);
+            const students = studentsRes.data;
 
-            if (!myStudent) {
+            if (!students.some((s: any) => s.id === student_id)) {
                 message.error('Student data not found.');
                 setLoading(false);
                 return;
             }
 
-            setStudent(myStudent);
-
-            // 3. Process Data for Charts
-            if (myStudent.grades) {
-                // Fetch Visibility
-                const coursesRes = await axios.get(`${API_URL}/courses`);
-                const visibleMap: Record<string, boolean> = {};
-                coursesRes.data.forEach((c: any) => visibleMap[c.name] = c.is_visible);
-
-                const allCourses = Object.keys(myStudent.grades);
-                const courses = allCourses.filter(c => visibleMap[c] !== false); // Default True if missing
-                setCourseList(courses);
-
-                // Radar Data
-                const rData = courses.map(course => {
-                    const totalScore = allStudents.reduce((acc: number, s: any) => acc + (s.grades[course]?.total || 0), 0);
-                    const avg = totalScore / allStudents.length;
-
-                    return {
-                        subject: course,
-                        A: myStudent.grades[course]?.total || 0,
-                        B: Number(avg.toFixed(1)),
-                        fullMark: 100
-                    };
-                });
-                setRadarData(rData);
+            // 3. Fetch Visibility
+            const coursesRes = await axios.get(`${API_URL}/courses`);
+            const visible: Record<string, boolean> = {};
+            coursesRes.data.forEach((c: any) => visible[c.name] = c.is_visible);
 
-                // Avg Obj
-                const avgObj: any = {};
-                courses.forEach(c => {
-                    const totalScore = allStudents.reduce((acc: number, s: any) => acc + (s.grades[c]?.total || 0), 0);
-                    avgObj[c] = totalScore / allStudents.length;
-                });
-                setClassAverage(avgObj);
-            }
+            setStudent(students.find((s: any) => s.id === student_id));
+            setVisibleMap(visible);
+            setAllStudents(students);
+            setStudentId(student_id);
+            setFeedSeq(changeSeq(studentsRes.headers));
         } catch (error) {
             console.error(error);
             message.error('Failed to load report data');